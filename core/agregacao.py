@@ -0,0 +1,128 @@
+"""
+Agregados de exibição (rollups) por hora e por dia.
+
+Os relatórios contavam logs brutos (Count em LogExibicao), com custo
+crescendo junto com a tabela. ExibicaoPorHora e ExibicaoPorDia guardam,
+por dispositivo × vídeo × playlist, exibições, segundos exibidos e
+exibições completas; os relatórios leem só esses agregados.
+
+compactar() roda no scheduler (a cada TV_ROLLUP_INTERVAL_SECONDS) e pelo
+comando `agregar_exibicoes`:
+
+- lê os logs com id acima de MarcadorAgregacao.ultimo_id, em faixas de
+  TV_ROLLUP_BATCH ids, e agrega cada faixa com um GROUP BY no banco;
+- soma o resultado nos agregados (INSERT ... ON CONFLICT DO UPDATE) e avança
+  o marcador na mesma transação — cada log é contado exatamente uma vez,
+  mesmo com dois processos compactando (o marcador é lido com FOR UPDATE);
+- só processa até o maior id visto na passada anterior: uma inserção ainda
+  não confirmada com id menor não fica para trás.
+
+Os agregados ficam até ~2 intervalos atrás dos logs e sobrevivem ao
+arquivamento dos logs brutos (core/particoes.py).
+"""
+import logging
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, DurationField, ExpressionWrapper, F, Max, Q, Sum
+from django.db.models.functions import TruncDate, TruncHour
+
+logger = logging.getLogger(__name__)
+
+MARCADOR = 'logexibicao'
+
+
+def compactar(ate=None):
+    """
+    Agrega os logs pendentes. ate: processa também até esse id sem esperar a
+    próxima passada (uso manual). Retorna quantos logs foram agregados.
+    """
+    from .models import LogExibicao, MarcadorAgregacao
+
+    lote = getattr(settings, 'TV_ROLLUP_BATCH', 20000)
+    MarcadorAgregacao.objects.get_or_create(nome=MARCADOR)
+    if ate:
+        MarcadorAgregacao.objects.filter(nome=MARCADOR, proximo_id__lt=ate).update(proximo_id=ate)
+    atual = LogExibicao.objects.aggregate(m=Max('id'))['m'] or 0
+
+    total = 0
+    while True:
+        with transaction.atomic():
+            marcador = MarcadorAgregacao.objects.select_for_update().get(nome=MARCADOR)
+            if marcador.ultimo_id >= marcador.proximo_id:
+                break
+            fim = min(marcador.ultimo_id + lote, marcador.proximo_id)
+            total += _agregar_faixa(marcador.ultimo_id, fim)
+            marcador.ultimo_id = fim
+            marcador.save(update_fields=['ultimo_id', 'atualizado_em'])
+
+    MarcadorAgregacao.objects.filter(nome=MARCADOR, proximo_id__lt=atual).update(proximo_id=atual)
+    if total:
+        logger.info('agregacao: %d log(s) agregados', total)
+    return total
+
+
+def reconstruir():
+    """Apaga os agregados e refaz a partir dos logs ainda no banco."""
+    from .models import ExibicaoPorDia, ExibicaoPorHora, LogExibicao, MarcadorAgregacao
+
+    atual = LogExibicao.objects.aggregate(m=Max('id'))['m'] or 0
+    with transaction.atomic():
+        ExibicaoPorHora.objects.all().delete()
+        ExibicaoPorDia.objects.all().delete()
+        MarcadorAgregacao.objects.update_or_create(nome=MARCADOR, defaults={'ultimo_id': 0, 'proximo_id': atual})
+    return compactar()
+
+
+def _agregar_faixa(de, ate):
+    """Soma nos agregados os logs com de < id ≤ ate. Retorna quantos logs havia."""
+    from .models import ExibicaoPorDia, ExibicaoPorHora, LogExibicao
+
+    logs = LogExibicao.objects.filter(id__gt=de, id__lte=ate).order_by()
+    duracao = ExpressionWrapper(F('data_hora_fim') - F('data_hora_inicio'), output_field=DurationField())
+    metricas = {
+        'n': Count('id'),
+        'duracao': Sum(duracao),
+        'completas': Count('id', filter=Q(completamente_exibido=True)),
+    }
+    total = 0
+    # Dia e hora no fuso do projeto (TIME_ZONE), como nos relatórios
+    for modelo, campo, periodo in (
+        (ExibicaoPorHora, 'hora', TruncHour('data_hora_inicio')),
+        (ExibicaoPorDia, 'dia', TruncDate('data_hora_inicio')),
+    ):
+        linhas = list(
+            logs.annotate(periodo=periodo)
+            .values('dispositivo_id', 'video_id', 'playlist_id', 'periodo')
+            .annotate(**metricas)
+        )
+        _somar(modelo, campo, linhas)
+        total = sum(linha['n'] for linha in linhas)  # igual nas duas granularidades
+    return total
+
+
+def _somar(modelo, campo, linhas):
+    if not linhas:
+        return
+    tabela = connection.ops.quote_name(modelo._meta.db_table)
+    coluna = connection.ops.quote_name(campo)
+    campo_periodo = modelo._meta.get_field(campo)
+    sql = (
+        f'INSERT INTO {tabela} (dispositivo_id, video_id, playlist_id, {coluna}, exibicoes, segundos, completas) '
+        f'VALUES (%s, %s, %s, %s, %s, %s, %s) '
+        f'ON CONFLICT (dispositivo_id, video_id, playlist_id, {coluna}) DO UPDATE SET '
+        f'exibicoes = {tabela}.exibicoes + excluded.exibicoes, '
+        f'segundos = {tabela}.segundos + excluded.segundos, '
+        f'completas = {tabela}.completas + excluded.completas'
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, [
+            (
+                linha['dispositivo_id'], linha['video_id'], linha['playlist_id'],
+                campo_periodo.get_db_prep_value(linha['periodo'], connection),
+                linha['n'],
+                int(linha['duracao'].total_seconds()) if linha['duracao'] else 0,
+                linha['completas'],
+            )
+            for linha in linhas
+        ])
@@ -1,9 +1,19 @@
 """
 Serviço de alerta de desconexão de dispositivos TV.
 Envia e-mail via Brevo (SMTP) quando um dispositivo fica offline.
+
+Os alertas não saem na hora: entram numa fila atendida por uma única thread
+(_Despachante) que junta o que chegar em DEVICE_ALERT_DIGEST_SECONDS e manda
+um e-mail-resumo por destinatário, reaproveitando a mesma conexão SMTP. Uma
+loja sem energia derruba 20 TVs — o franqueado recebe um e-mail, não 20.
 """
+import atexit
 import logging
+import queue
 import smtplib
+import threading
+import time
+from collections import namedtuple
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from django.conf import settings
@@ -14,12 +24,17 @@ logger = logging.getLogger(__name__)
 
 # ─── helpers ────────────────────────────────────────────────────────────────
 
-def _get_destinatarios(dispositivo) -> list[str]:
+def _emails_owners() -> list[str]:
+    from core.models import User
+    return list(User.objects.filter(role='OWNER', is_active=True).exclude(email='').values_list('email', flat=True))
+
+
+def _get_destinatarios(dispositivo, owners=None) -> list[str]:
     """
     Monta a lista de e-mails que devem receber o alerta.
     Inclui: franqueado direto do dispositivo + franqueado do município + todos os OWNERs.
+    owners: e-mails dos OWNERs já consultados (evita uma consulta por dispositivo).
     """
-    from core.models import User
     emails: set[str] = set()
 
     # franqueado diretamente atribuído ao dispositivo
@@ -34,49 +49,84 @@ def _get_destinatarios(dispositivo) -> list[str]:
         pass
 
     # todos os OWNERs sempre recebem
-    for owner in User.objects.filter(role='OWNER', is_active=True).exclude(email=''):
-        emails.add(owner.email)
+    emails.update(_emails_owners() if owners is None else owners)
 
     return list(emails)
 
 
-def _send_smtp(subject: str, html_body: str, destinatarios: list[str]) -> bool:
-    """Envia e-mail via Brevo SMTP. Retorna True em sucesso."""
-    if not destinatarios:
-        logger.warning("alerts: nenhum destinatário para o alerta, e-mail não enviado.")
-        return False
-
-    smtp_host = getattr(settings, 'EMAIL_HOST', 'smtp-relay.brevo.com')
-    smtp_port = getattr(settings, 'EMAIL_PORT', 587)
-    smtp_user = getattr(settings, 'EMAIL_HOST_USER', '')
-    smtp_pass = getattr(settings, 'EMAIL_HOST_PASSWORD', '')
-    from_email = getattr(settings, 'DEFAULT_FROM_EMAIL', smtp_user)
-
+def _mensagem(subject: str, html_body: str, destinatarios: list[str]) -> MIMEMultipart:
     msg = MIMEMultipart('alternative')
     msg['Subject'] = subject
-    msg['From'] = from_email
+    msg['From'] = getattr(settings, 'DEFAULT_FROM_EMAIL', getattr(settings, 'EMAIL_HOST_USER', ''))
     msg['To'] = ', '.join(destinatarios)
     msg.attach(MIMEText(html_body, 'html', 'utf-8'))
+    return msg
 
-    try:
-        with smtplib.SMTP(smtp_host, smtp_port, timeout=15) as server:
-            server.ehlo()
-            server.starttls()
-            server.login(smtp_user, smtp_pass)
-            server.sendmail(from_email, destinatarios, msg.as_string())
-        logger.info("alerts: e-mail '%s' enviado para %s", subject, destinatarios)
-        return True
-    except Exception as exc:
-        logger.error("alerts: falha ao enviar e-mail: %s", exc)
+
+class _ConexaoSMTP:
+    """Conexão SMTP (Brevo) aberta sob demanda e reaproveitada entre envios."""
+
+    def __init__(self):
+        self._server = None
+
+    def _abrir(self):
+        server = smtplib.SMTP(
+            getattr(settings, 'EMAIL_HOST', 'smtp-relay.brevo.com'),
+            getattr(settings, 'EMAIL_PORT', 587),
+            timeout=15,
+        )
+        server.ehlo()
+        server.starttls()
+        server.login(getattr(settings, 'EMAIL_HOST_USER', ''), getattr(settings, 'EMAIL_HOST_PASSWORD', ''))
+        return server
+
+    def enviar(self, subject: str, html_body: str, destinatarios: list[str]) -> bool:
+        """Envia pela conexão aberta; se ela caiu, reconecta uma vez. True em sucesso."""
+        if not destinatarios:
+            logger.warning("alerts: nenhum destinatário para o alerta, e-mail não enviado.")
+            return False
+
+        msg = _mensagem(subject, html_body, destinatarios)
+        for tentativa in (1, 2):
+            try:
+                if self._server is None:
+                    self._server = self._abrir()
+                self._server.sendmail(msg['From'], destinatarios, msg.as_string())
+                logger.info("alerts: e-mail '%s' enviado para %s", subject, destinatarios)
+                return True
+            except (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, OSError) as exc:
+                self.fechar()
+                if tentativa == 2:
+                    logger.error("alerts: falha ao enviar e-mail: %s", exc)
+            except Exception as exc:
+                logger.error("alerts: falha ao enviar e-mail: %s", exc)
+                self.fechar()
+                return False
         return False
 
+    def fechar(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except Exception:
+                pass
+            self._server = None
+
 
 # ─── templates HTML ─────────────────────────────────────────────────────────
 
-def _html_offline(dispositivo, ultima_vez: str) -> str:
+def _documento(*cartoes: str) -> str:
+    corpo = '\n'.join(cartoes)
     return f"""
 <html><body style="font-family:sans-serif;background:#0a0e1a;color:#f4f6ff;padding:32px">
-<div style="max-width:520px;margin:0 auto;background:#111827;border-radius:12px;
+{corpo}
+</body></html>
+"""
+
+
+def _cartao_offline(dispositivo, ultima_vez: str) -> str:
+    return f"""
+<div style="max-width:520px;margin:0 auto 16px;background:#111827;border-radius:12px;
             border:1px solid #ff4444;padding:28px">
   <p style="font-size:11px;text-transform:uppercase;letter-spacing:2px;
              color:#ff6666;margin:0 0 12px">⚠️ Alerta de Desconexão</p>
@@ -115,15 +165,17 @@ def _html_offline(dispositivo, ultima_vez: str) -> str:
     Este alerta não será repetido até que o dispositivo se reconecte.
   </p>
 </div>
-</body></html>
 """
 
 
-def _html_online(dispositivo) -> str:
+def _html_offline(dispositivo, ultima_vez: str) -> str:
+    return _documento(_cartao_offline(dispositivo, ultima_vez))
+
+
+def _cartao_online(dispositivo) -> str:
     reconectado_em = timezone.localtime(timezone.now()).strftime('%d/%m/%Y %H:%M')
     return f"""
-<html><body style="font-family:sans-serif;background:#0a0e1a;color:#f4f6ff;padding:32px">
-<div style="max-width:520px;margin:0 auto;background:#111827;border-radius:12px;
+<div style="max-width:520px;margin:0 auto 16px;background:#111827;border-radius:12px;
             border:1px solid #00d4ff;padding:28px">
   <p style="font-size:11px;text-transform:uppercase;letter-spacing:2px;
              color:#00d4ff;margin:0 0 12px">✅ Dispositivo reconectado</p>
@@ -146,62 +198,186 @@ def _html_online(dispositivo) -> str:
     </tr>
   </table>
 </div>
-</body></html>
 """
 
 
+def _html_online(dispositivo) -> str:
+    return _documento(_cartao_online(dispositivo))
+
+
+def _html_resumo(alertas) -> str:
+    """Resumo com vários alertas: cabeçalho + os cartões individuais."""
+    offline = sum(1 for a in alertas if a.tipo == 'offline')
+    online = len(alertas) - offline
+    cabecalho = f"""
+<div style="max-width:520px;margin:0 auto 16px">
+  <p style="font-size:11px;text-transform:uppercase;letter-spacing:2px;color:#8892b0;margin:0 0 8px">
+    Resumo de alertas</p>
+  <h2 style="margin:0;font-size:20px;color:#fff">{offline} offline · {online} reconectado(s)</h2>
+</div>
+"""
+    return _documento(cabecalho, *(a.cartao for a in alertas))
+
+
+# ─── fila de envio ───────────────────────────────────────────────────────────
+
+_Alerta = namedtuple('_Alerta', 'tipo assunto cartao destinatarios')
+
+
+class _Despachante:
+    """
+    Fila limitada (DEVICE_ALERT_QUEUE_MAX) atendida por uma thread. Cada
+    rodada espera DEVICE_ALERT_DIGEST_SECONDS a partir do primeiro alerta,
+    agrupa por destinatário e envia um e-mail por grupo — destinatários com
+    os mesmos alertas recebem a mesma mensagem. A conexão SMTP fica aberta
+    entre rodadas e é fechada após OCIOSO segundos sem alertas.
+    """
+    OCIOSO = 60
+
+    def __init__(self):
+        self._fila = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._conexao = _ConexaoSMTP()
+
+    def enfileirar(self, alerta) -> bool:
+        with self._lock:
+            if self._thread is None:
+                self._fila = queue.Queue(maxsize=getattr(settings, 'DEVICE_ALERT_QUEUE_MAX', 500))
+                self._thread = threading.Thread(target=self._loop, name='alerts-email', daemon=True)
+                self._thread.start()
+                atexit.register(self.esvaziar)
+        try:
+            self._fila.put_nowait(alerta)
+            return True
+        except queue.Full:
+            logger.error("alerts: fila de e-mail cheia, alerta '%s' descartado", alerta.assunto)
+            return False
+
+    def _loop(self):
+        while True:
+            try:
+                lote = [self._fila.get(timeout=self.OCIOSO)]
+            except queue.Empty:
+                self._conexao.fechar()
+                continue
+            prazo = time.monotonic() + getattr(settings, 'DEVICE_ALERT_DIGEST_SECONDS', 30)
+            while (restante := prazo - time.monotonic()) > 0:
+                try:
+                    lote.append(self._fila.get(timeout=restante))
+                except queue.Empty:
+                    break
+            self._enviar(lote)
+
+    def _enviar(self, lote):
+        por_destinatario = {}
+        for alerta in lote:
+            for email in alerta.destinatarios:
+                por_destinatario.setdefault(email, []).append(alerta)
+        grupos = {}
+        for email, alertas in por_destinatario.items():
+            grupos.setdefault(tuple(map(id, alertas)), (alertas, []))[1].append(email)
+
+        for alertas, emails in grupos.values():
+            try:
+                if len(alertas) == 1:
+                    self._conexao.enviar(alertas[0].assunto, _documento(alertas[0].cartao), emails)
+                else:
+                    offline = sum(1 for a in alertas if a.tipo == 'offline')
+                    partes = []
+                    if offline:
+                        partes.append(f"⚠️ {offline} TV(s) OFFLINE")
+                    if len(alertas) - offline:
+                        partes.append(f"✅ {len(alertas) - offline} TV(s) ONLINE")
+                    self._conexao.enviar(' · '.join(partes), _html_resumo(alertas), emails)
+            except Exception as exc:
+                logger.error("alerts: erro ao enviar resumo para %s: %s", emails, exc)
+
+    def esvaziar(self):
+        """Envia na hora o que estiver na fila (encerramento do processo)."""
+        lote = []
+        while self._fila is not None:
+            try:
+                lote.append(self._fila.get_nowait())
+            except queue.Empty:
+                break
+        if lote:
+            self._enviar(lote)
+        self._conexao.fechar()
+
+
+_despachante = _Despachante()
+
+
 # ─── funções públicas ────────────────────────────────────────────────────────
 
-def send_offline_alert(dispositivo) -> bool:
-    """Envia alerta de offline. Deve ser chamada apenas uma vez por incidente."""
+def send_offline_alert(dispositivo, owners=None) -> bool:
+    """
+    Enfileira alerta de offline. Deve ser chamada apenas uma vez por incidente.
+    Retorna False se a fila de envio estiver cheia.
+    """
     ultima = dispositivo.ultima_sincronizacao
     if ultima:
         ultima_vez = timezone.localtime(ultima).strftime('%d/%m/%Y %H:%M:%S')
     else:
         ultima_vez = 'nunca'
 
-    destinatarios = _get_destinatarios(dispositivo)
+    destinatarios = _get_destinatarios(dispositivo, owners)
     subject = f"⚠️ TV OFFLINE: {dispositivo.nome} ({dispositivo.municipio})"
-    return _send_smtp(subject, _html_offline(dispositivo, ultima_vez), destinatarios)
+    return _despachante.enfileirar(
+        _Alerta('offline', subject, _cartao_offline(dispositivo, ultima_vez), destinatarios)
+    )
 
 
-def send_online_alert(dispositivo) -> bool:
-    """Envia notificação de reconexão. Chamada quando dispositivo estava com alerta ativo e voltou."""
-    destinatarios = _get_destinatarios(dispositivo)
+def send_online_alert(dispositivo, owners=None) -> bool:
+    """Enfileira notificação de reconexão. Chamada quando dispositivo estava com alerta ativo e voltou."""
+    destinatarios = _get_destinatarios(dispositivo, owners)
     subject = f"✅ TV ONLINE: {dispositivo.nome} ({dispositivo.municipio})"
-    return _send_smtp(subject, _html_online(dispositivo), destinatarios)
+    return _despachante.enfileirar(
+        _Alerta('online', subject, _cartao_online(dispositivo), destinatarios)
+    )
 
 
 def check_offline_devices():
     """
-    Verifica dispositivos ativos que não enviaram heartbeat dentro do threshold.
+    Alerta dispositivos ativos que acabaram de passar do threshold sem heartbeat.
     Envia e-mail de alerta (uma vez por incidente de desconexão).
     Chamada pelo scheduler a cada minuto.
+
+    Os candidatos vêm do heap de prazos de core/presenca.py — só quem venceu
+    desde a última passada, sem varrer a frota. Todos são marcados com um
+    único UPDATE; se o alerta de algum não couber na fila de envio, o flag
+    dele volta e o prazo é reagendado para a próxima passada.
     """
     from core.models import DispositivoTV
+    from core import presenca
 
-    threshold = getattr(settings, 'DEVICE_OFFLINE_THRESHOLD_MINUTES', 10)
-    cutoff = timezone.now() - timezone.timedelta(minutes=threshold)
+    offline = presenca.expirados()
+    if not offline:
+        return 0
 
-    # Dispositivos que deveriam estar online mas não aparecem
-    offline_candidates = DispositivoTV.objects.filter(
-        ativo=True,
-        alerta_desconexao_enviado=False,
-        ultima_sincronizacao__isnull=False,
-        ultima_sincronizacao__lt=cutoff,
-    ).select_related('municipio', 'municipio__franqueado', 'franqueado')
+    DispositivoTV.objects.filter(id__in=[d.id for d in offline]).update(alerta_desconexao_enviado=True)
 
-    alerted = 0
-    for dispositivo in offline_candidates:
+    owners = _emails_owners()
+    falhas = []
+    for dispositivo in offline:
         try:
-            ok = send_offline_alert(dispositivo)
-            if ok:
-                dispositivo.alerta_desconexao_enviado = True
-                dispositivo.save(update_fields=['alerta_desconexao_enviado'])
-                alerted += 1
+            ok = send_offline_alert(dispositivo, owners)
         except Exception as exc:
             logger.error("alerts: erro ao processar dispositivo %s: %s", dispositivo.id, exc)
+            ok = False
+        if ok:
+            dispositivo.alerta_desconexao_enviado = True
+        else:
+            falhas.append(dispositivo)
+
+    if falhas:
+        DispositivoTV.objects.filter(id__in=[d.id for d in falhas]).update(alerta_desconexao_enviado=False)
+        proxima = timezone.now() + timezone.timedelta(seconds=getattr(settings, 'DEVICE_CHECK_INTERVAL_SECONDS', 60))
+        for dispositivo in falhas:
+            presenca.agendar(dispositivo.identificador_unico, proxima)
 
+    alerted = len(offline) - len(falhas)
     if alerted:
         logger.info("alerts: %d dispositivo(s) marcado(s) como offline e alertados.", alerted)
 
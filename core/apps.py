@@ -15,17 +15,23 @@ class CoreConfig(AppConfig):
         """
         Inicia o APScheduler que roda check_offline_devices() periodicamente.
 
+        Também registra os receivers de sinais (core/signals.py) — sempre,
+        inclusive em management commands.
+
         Guardas:
         - Só inicia no processo principal (não no reloader filho, não em manage.py commands).
         - Evita dupla inicialização com uma flag de módulo.
         """
+        from . import signals  # noqa: F401
+
         # Não rodar em management commands (migrate, collectstatic, etc.)
         import sys
         if len(sys.argv) > 1 and sys.argv[1] in (
             'migrate', 'makemigrations', 'collectstatic', 'createcachetable',
             'shell', 'dbshell', 'test', 'check',
             'create_owner', 'check_devices_offline',
-            'cleanup_orphaned_files', 'cleanup_corp_videos',
+            'cleanup_orphaned_files', 'cleanup_corp_videos', 'arquivar_logs',
+            'agregar_exibicoes',
         ):
             return
 
@@ -41,6 +47,7 @@ class CoreConfig(AppConfig):
             from apscheduler.schedulers.background import BackgroundScheduler
             from apscheduler.triggers.interval import IntervalTrigger
             from django.conf import settings
+            from django.utils import timezone
 
             interval = getattr(settings, 'DEVICE_CHECK_INTERVAL_SECONDS', 60)
 
@@ -52,6 +59,39 @@ class CoreConfig(AppConfig):
                 replace_existing=True,
                 misfire_grace_time=30,
             )
+            # Partições mensais dos logs (PostgreSQL): na subida e uma vez por dia
+            scheduler.add_job(
+                _run_garantir_particoes,
+                trigger=IntervalTrigger(hours=24),
+                id='garantir_particoes_logs',
+                replace_existing=True,
+                next_run_time=timezone.now(),
+                misfire_grace_time=3600,
+            )
+            scheduler.add_job(
+                _run_limpar_eventos_recebidos,
+                trigger=IntervalTrigger(hours=1),
+                id='limpar_eventos_recebidos',
+                replace_existing=True,
+                max_instances=1,
+                misfire_grace_time=600,
+            )
+            scheduler.add_job(
+                _run_compactar_agregados,
+                trigger=IntervalTrigger(seconds=getattr(settings, 'TV_ROLLUP_INTERVAL_SECONDS', 60)),
+                id='compactar_agregados',
+                replace_existing=True,
+                max_instances=1,
+                misfire_grace_time=60,
+            )
+            scheduler.add_job(
+                _run_atualizar_metricas,
+                trigger=IntervalTrigger(seconds=getattr(settings, 'CLIENT_METRICS_REFRESH_SECONDS', 60)),
+                id='atualizar_metricas_clientes',
+                replace_existing=True,
+                max_instances=1,
+                misfire_grace_time=60,
+            )
             scheduler.start()
             logger.info("alerts: scheduler iniciado — verificação a cada %ds.", interval)
         except ImportError:
@@ -67,3 +107,35 @@ def _run_check_offline():
         check_offline_devices()
     except Exception as exc:
         logger.error("alerts: erro no job check_offline_devices: %s", exc)
+
+
+def _run_garantir_particoes():
+    try:
+        from core.particoes import garantir_particoes
+        garantir_particoes()
+    except Exception as exc:
+        logger.error("particoes: erro ao criar partições dos logs: %s", exc)
+
+
+def _run_limpar_eventos_recebidos():
+    try:
+        from core.logs import limpar_eventos_recebidos
+        limpar_eventos_recebidos()
+    except Exception as exc:
+        logger.error("logs: erro ao limpar reservas de evento_id: %s", exc)
+
+
+def _run_compactar_agregados():
+    try:
+        from core.agregacao import compactar
+        compactar()
+    except Exception as exc:
+        logger.error("agregacao: erro ao compactar agregados de exibição: %s", exc)
+
+
+def _run_atualizar_metricas():
+    try:
+        from core.metricas import atualizar_pendentes
+        atualizar_pendentes()
+    except Exception as exc:
+        logger.error("metricas: erro ao recalcular métricas dos clientes: %s", exc)
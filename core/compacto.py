@@ -0,0 +1,136 @@
+"""
+Codificação compacta do manifesto das TVs (MessagePack).
+
+No JSON do /api/tv/auth/ a fila de vídeos repete o dict inteiro de cada
+item a cada exibição — repetições do PlaylistItem e os slots gerados pela
+distribuição proporcional (core/wfq.py). Um manifesto de 200 slots carrega
+o mesmo arquivo_url, texto_tarja e qrcode dezenas de vezes.
+
+A forma compacta troca a lista de dicts por tabelas:
+
+    valores    = ["video", "Anúncio", "https://.../a.mp4", 30, {...qrcode}, ...]
+    esquemas   = [["id", "tipo", "titulo", ...], ...]      # conjuntos de chaves
+    itens      = [[0, 7, 0, 1, 2, 3, ...], ...]             # [esquema, índices em valores...]
+    sequencia  = [[0, 3], [1, 1], [0, 2], ...]              # [item, vezes seguidas]
+
+Cada string, número ou dict aparece uma única vez em `valores`; cada item
+único uma vez em `itens`; e a fila é uma lista de run-lengths.
+expandir_manifesto() é a referência de decodificação para o app.
+
+Servida quando o app pede `Accept: application/x-msgpack`. Requer o
+pacote msgpack; sem ele o endpoint continua respondendo JSON.
+"""
+import json
+import logging
+
+from rest_framework.renderers import BaseRenderer
+
+logger = logging.getLogger(__name__)
+
+FORMATO = 1
+MEDIA_TYPE = 'application/x-msgpack'
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - dependência opcional
+    msgpack = None
+
+
+def disponivel():
+    return msgpack is not None
+
+
+def _chave_valor(valor):
+    # 1 e True são iguais em dict — o tipo entra na chave
+    return type(valor).__name__, json.dumps(valor, sort_keys=True, default=str)
+
+
+def compactar_fila(videos):
+    """Lista de dicts → {'valores', 'esquemas', 'itens', 'sequencia'}."""
+    valores, idx_valor = [], {}
+    esquemas, idx_esquema = [], {}
+    itens, idx_item = [], {}
+    sequencia = []
+
+    for video in videos:
+        chaves = tuple(video)
+        e = idx_esquema.get(chaves)
+        if e is None:
+            e = idx_esquema[chaves] = len(esquemas)
+            esquemas.append(list(chaves))
+
+        item = [e]
+        for valor in video.values():
+            k = _chave_valor(valor)
+            v = idx_valor.get(k)
+            if v is None:
+                v = idx_valor[k] = len(valores)
+                valores.append(valor)
+            item.append(v)
+
+        item = tuple(item)
+        i = idx_item.get(item)
+        if i is None:
+            i = idx_item[item] = len(itens)
+            itens.append(list(item))
+
+        if sequencia and sequencia[-1][0] == i:
+            sequencia[-1][1] += 1
+        else:
+            sequencia.append([i, 1])
+
+    return {'valores': valores, 'esquemas': esquemas, 'itens': itens, 'sequencia': sequencia}
+
+
+def expandir_fila(compacta):
+    """Inverso de compactar_fila — devolve a lista de dicts original."""
+    valores, esquemas = compacta['valores'], compacta['esquemas']
+    itens = [
+        dict(zip(esquemas[item[0]], (valores[v] for v in item[1:])))
+        for item in compacta['itens']
+    ]
+    return [dict(itens[i]) for i, vezes in compacta['sequencia'] for _ in range(vezes)]
+
+
+def compactar_manifesto(body):
+    """Corpo do /api/tv/auth/ com playlist.videos trocado por playlist.fila (compacta)."""
+    compacto = dict(body, formato=f'compacto/{FORMATO}')
+    if body.get('playlist'):
+        playlist = dict(body['playlist'])
+        playlist['fila'] = compactar_fila(playlist.pop('videos'))
+        compacto['playlist'] = playlist
+    return compacto
+
+
+def expandir_manifesto(compacto):
+    """Referência para o app: forma compacta → corpo JSON tradicional."""
+    body = {k: v for k, v in compacto.items() if k != 'formato'}
+    if compacto.get('playlist'):
+        playlist = dict(compacto['playlist'])
+        playlist['videos'] = expandir_fila(playlist.pop('fila'))
+        body['playlist'] = playlist
+    return body
+
+
+def manifesto_binario(body):
+    """Bytes MessagePack da forma compacta do manifesto."""
+    return msgpack.packb(compactar_manifesto(body), use_bin_type=True)
+
+
+class MessagePackRenderer(BaseRenderer):
+    """
+    Renderer DRF para `Accept: application/x-msgpack`. O manifesto sai
+    pronto (manifesto_binario, via core/compressao.py); demais respostas
+    (erros) são empacotadas como estão.
+    """
+    media_type = MEDIA_TYPE
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if isinstance(data, bytes):
+            return data
+        return msgpack.packb(data, use_bin_type=True, default=str)
@@ -0,0 +1,112 @@
+"""
+Respostas pré-comprimidas (gzip/brotli) para os endpoints das TVs.
+
+As lojas usam conexões com franquia de dados: o manifesto, o
+check-schedule e o HTML corporativo vão comprimidos conforme o
+Accept-Encoding do app. A compressão é feita uma vez por versão do
+conteúdo — as variantes ficam no cache compartilhado sob a chave da versão
+e os polls seguintes só copiam bytes.
+
+brotli é opcional: sem o pacote, só gzip é oferecido.
+"""
+import gzip
+import logging
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+
+logger = logging.getLogger(__name__)
+
+PREFIX = 'tvz:'
+# Abaixo disso o cabeçalho gzip custa mais do que economiza (mesmo limite do GZipMiddleware)
+MIN_BYTES = 200
+CACHE_TTL = 3600
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - dependência opcional
+    brotli = None
+
+
+def _aceitas(accept_encoding):
+    """{codificação: q} do header Accept-Encoding."""
+    aceitas = {}
+    for parte in accept_encoding.split(','):
+        nome, _, params = parte.strip().partition(';')
+        nome = nome.strip().lower()
+        if not nome:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        aceitas[nome] = q
+    return aceitas
+
+
+def escolher_codificacao(request):
+    """'br', 'gzip' ou None (identidade), pela preferência do cliente."""
+    aceitas = _aceitas(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    curinga = aceitas.get('*', 0.0)
+    candidatas = ['br', 'gzip'] if brotli is not None else ['gzip']
+    melhor, melhor_q = None, 0.0
+    for cod in candidatas:
+        q = aceitas.get(cod, curinga)
+        if q > melhor_q:
+            melhor, melhor_q = cod, q
+    return melhor
+
+
+def comprimir(dados, codificacao):
+    """
+    Retorna (codificação aplicada, bytes). Conteúdo abaixo de MIN_BYTES
+    segue sem compressão — codificação aplicada None.
+    """
+    if codificacao is None or len(dados) < MIN_BYTES:
+        return None, dados
+    if codificacao == 'br':
+        return 'br', brotli.compress(dados, quality=11)
+    return 'gzip', gzip.compress(dados, compresslevel=9, mtime=0)
+
+
+def variante(chave, codificacao, conteudo, ttl=CACHE_TTL):
+    """
+    (codificação aplicada, bytes) do conteúdo, do cache ou gerados uma vez.
+
+    chave: identifica a versão do conteúdo (ex: 'manifesto:<versao>:json').
+    conteudo: bytes ou função sem argumentos que os produz — só chamada
+    se a variante ainda não estiver no cache.
+    """
+    if codificacao is None and not callable(conteudo):
+        return None, conteudo
+    chave_cache = f'{PREFIX}{chave}:{codificacao or "identity"}'
+    resultado = cache.get(chave_cache)
+    if resultado is None:
+        resultado = comprimir(conteudo() if callable(conteudo) else conteudo, codificacao)
+        cache.set(chave_cache, resultado, ttl)
+    return resultado
+
+
+def resposta_comprimida(request, conteudo, content_type, chave=None, ttl=CACHE_TTL, status=200):
+    """
+    HttpResponse com a melhor codificação aceita pelo cliente.
+
+    Com chave, a variante comprimida é reaproveitada entre requisições;
+    sem chave (conteúdo que muda a cada chamada), comprime na hora.
+    """
+    codificacao = escolher_codificacao(request)
+    if chave is not None:
+        aplicada, dados = variante(chave, codificacao, conteudo, ttl)
+    else:
+        aplicada, dados = comprimir(conteudo() if callable(conteudo) else conteudo, codificacao)
+
+    response = HttpResponse(dados, content_type=content_type, status=status)
+    if aplicada:
+        response['Content-Encoding'] = aplicada
+    response['Content-Length'] = str(len(dados))
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
@@ -0,0 +1,281 @@
+"""
+Fast path WSGI para as rotas quentes das TVs.
+
+Heartbeat, logs de exibição (avulsos e em lote) e o manifesto (/api/tv/auth/) respondem a
+milhares de polls por minuto e são AllowAny — o dispositivo se identifica
+por identificador_unico no corpo. Mesmo assim passavam pela pilha inteira:
+sessão, CSRF, autenticação, mensagens, resolução de URL, dispatch do
+APIView, parsers e renderers do DRF.
+
+TVFastPath envolve a aplicação Django (mediaexpand/wsgi.py) e atende
+essas rotas direto: lê o JSON com orjson, chama os mesmos handlers usados
+pelas views DRF (core/views.py) e devolve bytes. Qualquer coisa fora do
+caminho comum (método diferente de POST, corpo inválido, header Origin de
+navegador, host fora de ALLOWED_HOSTS, redirecionamento HTTPS, erro de
+validação) cai na pilha Django normal, então o comportamento observável é o
+mesmo. Dos middlewares, o fast path mantém os de segurança (_Seguranca):
+sessão, CSRF e autenticação não se aplicam a rotas AllowAny sem cookie, e o
+CORS só age com header Origin.
+
+No processo de push (mediaexpand/asgi.py, start_push.sh) TVFastPathASGI faz
+o mesmo para o canal de push (/api/tv/push/), que é assíncrono: a espera
+roda direto no event loop, sem passar pelos middlewares síncronos (que
+prenderiam uma thread por conexão). O resto vai para o handler ASGI do Django.
+
+Benchmark: python manage.py benchmark_tv_api
+"""
+import asyncio
+import io
+import logging
+import re
+
+from django.core import signals
+from django.core.exceptions import DisallowedHost
+from django.core.handlers.wsgi import WSGIRequest
+from django.http import HttpResponse
+from django.middleware.clickjacking import XFrameOptionsMiddleware
+from django.middleware.security import SecurityMiddleware
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - dependência opcional
+    orjson = None
+
+# Lotes de log (core/logs.py) chegam a algumas centenas de KB
+MAX_CORPO = 1024 * 1024
+
+
+def codificar_json(data):
+    """JSON em bytes — orjson quando disponível (várias vezes mais rápido)."""
+    if orjson is not None:
+        return orjson.dumps(data, default=str)
+    import json
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'), default=str).encode()
+
+
+def decodificar_json(corpo):
+    if orjson is not None:
+        return orjson.loads(corpo)
+    import json
+    return json.loads(corpo)
+
+
+def resposta_json(data, status=200):
+    return HttpResponse(codificar_json(data), content_type='application/json', status=status)
+
+
+# ─── rotas ───────────────────────────────────────────────────────────────────
+# Cada rota recebe (request, dados) e devolve HttpResponse, ou None para
+# deixar a pilha Django/DRF responder (validação, casos raros).
+
+def _texto(dados, campo, max_length):
+    """Mesma regra do serializers.CharField: str, sem espaços nas pontas, não vazio."""
+    valor = dados.get(campo)
+    if isinstance(valor, str):
+        valor = valor.strip()
+        if valor and len(valor) <= max_length:
+            return valor
+    return None
+
+
+def _auth(request, dados):
+    from .views import tv_auth_resposta
+
+    # Mesmas regras do DispositivoTVAuthSerializer; o resto vai para o DRF (400)
+    identificador = _texto(dados, 'identificador_unico', 100)
+    versao_app = ''
+    if 'versao_app' in dados:
+        versao_app = _texto(dados, 'versao_app', 20)
+    if identificador is None or versao_app is None:
+        return None
+    # Negociação de conteúdo (msgpack, API navegável) fica com o DRF
+    if request.META.get('HTTP_ACCEPT', '*/*').split(',')[0].strip() not in ('*/*', 'application/json'):
+        return None
+    return tv_auth_resposta(request, identificador, versao_app)
+
+
+def _heartbeat(request, dados):
+    from .views import tv_heartbeat_resposta
+
+    identificador = dados.get('identificador_unico', '')
+    if not isinstance(identificador, str):
+        return None
+    return tv_heartbeat_resposta(identificador.strip())
+
+
+def _log_exibicao(request, dados):
+    from .views import tv_log_exibicao_resposta
+    return tv_log_exibicao_resposta(dados)
+
+
+def _log_webview(request, dados):
+    from .views import tv_log_webview_resposta
+    return tv_log_webview_resposta(dados)
+
+
+def _log_lote(request, dados):
+    from .views import tv_log_lote_resposta
+    return tv_log_lote_resposta(dados)
+
+
+ROTAS = {
+    '/api/tv/auth/': _auth,
+    '/api/tv/heartbeat/': _heartbeat,
+    '/api/tv/log-exibicao/': _log_exibicao,
+    '/api/tv/log-webview/': _log_webview,
+    '/api/tv/log-lote/': _log_lote,
+}
+
+
+class _Seguranca:
+    """
+    SecurityMiddleware e XFrameOptionsMiddleware do Django aplicados às
+    respostas do fast path: HSTS, nosniff, Referrer-Policy, COOP e
+    X-Frame-Options com as mesmas configurações do site.
+    """
+
+    def __init__(self):
+        self.security = SecurityMiddleware(self._nunca)
+        self.xframe = XFrameOptionsMiddleware(self._nunca)
+
+    @staticmethod
+    def _nunca(request):
+        raise AssertionError('o fast path não chama get_response')
+
+    def redirecionar(self, request):
+        """Resposta de SECURE_SSL_REDIRECT, ou None."""
+        return self.security.process_request(request)
+
+    def aplicar(self, request, response):
+        return self.xframe.process_response(request, self.security.process_response(request, response))
+
+
+# ─── WSGI ────────────────────────────────────────────────────────────────────
+
+class TVFastPath:
+    """Middleware WSGI: atende ROTAS direto e repassa o resto para `app`."""
+
+    def __init__(self, app):
+        self.app = app
+        self.seguranca = _Seguranca()
+
+    def __call__(self, environ, start_response):
+        rota = ROTAS.get(environ.get('PATH_INFO', ''))
+        if (
+            rota is None
+            or environ.get('REQUEST_METHOD') != 'POST'
+            or 'HTTP_ORIGIN' in environ  # navegador: deixa o CORS com o Django
+            or 'json' not in environ.get('CONTENT_TYPE', '')
+        ):
+            return self.app(environ, start_response)
+
+        try:
+            tamanho = int(environ.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            tamanho = -1
+        if not 0 < tamanho <= MAX_CORPO:
+            return self.app(environ, start_response)
+        corpo = environ['wsgi.input'].read(tamanho)
+        # A pilha Django ainda pode precisar do corpo (fallback)
+        environ['wsgi.input'] = io.BytesIO(corpo)
+
+        try:
+            dados = decodificar_json(corpo)
+        except ValueError:
+            dados = None
+        if not isinstance(dados, dict):
+            return self.app(environ, start_response)
+
+        request = WSGIRequest(environ)
+        try:
+            request.get_host()  # ALLOWED_HOSTS: o 400 fica com o Django
+        except DisallowedHost:
+            return self.app(environ, start_response)
+        if self.seguranca.redirecionar(request) is not None:
+            return self.app(environ, start_response)
+
+        signals.request_started.send(sender=self.__class__, environ=environ)
+        try:
+            response = rota(request, dados)
+        except Exception:
+            logger.exception('fastpath: erro em %s', environ.get('PATH_INFO'))
+            response = resposta_json({'error': 'Erro interno'}, status=500)
+        finally:
+            signals.request_finished.send(sender=self.__class__)
+
+        if response is None:
+            environ['wsgi.input'] = io.BytesIO(corpo)
+            return self.app(environ, start_response)
+
+        response = self.seguranca.aplicar(request, response)
+        status = f'{response.status_code} {response.reason_phrase}'
+        start_response(status, [*response.items(), *(('Set-Cookie', c.output(header='')) for c in response.cookies.values())])
+        return [response.content]
+
+
+# ─── ASGI ────────────────────────────────────────────────────────────────────
+
+ROTA_PUSH = re.compile(r'^/api/tv/push/(?P<identificador>[0-9a-fA-F-]{36})/$')
+
+
+async def _aguardar_desconexao(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+class TVFastPathASGI:
+    """
+    Aplicação ASGI: o canal de push vai direto para core.views.tv_push_view
+    (assíncrona); o resto — e requisição de navegador (header Origin), host
+    não permitido ou redirecionamento HTTPS — fica com `django` (handler
+    ASGI do Django).
+    """
+
+    def __init__(self, django):
+        self.django = django
+        self.seguranca = _Seguranca()
+
+    async def __call__(self, scope, receive, send):
+        rota = ROTA_PUSH.match(scope['path']) if scope['type'] == 'http' else None
+        if (
+            rota is None
+            or scope['method'] != 'GET'
+            or any(nome == b'origin' for nome, _ in scope.get('headers', []))
+        ):
+            return await self.django(scope, receive, send)
+        await self._push(scope, receive, send, rota['identificador'])
+
+    async def _push(self, scope, receive, send, identificador):
+        import uuid
+        from asgiref.sync import sync_to_async
+        from .views import tv_push_view
+
+        request, erro = self.django.create_request(scope, io.BytesIO())
+        if erro is not None:
+            return await self.django(scope, receive, send)
+        try:
+            request.get_host()
+        except DisallowedHost:
+            return await self.django(scope, receive, send)
+        if self.seguranca.redirecionar(request) is not None:
+            return await self.django(scope, receive, send)
+
+        async def atender():
+            response = await tv_push_view(request, uuid.UUID(identificador))
+            await self.django.send_response(self.seguranca.aplicar(request, response), send)
+
+        await sync_to_async(signals.request_started.send)(sender=self.__class__, scope=scope)
+        # TV que desconecta no meio da espera libera a vaga na hora (cancelamento)
+        tarefas = {asyncio.ensure_future(atender()), asyncio.ensure_future(_aguardar_desconexao(receive))}
+        try:
+            feitas, pendentes = await asyncio.wait(tarefas, return_when=asyncio.FIRST_COMPLETED)
+            for tarefa in pendentes:
+                tarefa.cancel()
+            await asyncio.gather(*pendentes, return_exceptions=True)
+            for tarefa in feitas:
+                if not tarefa.cancelled() and tarefa.exception():
+                    logger.error('fastpath: erro no push', exc_info=tarefa.exception())
+        finally:
+            await sync_to_async(signals.request_finished.send)(sender=self.__class__)
@@ -0,0 +1,588 @@
+"""
+Ingestão de logs de exibição das TVs.
+
+Antes, cada item exibido era um POST que fazia get() do dispositivo, do
+vídeo e da playlist, avaliava a programação e gravava um INSERT — no
+caminho da requisição, disputando o banco com o dashboard. Agora:
+
+- registrar_lote() (POST /api/tv/log-lote/) recebe os eventos acumulados
+  pelo app (vídeo e webview misturados), valida todos os ids com uma
+  consulta `in` por modelo e grava com bulk_create;
+- enfileirar() (POST /api/tv/log-exibicao/ e /api/tv/log-webview/) valida
+  o formato e os ids (com memória por processo, ver _existe) e põe o evento
+  num buffer em memória, gravado em lote por uma thread de fundo
+  (write-behind, ver _Buffer);
+- registrar_backlog() (POST /api/tv/log-backlog/) lê em streaming o
+  arquivo NDJSON (gzip) acumulado por uma TV que ficou offline.
+
+Todo evento pode trazer `evento_id`, gerado pelo app (uuid ou sequência do
+dispositivo): reenvios depois de falha de rede não duplicam logs. O par
+(dispositivo, evento_id) é reservado em EventoRecebido na mesma transação
+que grava o log (_reservar) — vale mesmo para reenvios simultâneos e com
+outro data_hora_inicio; depois de TV_LOG_DEDUP_HOURS a reserva é apagada e o
+reenvio é reconhecido pelo log já gravado (_eventos_gravados, que depende de
+data_hora_fim igual).
+
+Evento de vídeo:
+    {"tipo": "video", "evento_id": "8f3c...", "video_id": 7, "tempo_exibicao_segundos": 30,
+     "playlist_id": 3, "data_hora_fim": "2026-10-17T10:15:00-03:00"}
+
+Evento de webview:
+    {"tipo": "webview", "conteudo_corporativo_id": 2, "duracao_segundos": 20,
+     "tipo_conteudo": "DESIGN", "titulo": "...", "data_hora_fim": "..."}
+
+data_hora_fim é o fim da exibição no relógio da TV (padrão: agora). Sem
+playlist_id válido, a playlist vem da programação vigente no início da
+exibição (core/timeline.py) — não da programação do momento do envio.
+"""
+import atexit
+import gzip
+import logging
+import threading
+import time
+import uuid
+
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+logger = logging.getLogger(__name__)
+
+MAX_EVENTOS = 1000
+TIPOS = ('video', 'webview')
+
+
+class LoteInvalido(ValueError):
+    """Lote recusado por inteiro (dispositivo inexistente, formato, tamanho)."""
+
+    def __init__(self, mensagem, status=400):
+        super().__init__(mensagem)
+        self.status = status
+
+
+def _inteiro(valor, padrao=None):
+    if valor in (None, ''):
+        return padrao
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        raise ValueError(f'número inválido: {valor!r}')
+
+
+def _fim(valor, agora):
+    """data_hora_fim do evento — ISO 8601, nunca no futuro."""
+    if not valor:
+        return agora
+    fim = parse_datetime(str(valor))
+    if fim is None:
+        raise ValueError('data_hora_fim inválida')
+    if timezone.is_naive(fim):
+        fim = timezone.make_aware(fim)
+    return min(fim, agora)
+
+
+def _normalizar(evento, agora):
+    """Evento bruto → dict com ids e tempos já convertidos (ValueError se inválido)."""
+    if not isinstance(evento, dict):
+        raise ValueError('evento deve ser um objeto')
+    tipo = evento.get('tipo') or 'video'
+    if tipo not in TIPOS:
+        raise ValueError(f'tipo inválido: {tipo}')
+
+    fim = _fim(evento.get('data_hora_fim'), agora)
+    evento_id = evento.get('evento_id')
+    evento_id = str(evento_id)[:64] if evento_id not in (None, '') else None
+    if tipo == 'video':
+        video_id = _inteiro(evento.get('video_id'))
+        if not video_id:
+            raise ValueError('video_id é obrigatório')
+        segundos = max(0, _inteiro(evento.get('tempo_exibicao_segundos'), 0))
+        return {
+            'tipo': tipo, 'fim': fim, 'evento_id': evento_id,
+            'segundos': segundos, 'video_id': video_id,
+            'playlist_id': _inteiro(evento.get('playlist_id')),
+        }
+    return {
+        'tipo': tipo, 'fim': fim, 'evento_id': evento_id,
+        'segundos': max(0, _inteiro(evento.get('duracao_segundos'), 0)),
+        'conteudo_corporativo_id': _inteiro(evento.get('conteudo_corporativo_id')),
+        'tipo_conteudo': str(evento.get('tipo_conteudo') or 'DESIGN')[:20],
+        'titulo': str(evento.get('titulo') or 'Conteúdo Corporativo')[:200],
+    }
+
+
+def _completo(segundos, duracao_prevista):
+    # ≥90% do tempo previsto, ou duração desconhecida → completo
+    if duracao_prevista and duracao_prevista > 0:
+        return segundos / duracao_prevista >= 0.9
+    return True
+
+
+def _gravar(pendentes):
+    """
+    Grava eventos já normalizados com um bulk_create por modelo.
+
+    pendentes: [(dispositivo, indice, evento)] — dispositivo é a instância
+    de DispositivoTV. Retorna (criados, duplicados, rejeitados).
+
+    Eventos com evento_id já gravado para o dispositivo (ou repetido no
+    próprio lote) são contados como duplicados e ignorados.
+    """
+    from .models import ConteudoCorporativo, LogExibicao, LogExibicaoWebView, Playlist, Video
+    from .timeline import obter_timeline
+
+    # Uma consulta `in` por modelo para o lote inteiro
+    video_ids = {e['video_id'] for _, _, e in pendentes if e['tipo'] == 'video'}
+    playlist_ids = {e['playlist_id'] for _, _, e in pendentes if e.get('playlist_id')}
+    cc_ids = {e['conteudo_corporativo_id'] for _, _, e in pendentes if e.get('conteudo_corporativo_id')}
+    duracoes = dict(Video.objects.filter(id__in=video_ids).values_list('id', 'duracao_segundos')) if video_ids else {}
+    playlists = set(Playlist.objects.filter(id__in=playlist_ids).values_list('id', flat=True)) if playlist_ids else set()
+    corporativos = {
+        cc['id']: cc for cc in ConteudoCorporativo.objects.filter(id__in=cc_ids).values(
+            'id', 'titulo', 'tipo', 'duracao_segundos',
+        )
+    } if cc_ids else {}
+
+    vistos = {
+        'video': _eventos_gravados(LogExibicao, pendentes, 'video'),
+        'webview': _eventos_gravados(LogExibicaoWebView, pendentes, 'webview'),
+    }
+
+    rejeitados = []
+    duplicados = 0
+    logs_video, logs_webview = [], []
+    for dispositivo, indice, e in pendentes:
+        if e['evento_id'] is not None:
+            chave = (dispositivo.id, e['evento_id'])
+            if chave in vistos[e['tipo']]:
+                duplicados += 1
+                continue
+            vistos[e['tipo']].add(chave)
+        inicio = e['fim'] - timezone.timedelta(seconds=e['segundos'])
+        if e['tipo'] == 'video':
+            if e['video_id'] not in duracoes:
+                rejeitados.append({'indice': indice, 'erro': 'Vídeo não encontrado'})
+                continue
+            playlist_id = e['playlist_id'] if e['playlist_id'] in playlists else None
+            if playlist_id is None:
+                ags = obter_timeline(dispositivo).agendamentos_em(inicio)
+                playlist_id = ags[0].playlist.id if ags else dispositivo.playlist_atual_id
+            if playlist_id is None:
+                rejeitados.append({'indice': indice, 'erro': 'Playlist não identificada'})
+                continue
+            logs_video.append(LogExibicao(
+                dispositivo=dispositivo,
+                video_id=e['video_id'],
+                playlist_id=playlist_id,
+                data_hora_inicio=inicio,
+                data_hora_fim=e['fim'],
+                completamente_exibido=_completo(e['segundos'], duracoes[e['video_id']]),
+                evento_id=e['evento_id'],
+            ))
+        else:
+            cc = corporativos.get(e['conteudo_corporativo_id'])
+            logs_webview.append(LogExibicaoWebView(
+                dispositivo=dispositivo,
+                playlist_id=dispositivo.playlist_atual_id,
+                conteudo_corporativo_id=cc['id'] if cc else None,
+                tipo_conteudo=cc['tipo'] if cc else e['tipo_conteudo'],
+                titulo=cc['titulo'] if cc else e['titulo'],
+                duracao_segundos=e['segundos'],
+                data_hora_inicio=inicio,
+                data_hora_fim=e['fim'],
+                completamente_exibido=_completo(
+                    e['segundos'], (cc and cc['duracao_segundos']) or e['segundos'],
+                ),
+                evento_id=e['evento_id'],
+            ))
+
+    with transaction.atomic():
+        # Reenvio concorrente do mesmo evento espera esta transação e cai como duplicado
+        novos = _reservar(
+            [(log.dispositivo_id, 'video', log.evento_id) for log in logs_video if log.evento_id]
+            + [(log.dispositivo_id, 'webview', log.evento_id) for log in logs_webview if log.evento_id]
+        )
+        total = len(logs_video) + len(logs_webview)
+        logs_video = [
+            log for log in logs_video if not log.evento_id or (log.dispositivo_id, 'video', log.evento_id) in novos
+        ]
+        logs_webview = [
+            log for log in logs_webview if not log.evento_id or (log.dispositivo_id, 'webview', log.evento_id) in novos
+        ]
+        duplicados += total - len(logs_video) - len(logs_webview)
+        # ignore_conflicts: último recurso contra o índice único dos logs
+        if logs_video:
+            LogExibicao.objects.bulk_create(logs_video, ignore_conflicts=True)
+        if logs_webview:
+            LogExibicaoWebView.objects.bulk_create(logs_webview, ignore_conflicts=True)
+    return {'video': len(logs_video), 'webview': len(logs_webview)}, duplicados, rejeitados
+
+
+def _reservar(chaves):
+    """
+    Reserva em EventoRecebido as chaves (dispositivo_id, tipo, evento_id) e
+    retorna as que ainda não existiam. Chamar dentro da transação que grava os
+    logs: se ela falhar, as reservas também voltam.
+    """
+    from .models import EventoRecebido
+
+    if not chaves:
+        return set()
+    lote = uuid.uuid4().hex
+    EventoRecebido.objects.bulk_create(
+        [EventoRecebido(dispositivo_id=d, tipo=t, evento_id=e, lote=lote) for d, t, e in chaves],
+        ignore_conflicts=True,
+    )
+    # As linhas com o nosso `lote` são as que este INSERT criou
+    return set(EventoRecebido.objects.filter(
+        dispositivo_id__in={d for d, _, _ in chaves},
+        evento_id__in={e for _, _, e in chaves},
+        lote=lote,
+    ).values_list('dispositivo_id', 'tipo', 'evento_id'))
+
+
+def limpar_eventos_recebidos():
+    """Apaga as reservas de evento_id mais antigas que TV_LOG_DEDUP_HOURS. Retorna quantas."""
+    from django.conf import settings
+    from .models import EventoRecebido
+
+    limite = timezone.now() - timezone.timedelta(hours=getattr(settings, 'TV_LOG_DEDUP_HOURS', 48))
+    removidos, _ = EventoRecebido.objects.filter(recebido_em__lt=limite).delete()
+    return removidos
+
+
+def _eventos_gravados(modelo, pendentes, tipo):
+    """{(dispositivo_id, evento_id)} do lote que já estão no banco — uma consulta."""
+    ids = {e['evento_id'] for _, _, e in pendentes if e['tipo'] == tipo and e['evento_id'] is not None}
+    if not ids:
+        return set()
+    dispositivos = {d.id for d, _, e in pendentes if e['tipo'] == tipo and e['evento_id'] is not None}
+    # Faixa de datas do lote (com folga para o relógio da TV): no PostgreSQL
+    # a consulta só lê as partições mensais envolvidas (core/particoes.py)
+    fins = [e['fim'] for _, _, e in pendentes if e['tipo'] == tipo and e['evento_id'] is not None]
+    segundos = max(e['segundos'] for _, _, e in pendentes if e['tipo'] == tipo and e['evento_id'] is not None)
+    return set(modelo.objects.filter(
+        dispositivo_id__in=dispositivos, evento_id__in=ids,
+        data_hora_inicio__gte=min(fins) - timezone.timedelta(seconds=segundos, days=1),
+        data_hora_inicio__lte=max(fins),
+    ).values_list('dispositivo_id', 'evento_id'))
+
+
+def _normalizar_todos(eventos, agora):
+    """[(indice, evento normalizado)], [rejeitados por formato]."""
+    validos, rejeitados = [], []
+    for indice, bruto in enumerate(eventos):
+        try:
+            validos.append((indice, _normalizar(bruto, agora)))
+        except (TypeError, ValueError) as e:
+            rejeitados.append({'indice': indice, 'erro': str(e)})
+    return validos, rejeitados
+
+
+def _dispositivo(dispositivo_id):
+    from .models import DispositivoTV
+
+    try:
+        return DispositivoTV.objects.get(id=_inteiro(dispositivo_id))
+    except (DispositivoTV.DoesNotExist, TypeError, ValueError):
+        raise LoteInvalido('Dispositivo não encontrado', status=404)
+
+
+def registrar_lote(dispositivo_id, eventos):
+    """
+    Grava os eventos do dispositivo com um bulk_create por modelo.
+
+    Retorna {'criados': {'video': n, 'webview': n}, 'rejeitados': [{'indice', 'erro'}]}.
+    Eventos inválidos são rejeitados individualmente; o resto do lote é gravado.
+    Levanta LoteInvalido se o lote inteiro não puder ser aceito.
+    """
+    if not isinstance(eventos, list):
+        raise LoteInvalido('eventos deve ser uma lista')
+    if len(eventos) > MAX_EVENTOS:
+        raise LoteInvalido(f'no máximo {MAX_EVENTOS} eventos por lote', status=413)
+    dispositivo = _dispositivo(dispositivo_id)
+
+    validos, rejeitados = _normalizar_todos(eventos, timezone.now())
+    criados, duplicados, nao_gravados = _gravar([(dispositivo, i, e) for i, e in validos])
+    rejeitados += nao_gravados
+    if rejeitados:
+        logger.info('logs: lote do dispositivo %s com %d evento(s) rejeitado(s)', dispositivo.id, len(rejeitados))
+
+    rejeitados.sort(key=lambda r: r['indice'])
+    return {'criados': criados, 'duplicados': duplicados, 'rejeitados': rejeitados}
+
+
+# ─── backlog offline ─────────────────────────────────────────────────────────
+# Uma TV que ficou offline acumula milhares de eventos. Em vez de um POST por
+# evento, ela envia um arquivo NDJSON (um evento JSON por linha, opcionalmente
+# gzip) que é lido em streaming e gravado em pedaços de BACKLOG_PEDACO linhas,
+# cada um na sua transação. Com evento_id o reenvio de um upload interrompido
+# não duplica nada.
+
+BACKLOG_PEDACO = 500
+BACKLOG_MAX_LINHAS = 200_000
+# Limite por linha — protege contra arquivo gzip malicioso sem quebras de linha
+BACKLOG_MAX_LINHA = 16 * 1024
+BACKLOG_MAX_REJEITADOS = 100
+
+
+def _linhas(fluxo):
+    """(número, bytes) de cada linha não vazia; linhas acima do limite saem como None."""
+    numero = 0
+    while True:
+        linha = fluxo.readline(BACKLOG_MAX_LINHA + 1)
+        if not linha:
+            return
+        numero += 1
+        if len(linha) > BACKLOG_MAX_LINHA and not linha.endswith(b'\n'):
+            # Descarta o resto da linha longa
+            while linha and not linha.endswith(b'\n'):
+                linha = fluxo.readline(BACKLOG_MAX_LINHA + 1)
+            yield numero, None
+            continue
+        if linha.strip():
+            yield numero, linha
+
+
+def registrar_backlog(dispositivo_id, fluxo, comprimido=False):
+    """
+    Lê eventos NDJSON de `fluxo` (arquivo ou a própria requisição) e grava em pedaços.
+
+    Retorna {'linhas', 'criados', 'duplicados', 'rejeitados'} — rejeitados
+    traz as primeiras BACKLOG_MAX_REJEITADOS falhas, com o número da linha
+    em 'indice'. Se o arquivo terminar corrompido, o que veio antes já está
+    gravado e o resultado traz 'erro'.
+    """
+    from .fastpath import decodificar_json
+
+    dispositivo = _dispositivo(dispositivo_id)
+    if comprimido:
+        fluxo = gzip.GzipFile(fileobj=fluxo, mode='rb')
+
+    resultado = {'linhas': 0, 'criados': {'video': 0, 'webview': 0}, 'duplicados': 0, 'rejeitados': []}
+    total_rejeitados = 0
+
+    def _rejeitar(numero, erro):
+        nonlocal total_rejeitados
+        total_rejeitados += 1
+        if len(resultado['rejeitados']) < BACKLOG_MAX_REJEITADOS:
+            resultado['rejeitados'].append({'indice': numero, 'erro': erro})
+
+    def _gravar_pedaco(pedaco):
+        criados, duplicados, rejeitados = _gravar(pedaco)
+        for tipo, n in criados.items():
+            resultado['criados'][tipo] += n
+        resultado['duplicados'] += duplicados
+        for r in rejeitados:
+            _rejeitar(r['indice'], r['erro'])
+
+    pedaco = []
+    agora = timezone.now()
+    try:
+        for numero, linha in _linhas(fluxo):
+            if numero > BACKLOG_MAX_LINHAS:
+                resultado['erro'] = f'no máximo {BACKLOG_MAX_LINHAS} linhas por arquivo'
+                break
+            resultado['linhas'] = numero
+            if linha is None:
+                _rejeitar(numero, 'linha muito longa')
+                continue
+            try:
+                pedaco.append((dispositivo, numero, _normalizar(decodificar_json(linha), agora)))
+            except (TypeError, ValueError) as e:
+                _rejeitar(numero, str(e))
+            if len(pedaco) >= BACKLOG_PEDACO:
+                _gravar_pedaco(pedaco)
+                pedaco = []
+    except (OSError, EOFError):
+        resultado['erro'] = f'arquivo corrompido ou incompleto após a linha {resultado["linhas"]}'
+    if pedaco:
+        _gravar_pedaco(pedaco)
+
+    resultado['total_rejeitados'] = total_rejeitados
+    logger.info(
+        'logs: backlog do dispositivo %s — %d linha(s), %s criado(s), %d duplicado(s), %d rejeitado(s)',
+        dispositivo.id, resultado['linhas'], resultado['criados'], resultado['duplicados'], total_rejeitados,
+    )
+    return resultado
+
+
+# ─── write-behind ────────────────────────────────────────────────────────────
+# Os endpoints de evento avulso (log-exibicao, log-webview) validam e
+# enfileiram: a resposta (202) não espera a gravação. Uma thread por
+# processo grava o buffer a cada TV_LOG_FLUSH_SECONDS ou assim que ele junta
+# TV_LOG_FLUSH_ROWS eventos. O buffer é limitado (TV_LOG_BUFFER_MAX): cheio,
+# quem chega grava direto no banco — a requisição fica lenta (contrapressão)
+# mas nenhum evento se perde. O que estiver no buffer é gravado ao encerrar o
+# processo (atexit). TV_LOG_FLUSH_SECONDS = 0 desliga o buffer.
+# Se a gravação falhar, o lote é dividido ao meio até isolar o evento ruim;
+# ele volta ao buffer e, depois de TV_LOG_FLUSH_ATTEMPTS falhas, vai para o
+# log de erro e é descartado — não trava os demais para sempre.
+
+class _Buffer:
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._pendentes = []  # [(dispositivo_id, evento normalizado)]
+        self._thread = None
+
+    def _config(self):
+        from django.conf import settings
+        return (
+            getattr(settings, 'TV_LOG_FLUSH_SECONDS', 5),
+            getattr(settings, 'TV_LOG_FLUSH_ROWS', 500),
+            getattr(settings, 'TV_LOG_BUFFER_MAX', 10000),
+        )
+
+    def adicionar(self, itens):
+        """True se os itens couberam no buffer; False → o chamador grava direto."""
+        segundos, linhas, maximo = self._config()
+        if segundos <= 0:
+            return False
+        with self._cond:
+            if len(self._pendentes) + len(itens) > maximo:
+                return False
+            self._pendentes.extend(itens)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name='tv-logs-flush', daemon=True)
+                self._thread.start()
+                atexit.register(self.esvaziar)
+            if len(self._pendentes) >= linhas:
+                self._cond.notify()
+        return True
+
+    def _loop(self):
+        while True:
+            segundos, linhas, _ = self._config()
+            with self._cond:
+                self._cond.wait_for(lambda: len(self._pendentes) >= linhas, timeout=segundos)
+            self.esvaziar()
+
+    def esvaziar(self):
+        """Grava tudo o que está no buffer (thread de flush e atexit)."""
+        with self._cond:
+            lote, self._pendentes = self._pendentes, []
+        if not lote:
+            return 0
+        try:
+            falhas = self._gravar(lote)
+        finally:
+            close_old_connections()
+        if falhas:
+            self._devolver(falhas)
+        return len(lote)
+
+    def _gravar(self, lote):
+        """
+        Grava o lote; se falhar, divide ao meio até isolar o(s) evento(s) que
+        falham sozinhos — o resto do lote é gravado. Retorna os que falharam
+        (com a tentativa contada, se falharam sozinhos).
+        """
+        from django.db import InterfaceError, OperationalError
+
+        try:
+            gravar_pendentes(lote)
+            return []
+        except (OperationalError, InterfaceError):
+            # Banco indisponível: dividir não adianta, o lote volta inteiro sem contar tentativa
+            logger.exception('logs: falha ao gravar %d evento(s) do buffer', len(lote))
+            return lote
+        except Exception:
+            if len(lote) > 1:
+                meio = len(lote) // 2
+                return self._gravar(lote[:meio]) + self._gravar(lote[meio:])
+            dispositivo_id, evento = lote[0]
+            logger.exception('logs: falha ao gravar evento do dispositivo %s', dispositivo_id)
+            return [(dispositivo_id, {**evento, 'tentativas': evento.get('tentativas', 0) + 1})]
+
+    def _devolver(self, falhas):
+        """Devolve ao buffer para a próxima passada, respeitando o limite e as tentativas."""
+        from django.conf import settings
+
+        tentativas = getattr(settings, 'TV_LOG_FLUSH_ATTEMPTS', 5)
+        descartados = [item for item in falhas if item[1].get('tentativas', 0) >= tentativas]
+        for dispositivo_id, evento in descartados:
+            logger.error(
+                'logs: evento descartado após %d tentativas (dispositivo %s): %r', tentativas, dispositivo_id, evento,
+            )
+        falhas = [item for item in falhas if item[1].get('tentativas', 0) < tentativas]
+        with self._cond:
+            espaco = max(0, self._config()[2] - len(self._pendentes))
+            self._pendentes[:0] = falhas[:espaco]
+        if len(falhas) > espaco:
+            logger.error('logs: %d evento(s) descartado(s) — buffer cheio', len(falhas) - espaco)
+
+    def __len__(self):
+        return len(self._pendentes)
+
+
+_buffer = _Buffer()
+
+
+def gravar_pendentes(itens):
+    """Grava [(dispositivo_id, evento normalizado)] de vários dispositivos."""
+    from .models import DispositivoTV
+    from .timeline import carregar_timelines
+
+    dispositivos = DispositivoTV.objects.in_bulk({d for d, _ in itens})
+    carregar_timelines(list(dispositivos.values()))
+    pendentes = [
+        (dispositivos[d], indice, e)
+        for indice, (d, e) in enumerate(itens) if d in dispositivos
+    ]
+    if len(pendentes) < len(itens):
+        logger.info('logs: %d evento(s) de dispositivo inexistente ignorado(s)', len(itens) - len(pendentes))
+    criados, _, rejeitados = _gravar(pendentes)
+    if rejeitados:
+        logger.info('logs: %d evento(s) do buffer rejeitado(s): %s', len(rejeitados), rejeitados[:5])
+    return criados
+
+
+# Existência de dispositivo e vídeo para os endpoints avulsos, lembrada por
+# TV_LOG_ID_CACHE_SECONDS em cada processo: a TV com id velho recebe 404 (como
+# antes do buffer) sem custar uma consulta por evento.
+_ids_lock = threading.Lock()
+_ids_conhecidos = {}  # (modelo, id) → (existe, instante)
+_IDS_MAX = 10000
+
+
+def _existe(modelo, pk):
+    from django.conf import settings
+
+    chave = (modelo.__name__, pk)
+    agora = time.monotonic()
+    with _ids_lock:
+        anotado = _ids_conhecidos.get(chave)
+    if anotado and agora - anotado[1] < getattr(settings, 'TV_LOG_ID_CACHE_SECONDS', 300):
+        return anotado[0]
+    existe = modelo.objects.filter(pk=pk).exists()
+    with _ids_lock:
+        if len(_ids_conhecidos) >= _IDS_MAX:
+            _ids_conhecidos.clear()
+        _ids_conhecidos[chave] = (existe, agora)
+    return existe
+
+
+def enfileirar(dispositivo_id, evento):
+    """
+    Valida o evento avulso e o coloca no buffer de gravação.
+    Levanta LoteInvalido (404) para dispositivo ou vídeo
+    inexistente e ValueError se o evento for inválido.
+    """
+    from .models import DispositivoTV, Video
+
+    dispositivo_id = _inteiro(dispositivo_id)
+    if not dispositivo_id:
+        raise ValueError('dispositivo_id é obrigatório')
+    item = (dispositivo_id, _normalizar(evento, timezone.now()))
+    # Mesmo critério de _dispositivo() e gravar_pendentes(): só o id, ativo ou não
+    if not _existe(DispositivoTV, dispositivo_id):
+        raise LoteInvalido('Dispositivo não encontrado', status=404)
+    if item[1]['tipo'] == 'video' and not _existe(Video, item[1]['video_id']):
+        raise LoteInvalido('Vídeo não encontrado', status=404)
+    if not _buffer.adicionar([item]):
+        gravar_pendentes([item])
+
+
+def esvaziar_buffer():
+    """Grava imediatamente o que estiver pendente neste processo."""
+    return _buffer.esvaziar()
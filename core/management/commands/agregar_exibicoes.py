@@ -0,0 +1,33 @@
+"""
+Management command para atualizar os agregados de exibição (core/agregacao.py).
+
+Uso:
+    python manage.py agregar_exibicoes
+    python manage.py agregar_exibicoes --reconstruir   (apaga e refaz a partir dos logs)
+
+--reconstruir só enxerga os logs ainda no banco: meses já arquivados por
+arquivar_logs somem dos agregados.
+"""
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Agrega os logs de exibição pendentes nas tabelas por hora e por dia'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reconstruir',
+            action='store_true',
+            help='Apaga os agregados e refaz a partir de todos os logs no banco',
+        )
+
+    def handle(self, *args, **options):
+        from django.db.models import Max
+        from core.agregacao import compactar, reconstruir
+        from core.models import LogExibicao
+
+        if options['reconstruir']:
+            total = reconstruir()
+        else:
+            total = compactar(ate=LogExibicao.objects.aggregate(m=Max('id'))['m'])
+        self.stdout.write(self.style.SUCCESS(f'{total} log(s) agregado(s).'))
@@ -0,0 +1,76 @@
+"""
+Management command de retenção dos logs de exibição.
+
+Arquiva em NDJSON gzip no storage (arquivo-logs/<tabela>/<AAAA-MM>.ndjson.gz)
+e remove do banco os meses anteriores a TV_LOG_RETENTION_MONTHS — ver
+core/particoes.py. Os agregados por hora do mesmo período também são
+apagados; os por dia ficam (relatórios históricos — core/agregacao.py).
+
+Uso:
+    python manage.py arquivar_logs
+    python manage.py arquivar_logs --meses 6
+    python manage.py arquivar_logs --dry-run
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = 'Arquiva no storage e remove do banco os logs de exibição mais antigos que a retenção'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--meses', type=int, default=None,
+            help='Meses mantidos no banco (padrão: TV_LOG_RETENTION_MONTHS).',
+        )
+        parser.add_argument(
+            '--lote', type=int, default=5000,
+            help='Linhas por lote de leitura/remoção (padrão: 5000).',
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Apenas lista os meses e quantidades, sem arquivar.',
+        )
+
+    def handle(self, *args, **options):
+        from core import particoes
+
+        meses = options['meses']
+        if meses is None:
+            meses = getattr(settings, 'TV_LOG_RETENTION_MONTHS', 12)
+        if meses < 1:
+            raise CommandError('--meses deve ser pelo menos 1.')
+
+        particoes.garantir_particoes()
+
+        # Corte: início do mês corrente menos `meses` meses (UTC)
+        corte = particoes.mes_de(timezone.now())
+        for _ in range(meses):
+            corte = particoes.mes_de(corte - timezone.timedelta(days=1))
+        self.stdout.write(f'Mantendo logs a partir de {corte:%Y-%m}.')
+
+        total = 0
+        for modelo in particoes.modelos():
+            tabela = modelo._meta.db_table
+            for mes in particoes.meses_anteriores(modelo, corte):
+                if options['dry_run']:
+                    linhas = modelo.objects.filter(
+                        data_hora_inicio__gte=mes, data_hora_inicio__lt=particoes.proximo_mes(mes),
+                    ).count()
+                    self.stdout.write(f'  [dry-run] {tabela} {mes:%Y-%m}: {linhas} linha(s)')
+                    total += linhas
+                    continue
+                caminho, linhas = particoes.arquivar(modelo, mes, lote=options['lote'])
+                if caminho:
+                    self.stdout.write(f'  {tabela} {mes:%Y-%m}: {linhas} linha(s) → {caminho}')
+                total += linhas
+
+        if not options['dry_run']:
+            from core.models import ExibicaoPorHora
+            removidos, _ = ExibicaoPorHora.objects.filter(hora__lt=corte).delete()
+            if removidos:
+                self.stdout.write(f'  {removidos} agregado(s) por hora removido(s).')
+
+        verbo = 'seriam arquivada(s)' if options['dry_run'] else 'arquivada(s)'
+        self.stdout.write(self.style.SUCCESS(f'{total} linha(s) {verbo}.'))
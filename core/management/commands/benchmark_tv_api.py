@@ -0,0 +1,91 @@
+import io
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+def _environ(path, corpo, **headers):
+    dados = json.dumps(corpo).encode()
+    environ = {
+        'REQUEST_METHOD': 'POST',
+        'PATH_INFO': path,
+        'SCRIPT_NAME': '',
+        'QUERY_STRING': '',
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': 'localhost',
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(dados)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': io.BytesIO(dados),
+        'wsgi.errors': io.StringIO(),
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    environ.update(headers)
+    return environ
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara a latência dos endpoints das TVs (auth, auth 304, heartbeat) '
+        'pela pilha Django/DRF e pelo fast path WSGI (core/fastpath.py).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('identificador', help='identificador_unico de um dispositivo ativo.')
+        parser.add_argument('-n', type=int, default=300, help='Requisições por cenário (padrão: 300).')
+
+    def handle(self, *args, **options):
+        from django.core.wsgi import get_wsgi_application
+        from core.fastpath import TVFastPath
+        from core.models import DispositivoTV
+
+        ident = options['identificador']
+        n = options['n']
+        if not DispositivoTV.objects.filter(identificador_unico=ident, ativo=True).exists():
+            raise CommandError(f'Dispositivo ativo "{ident}" não encontrado.')
+
+        django_app = get_wsgi_application()
+        fast_app = TVFastPath(django_app)
+        # ETag vigente para o cenário 304
+        etag = dict(self._chamar(fast_app, _environ('/api/tv/auth/', {'identificador_unico': ident}))[1]).get('ETag')
+
+        cenarios = [
+            ('auth', '/api/tv/auth/', {}),
+            ('auth 304', '/api/tv/auth/', {'HTTP_IF_NONE_MATCH': etag or '*'}),
+            ('heartbeat', '/api/tv/heartbeat/', {}),
+        ]
+        self.stdout.write(f'{n} requisições por cenário (µs/req, mediana)\n')
+        self.stdout.write(f'{"cenário":<12}{"django":>10}{"fastpath":>10}{"ganho":>8}')
+        for nome, path, headers in cenarios:
+            corpo = {'identificador_unico': ident}
+            lento = self._medir(django_app, path, corpo, headers, n)
+            rapido = self._medir(fast_app, path, corpo, headers, n)
+            self.stdout.write(f'{nome:<12}{lento:>10.0f}{rapido:>10.0f}{lento / rapido:>7.1f}x')
+
+    def _chamar(self, app, environ):
+        resultado = {}
+
+        def start_response(status, headers, exc_info=None):
+            resultado['status'], resultado['headers'] = status, headers
+
+        corpo = b''.join(app(environ, start_response))
+        return resultado['status'], resultado['headers'], corpo
+
+    def _medir(self, app, path, corpo, headers, n):
+        # Aquecimento: cache de manifesto, conexões, imports tardios
+        for _ in range(10):
+            self._chamar(app, _environ(path, corpo, **headers))
+        tempos = []
+        for _ in range(n):
+            environ = _environ(path, corpo, **headers)
+            inicio = time.perf_counter()
+            self._chamar(app, environ)
+            tempos.append((time.perf_counter() - inicio) * 1e6)
+        tempos.sort()
+        return tempos[len(tempos) // 2]
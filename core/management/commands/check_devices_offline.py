@@ -26,11 +26,16 @@ class Command(BaseCommand):
                 ultima_sincronizacao__isnull=False,
                 ultima_sincronizacao__lt=cutoff,
             ).select_related('municipio')
+            # Presença recente pode estar só no cache (core/presenca.py)
+            from core.presenca import carregar
+            offline = list(offline)
+            carregar(offline)
+            offline = [d for d in offline if d.ultima_sincronizacao < cutoff]
 
             self.stdout.write(self.style.WARNING(
                 f'[dry-run] Threshold: {threshold} min | Corte: {cutoff:%d/%m/%Y %H:%M:%S}'
             ))
-            if not offline.exists():
+            if not offline:
                 self.stdout.write(self.style.SUCCESS('Nenhum dispositivo offline.'))
                 return
 
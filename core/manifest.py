@@ -0,0 +1,868 @@
+"""
+Manifesto pré-compilado das playlists para o app de TV.
+
+O corpo retornado por POST /api/tv/auth/ só muda quando:
+- um Video, PlaylistItem, Playlist ou ConteudoCorporativo de uma playlist
+  exibida pelo dispositivo é alterado, ou o seu Municipio;
+- os agendamentos / dados do próprio dispositivo mudam;
+- uma fronteira de horário é cruzada (início/fim de agendamento, troca de dia
+  da semana, publicação/expiração de vídeo SCHEDULED).
+
+Em vez de recalcular tudo a cada poll, o manifesto de cada dispositivo é
+compilado uma vez, guardado no cache compartilhado com um hash de versão
+(usado como ETag) e reaproveitado até ser invalidado pelos sinais
+(core/signals.py) ou até a próxima fronteira de horário.
+
+Os itens serializados de cada playlist (fragmento) também ficam no cache,
+compartilhados por todas as TVs que a exibem: a chave leva o token de
+conteúdo da playlist, trocado só quando ela, seus itens ou seus vídeos
+mudam. Filas de classe e manifestos guardam os tokens das playlists que
+usaram e deixam de valer quando um deles muda — alterar uma playlist só
+recompila as TVs que a exibem (invalidar_playlists). A única parte por TV — o dispositivo_id nas URLs de conteúdo
+corporativo — é inserida na composição.
+
+Dispositivos com a mesma programação (mesma assinatura de timeline, ver
+core/timeline.py) formam uma classe: a fila mesclada/WFQ é montada uma vez
+por classe e só personalizada por TV.
+
+Se a fila proporcional não comporta uma volta completa de todas as playlists
+(core/wfq.py), ela é uma janela: vale por uma passada da fila (pelo menos
+TV_MANIFEST_JANELA_MIN_SECONDS) e a classe guarda em cache onde cada
+playlist parou, para que a próxima janela continue a sequência. O plano
+offline encadeia as janelas segmento a segmento (compilar_plano).
+"""
+import hashlib
+import json
+import logging
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.utils import timezone
+from django.utils.http import parse_etags
+
+logger = logging.getLogger(__name__)
+
+# Incrementar quando o formato/algoritmo do manifesto mudar — descarta o cache
+# compilado pela versão anterior do código após o deploy.
+FORMATO = 5
+
+GEN_KEY = 'tvmanifest:gen'
+KEY_PREFIX = f'tvmanifest:v{FORMATO}:disp:'
+VERSAO_PREFIX = f'tvmanifest:v{FORMATO}:ver:'
+FRAG_PREFIX = f'tvmanifest:v{FORMATO}:frag:'
+FRAG_VERSAO_PREFIX = 'tvmanifest:pver:'
+CLASSE_PREFIX = f'tvmanifest:v{FORMATO}:classe:'
+AGENDA_PREFIX = 'tvagenda:disp:'
+
+
+# ─── geração / invalidação ───────────────────────────────────────────────────
+
+def _geracao_atual():
+    """Token global: trocado só por invalidar_tudo() (ex: deploy de formato novo)."""
+    gen = caches['estado'].get(GEN_KEY)
+    if gen is None:
+        gen = uuid.uuid4().hex
+        caches['estado'].set(GEN_KEY, gen, None)
+    return gen
+
+
+def invalidar_tudo():
+    """Invalida o manifesto de todos os dispositivos (troca o token global)."""
+    from .push import avisar
+
+    caches['estado'].set(GEN_KEY, uuid.uuid4().hex, None)
+    avisar()
+
+
+def invalidar_dispositivo(identificador_unico):
+    """Descarta o manifesto compilado de um único dispositivo."""
+    invalidar_dispositivos([identificador_unico])
+
+
+def invalidar_dispositivos(identificadores):
+    """Descarta os manifestos compilados dos dispositivos e avisa o push."""
+    from .push import avisar
+
+    identificadores = [i for i in identificadores if i]
+    if identificadores:
+        cache.delete_many([f'{KEY_PREFIX}{i}' for i in identificadores])
+        avisar(identificadores)
+
+
+def dispositivos_das_playlists(playlist_ids):
+    """[(id, identificador_unico)] dos dispositivos que exibem (ou agendam) as playlists."""
+    from django.db.models import Q
+    from .models import DispositivoTV
+
+    if not playlist_ids:
+        return []
+    return list(DispositivoTV.objects.filter(
+        Q(playlist_atual_id__in=playlist_ids) | Q(agendamentos__playlist_id__in=playlist_ids)
+    ).values_list('id', 'identificador_unico').distinct())
+
+
+def _entrada_valida(entry):
+    """
+    True se o token global e os tokens das playlists usadas pela entrada
+    (fila de classe ou manifesto) não mudaram — uma leitura do cache.
+    """
+    chaves = {f'{FRAG_VERSAO_PREFIX}{pid}': versao for pid, versao in entry['versoes'].items()}
+    atuais = caches['estado'].get_many([GEN_KEY, *chaves])
+    return atuais.get(GEN_KEY) == entry['gen'] and all(atuais.get(k) == v for k, v in chaves.items())
+
+
+# ─── ETag ────────────────────────────────────────────────────────────────────
+
+def etag_header(versao):
+    return f'"{versao}"'
+
+
+def etag_corresponde(if_none_match, versao):
+    """True se o header If-None-Match do app contém a versão informada."""
+    if not if_none_match or not versao:
+        return False
+    etags = parse_etags(if_none_match)
+    if '*' in etags:
+        return True
+    alvo = etag_header(versao)
+    return any(e.removeprefix('W/') == alvo for e in etags)
+
+
+# ─── fronteiras de horário ───────────────────────────────────────────────────
+
+def _proxima_mudanca(dispositivo, fragmentos, now):
+    """
+    Menor instante futuro em que o resultado do manifesto pode mudar sozinho.
+
+    - próxima troca do conjunto de agendamentos ativos (timeline semanal);
+    - próxima publicação/expiração de vídeo SCHEDULED nos fragmentos usados.
+    """
+    from .timeline import obter_timeline
+
+    candidatos = [now + timedelta(days=7)]
+    proxima = obter_timeline(dispositivo).proxima_mudanca(now, funcionamento=False)
+    if proxima:
+        candidatos.append(proxima)
+    candidatos.extend(f['valido_ate'] for f in fragmentos.values() if f['valido_ate'])
+
+    return min(c for c in candidatos if c > now)
+
+
+# ─── compilação ──────────────────────────────────────────────────────────────
+
+# Campos realmente emitidos no manifesto (serializar_item_tv)
+CAMPOS_ITEM_TV = (
+    'id', 'playlist_id', 'ordem', 'repeticoes', 'video_id', 'conteudo_corporativo_id',
+    'video__id', 'video__titulo', 'video__arquivo', 'video__url_externa',
+    'video__duracao_segundos', 'video__ativo', 'video__status',
+    'video__data_publicacao', 'video__data_expiracao', 'video__texto_tarja',
+    'video__orientacao', 'video__qrcode_url_destino', 'video__qrcode_tracking_code',
+    'video__qrcode_descricao',
+    'conteudo_corporativo__id', 'conteudo_corporativo__tipo',
+    'conteudo_corporativo__titulo', 'conteudo_corporativo__duracao_segundos',
+    'conteudo_corporativo__ativo',
+)
+
+
+def _build_url(request):
+    """Mesma regra do PlaylistTVSerializer: URL absoluta, HTTPS em produção."""
+    def build(path):
+        url = request.build_absolute_uri(path)
+        if 'railway.app' in url:
+            url = url.replace('http://', 'https://')
+        return url
+    return build
+
+
+def _fragmento_valido_ate(items, now):
+    """Próxima publicação/expiração entre os vídeos SCHEDULED dos itens, ou None."""
+    datas = []
+    for item in items:
+        video = item.video if item.video_id else None
+        if not video or video.status != 'SCHEDULED':
+            continue
+        if video.data_publicacao and video.data_publicacao > now:
+            datas.append(video.data_publicacao)
+        if video.data_expiracao and video.data_expiracao >= now:
+            datas.append(video.data_expiracao + timedelta(microseconds=1))
+    return min(datas) if datas else None
+
+
+def serializar_playlists(playlist_ids, request, dispositivo_id=None):
+    """
+    Itens de várias playlists em UMA query (select_related + only nos campos
+    emitidos), montados em memória.
+
+    Retorna {playlist_id: {'videos': [...], 'valido_ate': datetime | None}}.
+    """
+    from .models import PlaylistItem
+    from .serializers import serializar_item_tv
+
+    por_playlist = {pid: [] for pid in playlist_ids}
+    if not por_playlist:
+        return {}
+
+    build_url = _build_url(request)
+    now = timezone.now()
+    items = (
+        PlaylistItem.objects
+        .filter(playlist_id__in=por_playlist.keys(), ativo=True)
+        .select_related('video', 'conteudo_corporativo')
+        .only(*CAMPOS_ITEM_TV)
+        .order_by('playlist_id', 'ordem', 'id')
+    )
+    for item in items:
+        por_playlist[item.playlist_id].append(item)
+
+    return {
+        pid: {
+            'videos': [
+                v for item in pl_items
+                for v in serializar_item_tv(item, build_url, pid, dispositivo_id, now)
+            ],
+            'valido_ate': _fragmento_valido_ate(pl_items, now),
+        }
+        for pid, pl_items in por_playlist.items()
+    }
+
+
+# ─── fragmentos por playlist (compartilhados entre dispositivos) ─────────────
+
+def _versoes_playlists(playlist_ids):
+    """Token de conteúdo de cada playlist; cria os que não existem."""
+    chaves = {f'{FRAG_VERSAO_PREFIX}{pid}': pid for pid in playlist_ids}
+    encontrados = caches['estado'].get_many(list(chaves))
+    versoes = {chaves[k]: v for k, v in encontrados.items()}
+    novos = {
+        k: uuid.uuid4().hex for k, pid in chaves.items() if pid not in versoes
+    }
+    if novos:
+        caches['estado'].set_many(novos, None)
+        versoes.update({chaves[k]: v for k, v in novos.items()})
+    return versoes
+
+
+def invalidar_playlists(playlist_ids, dispositivos=None):
+    """
+    Troca o token de conteúdo das playlists — descarta seus fragmentos e as
+    filas/manifestos que as usam — e avisa as TVs que as exibem.
+
+    dispositivos: [(id, identificador_unico)] já conhecidos (ex: antes de
+    excluir a playlist); padrão: dispositivos_das_playlists().
+    Retorna os dispositivos afetados.
+    """
+    playlist_ids = list(playlist_ids)
+    if not playlist_ids:
+        return []
+    caches['estado'].set_many({f'{FRAG_VERSAO_PREFIX}{pid}': uuid.uuid4().hex for pid in playlist_ids}, None)
+    if dispositivos is None:
+        dispositivos = dispositivos_das_playlists(playlist_ids)
+    invalidar_dispositivos([identificador for _, identificador in dispositivos])
+    return dispositivos
+
+
+def invalidar_video(video_id=None, conteudo_corporativo_id=None):
+    """Invalida as playlists que contêm o vídeo/conteúdo (invalidar_playlists)."""
+    from .models import PlaylistItem
+
+    filtro = {'video_id': video_id} if video_id else {'conteudo_corporativo_id': conteudo_corporativo_id}
+    return invalidar_playlists(set(
+        PlaylistItem.objects.filter(**filtro).values_list('playlist_id', flat=True)
+    ))
+
+
+def _fragmentos_em_cache(chaves, now):
+    fragmentos = {}
+    for chave, frag in cache.get_many(list(chaves)).items():
+        if frag['valido_ate'] is None or frag['valido_ate'] > now:
+            fragmentos[chaves[chave]] = frag
+    return fragmentos
+
+
+def _compilar_fragmentos(chaves, request, now):
+    """Serializa as playlists de `chaves` ({chave: playlist_id}) e guarda no cache."""
+    novos = serializar_playlists(list(chaves.values()), request)
+    max_ttl = getattr(settings, 'TV_MANIFEST_HISTORY_SECONDS', 86400)
+    por_ttl = {}
+    for chave, pid in chaves.items():
+        frag = novos[pid]
+        ttl = max_ttl
+        if frag['valido_ate']:
+            ttl = min(ttl, max(1, int((frag['valido_ate'] - now).total_seconds()) + 1))
+        por_ttl.setdefault(ttl, {})[chave] = frag
+    for ttl, entradas in por_ttl.items():
+        cache.set_many(entradas, ttl)
+    return novos
+
+
+def obter_fragmentos(playlist_ids, request):
+    """
+    Fragmentos neutros (sem dispositivo_id) das playlists, do cache ou
+    compilados em lote. Chave: playlist + token de conteúdo + host.
+    """
+    from .singleflight import executar
+
+    if not playlist_ids:
+        return {}
+    now = timezone.now()
+    host = _host(request)
+    versoes = _versoes_playlists(playlist_ids)
+    chaves = {f'{FRAG_PREFIX}{pid}:{versoes[pid]}:{host}': pid for pid in playlist_ids}
+
+    fragmentos = _fragmentos_em_cache(chaves, now)
+    faltando = {chave: pid for chave, pid in chaves.items() if pid not in fragmentos}
+    if faltando:
+        def ler_cache():
+            encontrados = _fragmentos_em_cache(faltando, timezone.now())
+            return encontrados if len(encontrados) == len(faltando) else None
+
+        fragmentos.update(executar(
+            'frag:' + hashlib.sha1(','.join(sorted(faltando)).encode()).hexdigest(),
+            lambda: _compilar_fragmentos(faltando, request, now),
+            ler_cache,
+        ))
+    # Token lido antes de compilar: quem guarda a fila sabe de qual conteúdo ela veio
+    return {pid: {**frag, 'versao': versoes[pid]} for pid, frag in fragmentos.items()}
+
+
+def _personalizar(videos, dispositivo_id):
+    """Insere o dispositivo_id nas URLs de conteúdo corporativo (única parte por TV)."""
+    if not dispositivo_id:
+        return videos
+    sufixo = f'&dispositivo_id={dispositivo_id}'
+    return [
+        {**v, 'arquivo_url': v['arquivo_url'] + sufixo} if v.get('tipo') == 'corporativo' else v
+        for v in videos
+    ]
+
+
+def _mesclar(agendamentos_ativos, request, fragmentos=None, posicoes=None):
+    """
+    Fila neutra (sem dispositivo_id) a partir dos fragmentos das playlists
+    dos agendamentos ativos, mesclada em sequência ou proporcional ao
+    percentual (core/wfq.py).
+
+    fragmentos: dict opcional {playlist_id: fragmento}, preenchido e
+    reaproveitado entre chamadas (ex: várias faixas do plano offline).
+    posicoes: {playlist_id: posição} onde a janela proporcional começa.
+
+    Retorna (videos, playlists, proximas) — playlists na ordem de prioridade;
+    proximas é None ou, se a fila é uma janela, {playlist_id: posição} da
+    janela seguinte.
+    """
+    from .wfq import janela
+
+    if fragmentos is None:
+        fragmentos = {}
+    ativos = [ag for ag in agendamentos_ativos if ag.playlist.ativa]
+    faltando = list(dict.fromkeys(
+        ag.playlist.id for ag in ativos if ag.playlist.id not in fragmentos
+    ))
+    if faltando:
+        fragmentos.update(obter_fragmentos(faltando, request))
+
+    pairs = [  # (video_list, percentual)
+        (fragmentos[ag.playlist.id]['videos'], ag.percentual)
+        for ag in ativos
+    ]
+    playlists = [ag.playlist for ag in ativos]
+
+    # Usar distribuição proporcional se houver percentuais variados
+    has_varied = len(pairs) > 1 and any(pct != 100 for _, pct in pairs)
+    proximas = None
+    if has_varied:
+        videos, proximas = janela(
+            pairs, getattr(settings, 'TV_MANIFEST_MAX_ITENS', 200),
+            [(posicoes or {}).get(p.id, 0) for p in playlists],
+        )
+        if proximas is not None:
+            proximas = {p.id: pos for p, pos in zip(playlists, proximas)}
+    else:
+        videos = [v for vids, _ in pairs for v in vids]
+    return videos, playlists, proximas
+
+
+def montar_videos(dispositivo, agendamentos_ativos, request, fragmentos=None, posicoes=None):
+    """
+    Fila de vídeos do dispositivo (ver _mesclar), já com o dispositivo_id nas URLs.
+
+    Retorna (videos, playlists, proximas) — proximas não é None quando a fila
+    é uma janela: passe-a como `posicoes` para montar a janela seguinte.
+    """
+    videos, playlists, proximas = _mesclar(agendamentos_ativos, request, fragmentos, posicoes)
+    return _personalizar(videos, dispositivo.id), playlists, proximas
+
+
+def _duracao_janela(videos):
+    """Tempo de uma passada pela janela (mínimo de 60s)."""
+    return max(sum(v.get('duracao_segundos') or 0 for v in videos), 60)
+
+
+# ─── classes de programação ──────────────────────────────────────────────────
+
+def assinatura_classe(dispositivo):
+    """
+    Chave da classe de programação do dispositivo: assinatura da timeline
+    de agendamentos + playlist_atual (fallback quando nada está agendado).
+    """
+    from .timeline import obter_timeline
+
+    return f'{obter_timeline(dispositivo).assinatura}:{dispositivo.playlist_atual_id or 0}'
+
+
+def agrupar_por_classe(dispositivos):
+    """Agrupa dispositivos por classe de programação: {assinatura: [dispositivos]}."""
+    from .timeline import carregar_timelines
+
+    dispositivos = list(dispositivos)
+    carregar_timelines(dispositivos)
+    classes = {}
+    for d in dispositivos:
+        classes.setdefault(assinatura_classe(d), []).append(d)
+    return classes
+
+
+def compilar_classe(dispositivo, request, posicoes=None):
+    """
+    Fila mesclada vigente para a classe do dispositivo — idêntica para todas
+    as TVs da classe, exceto pelo dispositivo_id (inserido depois).
+
+    posicoes: {playlist_id: posição} deixadas pela janela anterior.
+
+    Retorna {'videos', 'playlists': [(id, nome)], 'valido_ate', 'posicoes',
+    'versoes': {playlist_id: token}}.
+    """
+    now = timezone.now()
+    fragmentos = {}
+    videos, playlists, proximas = _mesclar(
+        dispositivo.get_agendamentos_ativos_por_horario(), request, fragmentos, posicoes,
+    )
+    valido_ate = _proxima_mudanca(dispositivo, fragmentos, now)
+    if proximas is not None:
+        # Janela: vale pelo menos uma passada da fila (e não menos que
+        # TV_MANIFEST_JANELA_MIN_SECONDS, para não trocar a versão a todo
+        # momento), depois a classe avança para a próxima
+        duracao = max(_duracao_janela(videos), getattr(settings, 'TV_MANIFEST_JANELA_MIN_SECONDS', 3600))
+        valido_ate = min(valido_ate, now + timedelta(seconds=duracao))
+    return {
+        'videos': videos,
+        'playlists': [(p.id, p.nome) for p in playlists],
+        'valido_ate': valido_ate,
+        'posicoes': proximas,
+        'versoes': {p.id: fragmentos[p.id]['versao'] for p in playlists},
+    }
+
+
+def fila_vigente(dispositivo, request):
+    """Fila que a TV exibe agora (janela vigente da classe), com o dispositivo_id."""
+    return _personalizar(obter_classe(dispositivo, request)['videos'], dispositivo.id)
+
+
+def obter_classe(dispositivo, request):
+    """Fila da classe do dispositivo, do cache ou compilada uma vez para toda a classe."""
+    from .singleflight import executar
+
+    host = _host(request)
+    chave = f'{CLASSE_PREFIX}{assinatura_classe(dispositivo)}:{host}'
+
+    def ler_cache():
+        entry = cache.get(chave)
+        if entry and timezone.now() < entry['valido_ate'] and _entrada_valida(entry):
+            return entry
+        return None
+
+    def compilar():
+        # Sobrevive à entrada da classe: a próxima janela continua desta
+        chave_posicoes = f'{chave}:posicoes'
+        gen = _geracao_atual()
+        entry = compilar_classe(dispositivo, request, cache.get(chave_posicoes))
+        entry['gen'] = gen
+        max_ttl = getattr(settings, 'TV_MANIFEST_CACHE_SECONDS', 3600)
+        ttl = min(max_ttl, max(1, int((entry['valido_ate'] - timezone.now()).total_seconds()) + 1))
+        cache.set(chave, entry, ttl)
+        if entry['posicoes'] is not None:
+            cache.set(chave_posicoes, entry['posicoes'], getattr(settings, 'TV_MANIFEST_HISTORY_SECONDS', 86400))
+        return entry
+
+    return ler_cache() or executar(chave, compilar, ler_cache)
+
+
+def compilar_manifesto(dispositivo, request):
+    """
+    Monta o corpo da resposta de /api/tv/auth/ para o dispositivo a partir
+    da fila da sua classe de programação.
+
+    Retorna (body, valido_ate, versoes) — versoes: tokens das playlists
+    usadas. O body já contém 'versao_manifesto'.
+    """
+    classe = obter_classe(dispositivo, request)
+
+    body = {
+        'dispositivo_id': dispositivo.id,
+        'dispositivo_nome': dispositivo.nome,
+        'municipio': str(dispositivo.municipio),
+    }
+
+    if classe['playlists']:
+        all_videos = _personalizar(classe['videos'], dispositivo.id)
+        playlist_ids = [pid for pid, _ in classe['playlists']]
+        body['playlist'] = {
+            'id': playlist_ids[0] if len(playlist_ids) == 1 else 0,
+            'nome': ' + '.join(nome for _, nome in classe['playlists']),
+            'duracao_total_segundos': sum(v.get('duracao_segundos', 0) for v in all_videos),
+            'videos': all_videos,
+            'playlists_mescladas': playlist_ids,
+        }
+    else:
+        body['playlist'] = None
+        body['message'] = 'Nenhuma playlist ativa configurada'
+
+    # Canal de push em processo separado (start_push.sh)
+    push_url = getattr(settings, 'TV_PUSH_URL', '')
+    if push_url:
+        body['push_url'] = f'{push_url.rstrip("/")}/api/tv/push/{dispositivo.identificador_unico}/'
+
+    canonico = json.dumps(body, sort_keys=True, separators=(',', ':'), default=str)
+    body['versao_manifesto'] = hashlib.sha1(canonico.encode()).hexdigest()[:20]
+    # Fora do hash: a mesma fila recompilada depois de uma fronteira mantém a versão
+    body['next_change_at'] = timezone.localtime(classe['valido_ate']).isoformat()
+    return body, classe['valido_ate'], classe['versoes']
+
+
+# ─── store ───────────────────────────────────────────────────────────────────
+
+def _base_url(request):
+    """As URLs do manifesto são absolutas — o host faz parte da validade."""
+    return request.build_absolute_uri('/')
+
+
+def _host(request):
+    """Hash curto de _base_url, para compor chaves de cache."""
+    return hashlib.sha1(_base_url(request).encode()).hexdigest()[:8]
+
+
+def manifesto_em_cache(identificador_unico, request):
+    """
+    Retorna a entrada em cache {'versao', 'body', 'valido_ate', ...} se ainda for
+    válida para esta requisição, ou None. Não toca nas tabelas do app.
+    """
+    entry = cache.get(f'{KEY_PREFIX}{identificador_unico}')
+    if not entry:
+        return None
+    if entry.get('base') != _base_url(request):
+        return None
+    if timezone.now() >= entry['valido_ate']:
+        return None
+    if not _entrada_valida(entry):
+        return None
+    return entry
+
+
+def obter_manifesto(dispositivo, request):
+    """Retorna a entrada do manifesto do dispositivo, compilando se necessário."""
+    from .singleflight import executar
+
+    identificador = dispositivo.identificador_unico
+    entry = manifesto_em_cache(identificador, request)
+    if entry is not None:
+        return entry
+
+    def compilar():
+        gen = _geracao_atual()
+        body, valido_ate, versoes = compilar_manifesto(dispositivo, request)
+        entry = {
+            'versao': body['versao_manifesto'],
+            'body': body,
+            'valido_ate': valido_ate,
+            'gen': gen,
+            'versoes': versoes,
+            'base': _base_url(request),
+        }
+        max_ttl = getattr(settings, 'TV_MANIFEST_CACHE_SECONDS', 3600)
+        ttl = min(max_ttl, max(1, int((valido_ate - timezone.now()).total_seconds()) + 1))
+        cache.set(f'{KEY_PREFIX}{identificador}', entry, ttl)
+        # Histórico por versão — base para o cálculo de delta (calcular_delta)
+        cache.set(
+            f'{VERSAO_PREFIX}{entry["versao"]}', body,
+            getattr(settings, 'TV_MANIFEST_HISTORY_SECONDS', 86400),
+        )
+        return entry
+
+    return executar(
+        f'{KEY_PREFIX}{identificador}:{_host(request)}',
+        compilar,
+        lambda: manifesto_em_cache(identificador, request),
+    )
+
+
+def manifesto_por_versao(versao):
+    """Corpo de um manifesto já emitido, ou None se expirou do histórico."""
+    if not versao:
+        return None
+    return cache.get(f'{VERSAO_PREFIX}{versao}')
+
+
+# ─── check-schedule ──────────────────────────────────────────────────────────
+
+def compilar_agenda(dispositivo):
+    """
+    Corpo de /api/tv/check-schedule/ (sem current_time, que é da resposta).
+
+    Retorna (body, valido_ate) — valido_ate é a próxima troca de agendamento
+    ou de horário de funcionamento, também enviada ao app em next_change_at.
+    """
+    from .timeline import obter_timeline
+
+    now = timezone.now()
+    timeline = obter_timeline(dispositivo)
+    valido_ate = timeline.proxima_mudanca(now) or now + timedelta(days=7)
+    should_display = dispositivo.esta_no_horario_exibicao(now)
+
+    body = {
+        'should_display': should_display,
+        'next_change_at': timezone.localtime(valido_ate).isoformat(),
+        'dispositivo_nome': dispositivo.nome,
+        'has_playlist': dispositivo.playlist_atual is not None,
+        'horarios_funcionamento': [
+            {
+                'nome': h.nome,
+                'hora_inicio': h.hora_inicio.strftime('%H:%M'),
+                'hora_fim': h.hora_fim.strftime('%H:%M'),
+                'dias_semana': h.dias_semana or [],
+                'ativo': h.ativo,
+            }
+            for h in dispositivo.horarios_funcionamento.filter(ativo=True)
+        ],
+    }
+
+    # Playlists ativas pelo horário (pode ser diferente da padrão)
+    playlists_ativas = dispositivo.get_playlists_ativas_por_horario()
+    if should_display and playlists_ativas:
+        if len(playlists_ativas) == 1:
+            body['playlist_id'] = playlists_ativas[0].id
+            body['playlist_nome'] = playlists_ativas[0].nome
+        else:
+            # Múltiplas playlists mescladas
+            body['playlist_id'] = 0  # 0 = múltiplas mescladas
+            body['playlist_nome'] = ' + '.join([p.nome for p in playlists_ativas])
+            body['playlists_mescladas'] = [p.id for p in playlists_ativas]
+
+    # Retorna info dos agendamentos ativos com playlist vinculada
+    agendamentos = list(dispositivo.agendamentos.filter(ativo=True).select_related('playlist'))
+    if agendamentos:
+        body['agendamentos'] = [
+            {
+                'nome': ag.nome,
+                'dias_semana': ag.dias_semana,
+                'hora_inicio': ag.hora_inicio.strftime('%H:%M') if ag.hora_inicio else None,
+                'hora_fim': ag.hora_fim.strftime('%H:%M') if ag.hora_fim else None,
+                'playlist_id': ag.playlist_id,
+                'playlist_nome': ag.playlist.nome if ag.playlist else None,
+                'prioridade': ag.prioridade,
+            }
+            for ag in agendamentos
+        ]
+    else:
+        body['agendamentos'] = []
+        body['message'] = 'Sem agendamentos: exibição 24/7'
+
+    return body, valido_ate
+
+
+def invalidar_agenda(identificador_unico):
+    invalidar_agendas([identificador_unico])
+
+
+def invalidar_agendas(identificadores):
+    identificadores = [i for i in identificadores if i]
+    if identificadores:
+        cache.delete_many([f'{AGENDA_PREFIX}{i}' for i in identificadores])
+
+
+def agenda_em_cache(identificador_unico):
+    """Entrada {'body', 'valido_ate', 'gen'} ainda válida, ou None."""
+    from .timeline import geracao_atual
+
+    entry = cache.get(f'{AGENDA_PREFIX}{identificador_unico}')
+    if not entry or entry['gen'] != geracao_atual() or timezone.now() >= entry['valido_ate']:
+        return None
+    return entry
+
+
+def obter_agenda(dispositivo):
+    """Corpo do check-schedule, reaproveitado até a próxima fronteira de horário."""
+    from .timeline import geracao_atual
+
+    entry = agenda_em_cache(dispositivo.identificador_unico)
+    if entry is not None:
+        return entry
+    gen = geracao_atual()
+    body, valido_ate = compilar_agenda(dispositivo)
+    entry = {'body': body, 'valido_ate': valido_ate, 'gen': gen}
+    max_ttl = getattr(settings, 'TV_MANIFEST_CACHE_SECONDS', 3600)
+    ttl = min(max_ttl, max(1, int((valido_ate - timezone.now()).total_seconds()) + 1))
+    cache.set(f'{AGENDA_PREFIX}{dispositivo.identificador_unico}', entry, ttl)
+    return entry
+
+
+# ─── delta ───────────────────────────────────────────────────────────────────
+
+def _indexar_videos(videos):
+    """
+    Separa a fila de vídeos em (itens únicos, ordem).
+
+    A chave de um item é "<tipo>:<id>". O mesmo conteúdo corporativo pode
+    aparecer com URLs diferentes (uma por playlist) — cada variante recebe
+    um sufixo "#n" na ordem em que aparece.
+    """
+    itens = {}
+    ordem = []
+    for v in videos:
+        base = f"{v.get('tipo', 'video')}:{v.get('id')}"
+        chave = base
+        n = 0
+        while chave in itens and itens[chave] != v:
+            n += 1
+            chave = f'{base}#{n}'
+        if chave not in itens:
+            itens[chave] = v
+        ordem.append(chave)
+    return itens, ordem
+
+
+def calcular_delta(body_base, body_novo):
+    """
+    Diferença entre dois manifestos do mesmo dispositivo.
+
+    Retorna dict com:
+      adicionados — itens novos (dict completo, com 'chave')
+      alterados   — itens cuja chave já existia mas algum campo mudou (ex: arquivo_url)
+      removidos   — chaves que saíram do manifesto
+      ordem       — nova sequência de chaves, ou None se a sequência não mudou
+      playlist    — metadados da playlist (sem 'videos')
+    """
+    pl_base = body_base.get('playlist') or {}
+    pl_novo = body_novo.get('playlist') or {}
+    itens_base, ordem_base = _indexar_videos(pl_base.get('videos', []))
+    itens_novo, ordem_novo = _indexar_videos(pl_novo.get('videos', []))
+
+    adicionados = [
+        {'chave': k, **v} for k, v in itens_novo.items() if k not in itens_base
+    ]
+    alterados = [
+        {'chave': k, **v} for k, v in itens_novo.items()
+        if k in itens_base and itens_base[k] != v
+    ]
+    removidos = [k for k in itens_base if k not in itens_novo]
+
+    playlist = None
+    if body_novo.get('playlist') is not None:
+        playlist = {k: v for k, v in pl_novo.items() if k != 'videos'}
+
+    return {
+        'adicionados': adicionados,
+        'alterados': alterados,
+        'removidos': removidos,
+        'ordem': ordem_novo if ordem_novo != ordem_base else None,
+        'playlist': playlist,
+    }
+
+
+# ─── plano offline ───────────────────────────────────────────────────────────
+
+def compilar_plano(dispositivo, request, dias=1):
+    """
+    Plano de exibição pré-calculado para os próximos `dias`.
+
+    Percorre a timeline semanal do dispositivo (core/timeline.py) de fronteira
+    em fronteira. Cada faixa vira um segmento:
+      {'inicio', 'fim', 'ligado': False}              → tela preta (fora do funcionamento)
+      {'inicio', 'fim', 'ligado': True, 'fila': n}    → repetir filas[n] em loop
+      {'inicio', 'fim', 'ligado': True, 'fila': None} → ligado, sem playlist
+
+    Fila proporcional que não comporta uma volta de todas as playlists
+    (janela, core/wfq.py) divide a faixa em segmentos de uma passada cada,
+    com as janelas seguintes — a sequência continua de onde parou, também
+    entre faixas com a mesma combinação de playlists.
+
+    Itens repetidos são enviados uma única vez em 'itens'; as filas guardam
+    apenas índices. 'valido_ate' é o fim do horizonte ou a primeira
+    publicação/expiração de vídeo SCHEDULED, o que vier antes — o app só
+    precisa sincronizar novamente nesse instante.
+    """
+    from .timeline import obter_timeline
+
+    now = timezone.now()
+    fim = now + timedelta(days=dias)
+    timeline = obter_timeline(dispositivo)
+
+    fragmentos = {}
+    itens, indice_item = [], {}
+    filas, indice_fila = [], {}
+    segmentos = []
+    # Próxima janela de cada combinação de playlists: {chave: {playlist_id: posição}}
+    posicoes = {}
+
+    def registrar_fila(videos, playlists):
+        fila = []
+        for v in videos:
+            k = json.dumps(v, sort_keys=True)
+            if k not in indice_item:
+                indice_item[k] = len(itens)
+                itens.append(v)
+            fila.append(indice_item[k])
+        filas.append({
+            'playlists_mescladas': [p.id for p in playlists],
+            'nome': ' + '.join(p.nome for p in playlists),
+            'itens': fila,
+        })
+        return len(filas) - 1
+
+    t = now
+    while t < fim:
+        prox = min(timeline.proxima_mudanca(t) or fim, fim)
+
+        estado = {'ligado': False}
+        if dispositivo.esta_no_horario_exibicao(t):
+            estado = {'ligado': True, 'fila': None}
+            ags = dispositivo.get_agendamentos_ativos_por_horario(t)
+            chave = tuple((ag.playlist.id, ag.percentual) for ag in ags if ag.playlist.ativa)
+            inicio = posicoes.get(chave)
+            # Janelas se repetem quando as posições dão a volta
+            chave_fila = (chave, tuple(sorted(inicio.items())) if inicio and any(inicio.values()) else None)
+            if chave and chave_fila not in indice_fila:
+                videos, playlists, proximas = montar_videos(dispositivo, ags, request, fragmentos, inicio)
+                indice_fila[chave_fila] = (registrar_fila(videos, playlists), proximas, _duracao_janela(videos))
+            if chave:
+                estado['fila'], proximas, duracao = indice_fila[chave_fila]
+                if proximas is not None:
+                    posicoes[chave] = proximas
+                    prox = min(prox, t + timedelta(seconds=duracao))
+
+        if segmentos and segmentos[-1]['estado'] == estado:
+            segmentos[-1]['fim'] = prox
+        else:
+            segmentos.append({'inicio': t, 'fim': prox, 'estado': estado})
+        t = prox
+
+    valido_ate = min([fim] + [f['valido_ate'] for f in fragmentos.values() if f['valido_ate']])
+
+    def _iso(dt):
+        return timezone.localtime(dt).isoformat()
+
+    body = {
+        'dispositivo_id': dispositivo.id,
+        'gerado_em': _iso(now),
+        'valido_ate': _iso(valido_ate),
+        'itens': itens,
+        'filas': filas,
+        'segmentos': [
+            {'inicio': _iso(seg['inicio']), 'fim': _iso(min(seg['fim'], valido_ate)), **seg['estado']}
+            for seg in segmentos if seg['inicio'] < valido_ate
+        ],
+    }
+    canonico = json.dumps(body, sort_keys=True, separators=(',', ':'), default=str)
+    body['versao_plano'] = hashlib.sha1(canonico.encode()).hexdigest()[:20]
+    return body
@@ -0,0 +1,229 @@
+"""
+Snapshot das métricas de visibilidade por cliente (/dashboard/metricas/).
+
+A página percorria todos os dispositivos em Python a cada acesso,
+recalculando horas a partir dos agendamentos, e fazia várias contagens de
+PlaylistItem. Agora o resultado fica materializado em MetricasCliente
+(uma linha JSON por cliente) e a página renderiza dessa linha:
+
+- calcular() monta os números — mesmas fórmulas de antes, exibições do mês
+  vindas dos agregados diários (core/agregacao.py); agendamento sem horário
+  conta 24h e sem dias conta todos (a view quebrava com agendamentos 24/7);
+- marcar() (core/signals.py) marca como desatualizados os snapshots
+  afetados por mudanças em playlists, itens, vídeos, dispositivos e
+  agendamentos, registrando o instante em marcado_em;
+- atualizar() só limpa a marca se ela é anterior ao início do recálculo —
+  uma alteração feita durante o cálculo mantém o snapshot marcado;
+- atualizar_pendentes() roda no scheduler a cada
+  CLIENT_METRICS_REFRESH_SECONDS e recalcula os marcados e os calculados há
+  mais de CLIENT_METRICS_MAX_AGE_SECONDS (virada do dia/mês, exibições novas);
+- cliente sem snapshot ainda é calculado na hora, no primeiro acesso.
+"""
+import calendar
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Avg, Count, Prefetch, Q, Sum
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+def _formatar_numero(n):
+    if n >= 1000000:
+        return f"{n / 1000000:.1f}M"
+    elif n >= 1000:
+        return f"{n / 1000:.1f}K"
+    return str(int(n))
+
+
+def _horas_mes(agendamentos, dias_no_mes):
+    """Horas de exibição no mês a partir dos agendamentos ativos do dispositivo."""
+    if not agendamentos:
+        # Sem agendamento = 12h por dia, todos os dias
+        return 12 * dias_no_mes
+    horas = 0
+    for agendamento in agendamentos:
+        inicio = agendamento.hora_inicio
+        fim = agendamento.hora_fim
+        if inicio is None or fim is None:
+            duracao_segundos = 24 * 3600  # sem horário = 24h
+        else:
+            duracao_segundos = (
+                (fim.hour * 3600 + fim.minute * 60 + fim.second)
+                - (inicio.hour * 3600 + inicio.minute * 60 + inicio.second)
+            )
+        if duracao_segundos > 0:
+            # Média de dias por mês (considerando semanas); dias vazio = todos
+            horas += (duracao_segundos / 3600) * (len(agendamento.dias_efetivos) / 7) * dias_no_mes
+    return horas
+
+
+def calcular(cliente):
+    """Métricas do cliente como dict serializável (contexto do template)."""
+    from .models import AgendamentoExibicao, DispositivoTV, ExibicaoPorDia, Playlist, PlaylistItem, Video
+
+    agora = timezone.localtime()
+    _, dias_no_mes = calendar.monthrange(agora.year, agora.month)
+
+    # Vídeos aprovados do cliente e playlists ativas que os contêm
+    videos_cliente = list(
+        Video.objects.filter(cliente=cliente, status='APPROVED', ativo=True)
+        .annotate(total_playlists=Count('playlist_items'))
+        .values('id', 'titulo', 'duracao_segundos', 'total_playlists')
+    )
+    video_ids = [v['id'] for v in videos_cliente]
+    playlists = list(
+        Playlist.objects.filter(
+            id__in=PlaylistItem.objects.filter(video_id__in=video_ids, ativo=True).values('playlist_id'),
+            ativa=True,
+        ).select_related('municipio').annotate(total_itens=Count('items'))
+    )
+    playlist_ids = [p.id for p in playlists]
+
+    dispositivos = list(
+        DispositivoTV.objects.filter(playlist_atual_id__in=playlist_ids, ativo=True)
+        .select_related('municipio')
+        .prefetch_related(Prefetch('agendamentos', queryset=AgendamentoExibicao.objects.filter(ativo=True)))
+    )
+    publico_impactado = sum(d.publico_estimado_mes or 0 for d in dispositivos)
+
+    tempo_total_segundos = 0
+    dispositivos_detalhes = []
+    for dispositivo in dispositivos:
+        horas = _horas_mes(list(dispositivo.agendamentos.all()), dias_no_mes)
+        tempo_total_segundos += horas * 3600
+        dispositivos_detalhes.append({
+            'dispositivo': {'nome': dispositivo.nome},
+            'horas_mes': round(horas, 1),
+            'localizacao': dispositivo.localizacao or dispositivo.municipio.nome,
+        })
+    tempo_total_horas = tempo_total_segundos / 3600
+
+    # Duração média dos vídeos do cliente (em segundos); padrão 15s
+    duracao_media_video = (
+        Video.objects.filter(id__in=video_ids).aggregate(media=Avg('duracao_segundos'))['media'] or 15
+    )
+
+    # Itens ativos das playlists: total, do cliente e anunciantes distintos — uma consulta
+    itens = PlaylistItem.objects.filter(playlist_id__in=playlist_ids, ativo=True).aggregate(
+        total=Count('id'),
+        do_cliente=Count('id', filter=Q(video_id__in=video_ids)),
+        anunciantes=Count('video__cliente_id', distinct=True),
+    )
+    proporcao_cliente = itens['do_cliente'] / max(itens['total'], 1)
+
+    # Inserções totais: tempo_total (em segundos) / duração média do vídeo * proporção de vídeos do cliente
+    insercoes_totais = int((tempo_total_segundos / max(duracao_media_video, 1)) * proporcao_cliente)
+    anunciantes_ativos = itens['anunciantes']
+    tempo_por_anuncio = duracao_media_video
+    insercoes_por_anunciante = (
+        int(insercoes_totais / max(anunciantes_ativos, 1)) if anunciantes_ativos > 0 else insercoes_totais
+    )
+    # Tempo corrido da marca (inserções * duração média)
+    tempo_corrido_horas = insercoes_totais * duracao_media_video / 3600
+
+    # Exibições reais: agregados diários do mês atual e do anterior
+    inicio_mes_atual = agora.date().replace(day=1)
+    inicio_mes_anterior = (inicio_mes_atual - timedelta(days=1)).replace(day=1)
+    exibicoes = ExibicaoPorDia.objects.filter(video__cliente=cliente, dia__gte=inicio_mes_anterior).aggregate(
+        atual=Sum('exibicoes', filter=Q(dia__gte=inicio_mes_atual)),
+        anterior=Sum('exibicoes', filter=Q(dia__lt=inicio_mes_atual)),
+    )
+    logs_mes_atual = exibicoes['atual'] or 0
+    logs_mes_anterior = exibicoes['anterior'] or 0
+    if logs_mes_anterior > 0:
+        variacao_percentual = ((logs_mes_atual - logs_mes_anterior) / logs_mes_anterior) * 100
+    else:
+        variacao_percentual = 100 if logs_mes_atual > 0 else 0
+
+    return {
+        'telas_ativas': len(dispositivos),
+        'publico_impactado': publico_impactado,
+        'publico_impactado_formatado': _formatar_numero(publico_impactado),
+        'tempo_total_horas': round(tempo_total_horas, 1),
+        'insercoes_totais': insercoes_totais,
+        'insercoes_totais_formatado': _formatar_numero(insercoes_totais),
+        'anunciantes_ativos': anunciantes_ativos,
+        'tempo_por_anuncio': round(tempo_por_anuncio, 0),
+        'insercoes_por_anunciante': insercoes_por_anunciante,
+        'insercoes_por_anunciante_formatado': _formatar_numero(insercoes_por_anunciante),
+        'tempo_corrido_horas': round(tempo_corrido_horas, 1),
+        'variacao_percentual': round(variacao_percentual, 0),
+        'dispositivos_detalhes': dispositivos_detalhes,
+        'videos_cliente': videos_cliente,
+        'playlists': [
+            {
+                'nome': p.nome,
+                'municipio': {'nome': p.municipio.nome, 'estado': p.municipio.estado},
+                'total_videos': p.total_itens,
+                'duracao_total_formatada': p.duracao_total_formatada,
+            }
+            for p in playlists
+        ],
+        'duracao_media_video': round(duracao_media_video, 0),
+        'proporcao_cliente': round(proporcao_cliente * 100, 1),
+        'logs_mes_atual': logs_mes_atual,
+    }
+
+
+def atualizar(cliente):
+    """Recalcula e grava o snapshot do cliente. Retorna o MetricasCliente."""
+    from .models import MetricasCliente
+
+    inicio = timezone.now()
+    dados = calcular(cliente)
+    snapshot, _ = MetricasCliente.objects.update_or_create(
+        cliente=cliente, defaults={'dados': dados, 'calculado_em': inicio},
+    )
+    # Marcado durante o cálculo: continua desatualizado para a próxima rodada
+    MetricasCliente.objects.filter(pk=snapshot.pk, desatualizado=True).filter(
+        Q(marcado_em__isnull=True) | Q(marcado_em__lt=inicio)
+    ).update(desatualizado=False)
+    return snapshot
+
+
+def obter(cliente):
+    """Snapshot do cliente (calculado na hora se ainda não existe)."""
+    from .models import MetricasCliente
+
+    snapshot = MetricasCliente.objects.filter(cliente=cliente).first()
+    return snapshot or atualizar(cliente)
+
+
+def marcar(playlist_ids=None, cliente_ids=None):
+    """
+    Marca snapshots como desatualizados: dos clientes com vídeos nas
+    playlists indicadas e/ou dos clientes indicados. Sem argumentos, todos.
+    """
+    from .models import MetricasCliente, PlaylistItem
+
+    # Inclui os já marcados: marcado_em avança e invalida recálculos em curso
+    snapshots = MetricasCliente.objects.all()
+    if playlist_ids is not None or cliente_ids is not None:
+        filtro = Q(cliente_id__in=list(cliente_ids or []))
+        if playlist_ids:
+            filtro |= Q(cliente_id__in=PlaylistItem.objects.filter(
+                playlist_id__in=list(playlist_ids), video__isnull=False,
+            ).values('video__cliente_id'))
+        snapshots = snapshots.filter(filtro)
+    snapshots.update(desatualizado=True, marcado_em=timezone.now())
+
+
+def atualizar_pendentes():
+    """Recalcula os snapshots marcados e os antigos. Retorna quantos."""
+    from .models import Cliente
+
+    limite = timezone.now() - timedelta(seconds=getattr(settings, 'CLIENT_METRICS_MAX_AGE_SECONDS', 3600))
+    clientes = Cliente.objects.filter(
+        Q(metricas__desatualizado=True) | Q(metricas__calculado_em__lt=limite)
+    )
+    total = 0
+    for cliente in clientes.iterator():
+        try:
+            atualizar(cliente)
+            total += 1
+        except Exception:
+            logger.exception('metricas: falha ao recalcular cliente %s', cliente.pk)
+    return total
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.9 on 2026-10-17 04:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0033_landing_lead'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='logexibicao',
+            name='evento_id',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='logexibicaowebview',
+            name='evento_id',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='logexibicao',
+            constraint=models.UniqueConstraint(fields=('dispositivo', 'evento_id', 'data_hora_inicio'), name='logexibicao_evento_unico'),
+        ),
+        migrations.AddConstraint(
+            model_name='logexibicaowebview',
+            constraint=models.UniqueConstraint(fields=('dispositivo', 'evento_id', 'data_hora_inicio'), name='logwebview_evento_unico'),
+        ),
+    ]
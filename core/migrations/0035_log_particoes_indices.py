@@ -0,0 +1,147 @@
+# Generated by Django 4.2.9 on 2026-10-17 04:14
+
+from datetime import timedelta, timezone as dt_timezone
+
+from django.db import migrations, models, transaction
+from django.utils import timezone
+
+# DDL congelada aqui (não importa core.particoes): a migração precisa rodar
+# igual mesmo que o módulo mude depois.
+TABELAS = ('core_logexibicao', 'core_logexibicaowebview')
+MESES_ADIANTE = 2  # os seguintes ficam com garantir_particoes() (scheduler diário)
+
+
+def _proximo_mes(mes):
+    return (mes + timedelta(days=32)).replace(day=1)
+
+
+def _converter(connection, tabela, limite):
+    """
+    Transforma `tabela` em particionada por mês: a tabela atual vira a
+    partição `<tabela>_legado` (tudo antes de `limite`), com os mesmos nomes
+    de índices, unique e FKs recriados na tabela-mãe.
+
+    O ATTACH PARTITION varreria a tabela inteira (para conferir o limite) e
+    criaria o índice da nova PK, tudo sob ACCESS EXCLUSIVE. Por isso, antes,
+    fora de transação e sem bloquear a escrita dos logs:
+    - CHECK NOT VALID + VALIDATE com o mesmo limite da partição — o ATTACH
+      usa o CHECK validado e pula a varredura;
+    - o índice (id, data_hora_inicio) da PK é criado CONCURRENTLY.
+    Depois, numa transação curta, só mudanças de catálogo.
+    """
+    q = connection.ops.quote_name
+    legado = f'{tabela}_legado'
+    limite_legado = f'{tabela}_legado_limite'
+    pk_legado = f'{tabela}_legado_pkey'
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)', [tabela])
+        if cursor.fetchone() is not None:
+            return
+        # Os DROP IF EXISTS cobrem uma tentativa anterior interrompida (índice INVALID)
+        cursor.execute(f'ALTER TABLE {q(tabela)} DROP CONSTRAINT IF EXISTS {q(limite_legado)}')
+        cursor.execute(
+            f'ALTER TABLE {q(tabela)} ADD CONSTRAINT {q(limite_legado)} '
+            f'CHECK (data_hora_inicio IS NOT NULL AND data_hora_inicio < %s) NOT VALID',
+            [limite.isoformat()],
+        )
+        cursor.execute(f'ALTER TABLE {q(tabela)} VALIDATE CONSTRAINT {q(limite_legado)}')
+        cursor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {q(pk_legado)}')
+        cursor.execute(f'CREATE UNIQUE INDEX CONCURRENTLY {q(pk_legado)} ON {q(tabela)} (id, data_hora_inicio)')
+
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT i.relname, pg_get_indexdef(i.oid), c.contype, pg_get_constraintdef(c.oid)
+            FROM pg_index x
+            JOIN pg_class i ON i.oid = x.indexrelid
+            LEFT JOIN pg_constraint c ON c.conindid = x.indexrelid AND c.conrelid = x.indrelid
+            WHERE x.indrelid = %s::regclass AND i.relname <> %s
+        """, [tabela, pk_legado])
+        indices = cursor.fetchall()
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'",
+            [tabela],
+        )
+        fks = cursor.fetchall()
+
+        # Nomes de índice são únicos no schema: os da tabela antiga ganham sufixo
+        cursor.execute(f'ALTER TABLE {q(tabela)} RENAME TO {q(legado)}')
+        for nome, _, tipo, _ in indices:
+            if tipo == 'p':
+                cursor.execute(f'ALTER TABLE {q(legado)} DROP CONSTRAINT {q(nome)}')
+            else:
+                cursor.execute(f'ALTER INDEX {q(nome)} RENAME TO {q(nome[:55] + "_legado")}')
+        cursor.execute(f'ALTER TABLE {q(legado)} ADD CONSTRAINT {q(pk_legado)} PRIMARY KEY USING INDEX {q(pk_legado)}')
+
+        # Identity não é suportada em tabela particionada (< PG 17): sequência própria
+        sequencia = f'{tabela}_particionada_id_seq'
+        cursor.execute(f'ALTER TABLE {q(legado)} ALTER COLUMN id DROP IDENTITY IF EXISTS')
+        cursor.execute(f'ALTER TABLE {q(legado)} ALTER COLUMN id DROP DEFAULT')
+        cursor.execute(
+            f'CREATE TABLE {q(tabela)} (LIKE {q(legado)} INCLUDING DEFAULTS) PARTITION BY RANGE (data_hora_inicio)'
+        )
+        cursor.execute(f'CREATE SEQUENCE {q(sequencia)} OWNED BY {q(tabela)}.id')
+        cursor.execute(f'SELECT setval(%s, COALESCE((SELECT max(id) FROM {q(legado)}), 0) + 1, false)', [sequencia])
+        cursor.execute(f'ALTER TABLE {q(tabela)} ALTER COLUMN id SET DEFAULT nextval(%s::regclass)', [sequencia])
+
+        # PK e unique precisam conter a chave de partição
+        cursor.execute(f'ALTER TABLE {q(tabela)} ADD CONSTRAINT {q(tabela + "_pkey")} PRIMARY KEY (id, data_hora_inicio)')
+        for nome, definicao, tipo, restricao in indices:
+            if tipo == 'p':
+                continue
+            if tipo == 'u':
+                cursor.execute(f'ALTER TABLE {q(tabela)} ADD CONSTRAINT {q(nome)} {restricao}')
+            else:
+                cursor.execute(definicao)  # definição capturada antes do rename: aponta para a tabela-mãe
+        for nome, definicao in fks:
+            cursor.execute(f'ALTER TABLE {q(tabela)} ADD CONSTRAINT {q(nome)} {definicao}')
+
+        cursor.execute(
+            f'ALTER TABLE {q(tabela)} ATTACH PARTITION {q(legado)} FOR VALUES FROM (MINVALUE) TO (%s)',
+            [limite.isoformat()],
+        )
+        cursor.execute(f'ALTER TABLE {q(legado)} DROP CONSTRAINT {q(limite_legado)}')
+        cursor.execute(f'CREATE TABLE {q(tabela + "_padrao")} PARTITION OF {q(tabela)} DEFAULT')
+        mes = limite
+        for _ in range(MESES_ADIANTE):
+            cursor.execute(
+                f'CREATE TABLE {q(f"{tabela}_p{mes:%Y%m}")} PARTITION OF {q(tabela)} FOR VALUES FROM (%s) TO (%s)',
+                [mes.isoformat(), _proximo_mes(mes).isoformat()],
+            )
+            mes = _proximo_mes(mes)
+
+
+def particionar(apps, schema_editor):
+    # Só PostgreSQL; em outros bancos ficam os índices e a retenção por DELETE em lotes
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+    # A partição legado vai até o fim do mês corrente (nenhum log começa no futuro)
+    agora = timezone.now().astimezone(dt_timezone.utc)
+    limite = _proximo_mes(agora.replace(day=1, hour=0, minute=0, second=0, microsecond=0))
+    for tabela in TABELAS:
+        _converter(connection, tabela, limite)
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY não roda dentro de transação (ver _converter)
+    atomic = False
+
+    dependencies = [
+        ('core', '0034_log_evento_id'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='logexibicao',
+            index=models.Index(fields=['dispositivo', 'data_hora_inicio'], name='logexib_disp_inicio_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='logexibicao',
+            index=models.Index(fields=['video', 'data_hora_inicio'], name='logexib_video_inicio_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='logexibicaowebview',
+            index=models.Index(fields=['dispositivo', 'data_hora_inicio'], name='logwebview_disp_inicio_idx'),
+        ),
+        migrations.RunPython(particionar, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 4.2.9 on 2026-10-17 04:17
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0035_log_particoes_indices'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MarcadorAgregacao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome', models.CharField(max_length=50, unique=True)),
+                ('ultimo_id', models.BigIntegerField(default=0, help_text='Logs com id até aqui já estão nos agregados')),
+                ('proximo_id', models.BigIntegerField(default=0, help_text='Maior id visto na passada anterior')),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Marcador de Agregação',
+                'verbose_name_plural': 'Marcadores de Agregação',
+            },
+        ),
+        migrations.CreateModel(
+            name='ExibicaoPorDia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('exibicoes', models.PositiveIntegerField(default=0)),
+                ('segundos', models.BigIntegerField(default=0, help_text='Tempo total exibido')),
+                ('completas', models.PositiveIntegerField(default=0)),
+                ('dia', models.DateField()),
+                ('dispositivo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.dispositivotv')),
+                ('playlist', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.playlist')),
+                ('video', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.video')),
+            ],
+            options={
+                'verbose_name': 'Exibições por Dia',
+                'verbose_name_plural': 'Exibições por Dia',
+            },
+        ),
+        migrations.CreateModel(
+            name='ExibicaoPorHora',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('exibicoes', models.PositiveIntegerField(default=0)),
+                ('segundos', models.BigIntegerField(default=0, help_text='Tempo total exibido')),
+                ('completas', models.PositiveIntegerField(default=0)),
+                ('hora', models.DateTimeField()),
+                ('dispositivo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.dispositivotv')),
+                ('playlist', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.playlist')),
+                ('video', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.video')),
+            ],
+            options={
+                'verbose_name': 'Exibições por Hora',
+                'verbose_name_plural': 'Exibições por Hora',
+                'indexes': [models.Index(fields=['video', 'hora'], name='exibicaohora_video_idx'), models.Index(fields=['hora'], name='exibicaohora_hora_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='exibicaoporhora',
+            constraint=models.UniqueConstraint(fields=('dispositivo', 'video', 'playlist', 'hora'), name='exibicaohora_unica'),
+        ),
+        migrations.AddIndex(
+            model_name='exibicaopordia',
+            index=models.Index(fields=['video', 'dia'], name='exibicaodia_video_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='exibicaopordia',
+            index=models.Index(fields=['dia'], name='exibicaodia_dia_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='exibicaopordia',
+            constraint=models.UniqueConstraint(fields=('dispositivo', 'video', 'playlist', 'dia'), name='exibicaodia_unica'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.9 on 2026-10-17 04:19
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0036_exibicoes_agregadas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetricasCliente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dados', models.JSONField(default=dict)),
+                ('calculado_em', models.DateTimeField()),
+                ('desatualizado', models.BooleanField(db_index=True, default=False)),
+                ('cliente', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='metricas', to='core.cliente')),
+            ],
+            options={
+                'verbose_name': 'Métricas do Cliente',
+                'verbose_name_plural': 'Métricas dos Clientes',
+            },
+        ),
+    ]
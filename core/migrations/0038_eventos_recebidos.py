@@ -0,0 +1,33 @@
+# Generated by Django 4.2.9 on 2026-10-17 04:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0037_metricas_cliente'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventoRecebido',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(max_length=10)),
+                ('evento_id', models.CharField(max_length=64)),
+                ('lote', models.CharField(max_length=32)),
+                ('recebido_em', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('dispositivo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.dispositivotv')),
+            ],
+            options={
+                'verbose_name': 'Evento Recebido',
+                'verbose_name_plural': 'Eventos Recebidos',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='eventorecebido',
+            constraint=models.UniqueConstraint(fields=('dispositivo', 'tipo', 'evento_id'), name='eventorecebido_unico'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.9 on 2026-10-17 04:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0038_eventos_recebidos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='metricascliente',
+            name='marcado_em',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -529,13 +529,17 @@ class Video(models.Model):
         - SCHEDULED: visível somente se data_publicacao <= now <= data_expiracao
         - PENDING/REJECTED: nunca visível
         """
+        return self.esta_visivel_em()
+
+    def esta_visivel_em(self, now=None):
+        """Igual a esta_visivel_nas_tvs, avaliado em `now` (default: agora)."""
         if not self.ativo:
             return False
         if self.status == 'APPROVED':
             return True
         if self.status == 'SCHEDULED':
-            from django.utils import timezone
-            now = timezone.now()
+            if now is None:
+                now = timezone.now()
             if self.data_publicacao and now < self.data_publicacao:
                 return False
             if self.data_expiracao and now > self.data_expiracao:
@@ -714,42 +718,34 @@ class DispositivoTV(models.Model):
     def __str__(self):
         return f"{self.nome} - {self.municipio}"
     
-    def esta_no_horario_exibicao(self):
+    def esta_no_horario_exibicao(self, momento=None):
         """
-        Verifica se o dispositivo deve estar ligado agora baseado nos
-        HorarioFuncionamento cadastrados. Se não há nenhum, está sempre ligado.
+        Verifica se o dispositivo deve estar ligado agora (ou em `momento`) baseado
+        nos HorarioFuncionamento cadastrados. Se não há nenhum, está sempre ligado.
+        Consulta a timeline semanal compilada (core/timeline.py).
         """
         from django.utils import timezone
+        from .timeline import obter_timeline
 
-        horarios = self.horarios_funcionamento.filter(ativo=True)
-        if not horarios.exists():
-            return True  # sem horário de funcionamento = 24/7
-
-        now = timezone.localtime(timezone.now())
-        dia_semana = now.weekday()
-        hora_atual = now.time()
-
-        for h in horarios:
-            dias = h.dias_semana if h.dias_semana else list(range(7))
-            if dia_semana in dias and h.hora_inicio <= hora_atual <= h.hora_fim:
-                return True
-
-        return False
+        return obter_timeline(self).ligado_em(momento or timezone.now())
 
     @property
     def tem_horario_funcionamento(self):
         """Retorna True se o dispositivo tem horários de funcionamento definidos"""
-        return self.horarios_funcionamento.filter(ativo=True).exists()
+        from .timeline import obter_timeline
+        return obter_timeline(self).tem_funcionamento
 
     @property
     def esta_online(self):
         """True se o dispositivo enviou heartbeat nos últimos OFFLINE_THRESHOLD_MINUTES."""
         from django.utils import timezone
         from django.conf import settings as _s
+        from .presenca import ultimo_contato
         threshold = getattr(_s, 'DEVICE_OFFLINE_THRESHOLD_MINUTES', 10)
-        if not self.ultima_sincronizacao:
+        ultima = ultimo_contato(self)
+        if not ultima:
             return False
-        return (timezone.now() - self.ultima_sincronizacao).total_seconds() < threshold * 60
+        return (timezone.now() - ultima).total_seconds() < threshold * 60
 
     def get_playlists_ativas_por_horario(self):
         """
@@ -768,51 +764,13 @@ class DispositivoTV(models.Model):
         - Durante 12:30-13:30: [C, A, B] (horário específico + 24/7)
         """
         from django.utils import timezone
+        from .timeline import obter_timeline
 
-        agendamentos = self.agendamentos.filter(ativo=True).select_related('playlist')
-        if not agendamentos.exists():
+        agendamentos = obter_timeline(self).agendamentos_em(timezone.now())
+        if not agendamentos:
+            # Fallback: sem agendamento ativo agora, usa playlist_atual
             return [self.playlist_atual] if self.playlist_atual else []
-
-        now = timezone.localtime(timezone.now())
-        dia_semana = now.weekday()
-        hora_atual = now.time()
-
-        agendamentos_horario = []
-        agendamentos_fulltime = []
-
-        for ag in agendamentos:
-            if not ag.playlist or not ag.playlist.ativa:
-                continue
-
-            dias = ag.dias_efetivos
-
-            if ag.is_fulltime:
-                # Playlist 24/7 - sempre incluída
-                if dia_semana in dias:
-                    agendamentos_fulltime.append(ag)
-            else:
-                # Playlist com horário específico - só incluída se bater o horário
-                if dia_semana in dias and ag.hora_inicio <= hora_atual <= ag.hora_fim:
-                    agendamentos_horario.append(ag)
-
-        # Monta lista de playlists ativas
-        playlists_ativas = []
-
-        # 1. Adiciona playlists de horário específico (se houver e estiver no horário)
-        if agendamentos_horario:
-            agendamentos_horario.sort(key=lambda x: x.prioridade, reverse=True)
-            playlists_ativas.extend([ag.playlist for ag in agendamentos_horario])
-
-        # 2. SEMPRE adiciona as playlists 24/7 (base contínua)
-        if agendamentos_fulltime:
-            agendamentos_fulltime.sort(key=lambda x: x.prioridade, reverse=True)
-            playlists_ativas.extend([ag.playlist for ag in agendamentos_fulltime])
-
-        # 3. Fallback: se não tem nenhuma, usa playlist_atual
-        if not playlists_ativas:
-            return [self.playlist_atual] if self.playlist_atual else []
-
-        return playlists_ativas
+        return [ag.playlist for ag in agendamentos]
 
     def get_playlist_atual_por_horario(self):
         """
@@ -822,41 +780,17 @@ class DispositivoTV(models.Model):
         playlists = self.get_playlists_ativas_por_horario()
         return playlists[0] if playlists else None
 
-    def get_agendamentos_ativos_por_horario(self):
+    def get_agendamentos_ativos_por_horario(self, momento=None):
         """Igual a get_playlists_ativas_por_horario() mas retorna os objetos
         AgendamentoExibicao em vez de apenas as playlists, preservando o campo
         percentual para cálculo de composição proporcional.
 
         Retorna lista de AgendamentoExibicao na mesma ordem de prioridade.
+        `momento` permite avaliar um instante futuro (plano offline).
         """
-        agendamentos = self.agendamentos.filter(
-            ativo=True,
-            playlist__ativa=True,
-        ).select_related('playlist')
-
-        now = timezone.localtime(timezone.now())
-        dia_semana = now.weekday()
-        hora_atual = now.time()
-
-        horario = []
-        fulltime = []
-
-        for ag in agendamentos:
-            if not ag.playlist:
-                continue
-            dias = ag.dias_efetivos
-            if ag.is_fulltime:
-                if dia_semana in dias:
-                    fulltime.append(ag)
-            else:
-                if dia_semana in dias and ag.hora_inicio <= hora_atual <= ag.hora_fim:
-                    horario.append(ag)
+        from .timeline import obter_timeline
 
-        resultado = []
-        if horario:
-            resultado.extend(sorted(horario, key=lambda x: x.prioridade, reverse=True))
-        if fulltime:
-            resultado.extend(sorted(fulltime, key=lambda x: x.prioridade, reverse=True))
+        resultado = obter_timeline(self).agendamentos_em(momento or timezone.now())
 
         if not resultado:
             # Fallback: playlist_atual sem percentual
@@ -877,12 +811,13 @@ class DispositivoTV(models.Model):
           - 'desconectado': nenhum consumo de API nos últimos 10 min (ou nunca)
         """
         from django.utils import timezone
-        import datetime
+        from .presenca import ultimo_contato
 
-        if not self.ultima_sincronizacao:
+        ultima = ultimo_contato(self)
+        if not ultima:
             return 'desconectado'
 
-        delta = timezone.now() - self.ultima_sincronizacao
+        delta = timezone.now() - ultima
         if delta.total_seconds() > 600:  # 10 minutos sem consumo
             return 'desconectado'
 
@@ -1066,12 +1001,25 @@ class LogExibicao(models.Model):
     data_hora_inicio = models.DateTimeField()
     data_hora_fim = models.DateTimeField(null=True, blank=True)
     completamente_exibido = models.BooleanField(default=False)
+    # Id gerado pelo app para o evento: reenvios (falha de rede, backlog offline) não duplicam
+    evento_id = models.CharField(max_length=64, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         verbose_name = 'Log de Exibição'
         verbose_name_plural = 'Logs de Exibição'
         ordering = ['-data_hora_inicio']
+        # No PostgreSQL a tabela é particionada por mês em data_hora_inicio
+        # (core/particoes.py): índices únicos precisam conter a chave de partição.
+        constraints = [
+            models.UniqueConstraint(
+                fields=['dispositivo', 'evento_id', 'data_hora_inicio'], name='logexibicao_evento_unico',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['dispositivo', 'data_hora_inicio'], name='logexib_disp_inicio_idx'),
+            models.Index(fields=['video', 'data_hora_inicio'], name='logexib_video_inicio_idx'),
+        ]
     
     def __str__(self):
         return f"{self.video.titulo} - {self.dispositivo.nome} - {self.data_hora_inicio}"
@@ -1113,12 +1061,21 @@ class LogExibicaoWebView(models.Model):
     data_hora_inicio = models.DateTimeField()
     data_hora_fim = models.DateTimeField(null=True, blank=True)
     completamente_exibido = models.BooleanField(default=False)
+    evento_id = models.CharField(max_length=64, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         verbose_name = 'Log WebView'
         verbose_name_plural = 'Logs WebView'
         ordering = ['-data_hora_inicio']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['dispositivo', 'evento_id', 'data_hora_inicio'], name='logwebview_evento_unico',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['dispositivo', 'data_hora_inicio'], name='logwebview_disp_inicio_idx'),
+        ]
 
     def __str__(self):
         return f"{self.titulo} - {self.dispositivo.nome} - {self.data_hora_inicio}"
@@ -1131,6 +1088,111 @@ class LogExibicaoWebView(models.Model):
         return f"{segundos // 60}:{segundos % 60:02d}"
 
 
+class EventoRecebido(models.Model):
+    """
+    evento_id recebidos recentemente, por dispositivo — trava de deduplicação
+    dos logs (core/logs.py). Tabela comum (não particionada): a unicidade de
+    (dispositivo, tipo, evento_id) vale mesmo quando o reenvio chega com outro
+    data_hora_inicio. Linhas mais antigas que TV_LOG_DEDUP_HOURS são apagadas.
+    """
+    dispositivo = models.ForeignKey(DispositivoTV, on_delete=models.CASCADE, related_name='+')
+    tipo = models.CharField(max_length=10)
+    evento_id = models.CharField(max_length=64)
+    # Gravação que reservou o evento — identifica as linhas inseridas por ela
+    lote = models.CharField(max_length=32)
+    recebido_em = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = 'Evento Recebido'
+        verbose_name_plural = 'Eventos Recebidos'
+        constraints = [
+            models.UniqueConstraint(fields=['dispositivo', 'tipo', 'evento_id'], name='eventorecebido_unico'),
+        ]
+
+    def __str__(self):
+        return f"{self.dispositivo_id}/{self.tipo}/{self.evento_id}"
+
+
+class ExibicaoAgregada(models.Model):
+    """
+    Exibições de vídeo pré-agregadas por dispositivo × vídeo × playlist,
+    mantidas pelo compactador de core/agregacao.py a partir de LogExibicao.
+    Os relatórios leem daqui, não dos logs brutos.
+    """
+    dispositivo = models.ForeignKey(DispositivoTV, on_delete=models.CASCADE, related_name='+')
+    video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name='+')
+    playlist = models.ForeignKey(Playlist, on_delete=models.CASCADE, related_name='+')
+    exibicoes = models.PositiveIntegerField(default=0)
+    segundos = models.BigIntegerField(default=0, help_text='Tempo total exibido')
+    completas = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+
+class ExibicaoPorHora(ExibicaoAgregada):
+    """Exibições agregadas por hora"""
+    hora = models.DateTimeField()
+
+    class Meta:
+        verbose_name = 'Exibições por Hora'
+        verbose_name_plural = 'Exibições por Hora'
+        constraints = [
+            models.UniqueConstraint(fields=['dispositivo', 'video', 'playlist', 'hora'], name='exibicaohora_unica'),
+        ]
+        indexes = [
+            models.Index(fields=['video', 'hora'], name='exibicaohora_video_idx'),
+            models.Index(fields=['hora'], name='exibicaohora_hora_idx'),
+        ]
+
+
+class ExibicaoPorDia(ExibicaoAgregada):
+    """Exibições agregadas por dia (fuso local)"""
+    dia = models.DateField()
+
+    class Meta:
+        verbose_name = 'Exibições por Dia'
+        verbose_name_plural = 'Exibições por Dia'
+        constraints = [
+            models.UniqueConstraint(fields=['dispositivo', 'video', 'playlist', 'dia'], name='exibicaodia_unica'),
+        ]
+        indexes = [
+            models.Index(fields=['video', 'dia'], name='exibicaodia_video_idx'),
+            models.Index(fields=['dia'], name='exibicaodia_dia_idx'),
+        ]
+
+
+class MarcadorAgregacao(models.Model):
+    """Até onde (id) os logs já foram agregados — ver core/agregacao.py"""
+    nome = models.CharField(max_length=50, unique=True)
+    ultimo_id = models.BigIntegerField(default=0, help_text='Logs com id até aqui já estão nos agregados')
+    proximo_id = models.BigIntegerField(default=0, help_text='Maior id visto na passada anterior')
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Marcador de Agregação'
+        verbose_name_plural = 'Marcadores de Agregação'
+
+    def __str__(self):
+        return f"{self.nome}: {self.ultimo_id}"
+
+
+class MetricasCliente(models.Model):
+    """Snapshot das métricas de visibilidade do cliente (core/metricas.py)"""
+    cliente = models.OneToOneField(Cliente, on_delete=models.CASCADE, related_name='metricas')
+    dados = models.JSONField(default=dict)
+    calculado_em = models.DateTimeField()
+    desatualizado = models.BooleanField(default=False, db_index=True)
+    marcado_em = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Métricas do Cliente'
+        verbose_name_plural = 'Métricas dos Clientes'
+
+    def __str__(self):
+        return f"{self.cliente} ({self.calculado_em:%d/%m/%Y %H:%M})"
+
+
 class AppVersion(models.Model):
     """Versões do aplicativo Android para download"""
     versao = models.CharField(max_length=20, unique=True, help_text='Ex: 1.0.0, 1.2.5')
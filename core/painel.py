@@ -0,0 +1,259 @@
+"""
+Resumo do dashboard do proprietário (hierarquia de franqueados).
+
+O dashboard carregava todos os municípios, clientes e playlists de todos os
+franqueados a cada acesso. Agora a página inicial só mostra o cabeçalho de
+cada franqueado, vindo do cache compartilhado em pedaços:
+
+- GERAL_KEY: totais (franqueados, municípios, clientes, dispositivos) e a
+  lista ordenada de franqueados;
+- SECAO_PREFIX<id>: cabeçalho de cada franqueado — dados do usuário e
+  contagens (municípios, clientes, playlists, dispositivos, público).
+
+Os receivers de core/signals.py invalidam só as seções dos franqueados
+afetados por cada alteração (franqueados_de()); criação e exclusão também
+descartam GERAL_KEY. A primeira renderização depois da invalidação recompila
+apenas o que falta, uma vez (single-flight), com um punhado de consultas
+filtradas pelos franqueados faltantes.
+
+As listas (municípios, clientes e playlists do franqueado; dispositivos do
+município) são carregadas pelo dashboard ao expandir, página a página
+(listar() / dispositivos_municipio()), direto do banco.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db.models import Count, Sum
+from django.urls import reverse
+
+FORMATO = 2
+GERAL_KEY = f'painel:v{FORMATO}:geral'
+SECAO_PREFIX = f'painel:v{FORMATO}:franqueado:'
+
+# Itens por página nas listas carregadas ao expandir
+POR_PAGINA = 20
+
+
+def _ttl():
+    # Rede de segurança para alterações que não disparam sinais (queryset.update)
+    return getattr(settings, 'OWNER_DASHBOARD_CACHE_SECONDS', 3600)
+
+
+def _chave_secao(franqueado_id):
+    return f'{SECAO_PREFIX}{franqueado_id}'
+
+
+# ─── invalidação ─────────────────────────────────────────────────────────────
+
+def invalidar(franqueado_ids=(), geral=False):
+    chaves = [_chave_secao(f) for f in set(franqueado_ids) if f]
+    if geral:
+        chaves.append(GERAL_KEY)
+    if chaves:
+        cache.delete_many(chaves)
+
+
+def franqueados_de(instance):
+    """Ids dos franqueados cujo cabeçalho depende de `instance`."""
+    from .models import Cliente, DispositivoTV, Municipio, Playlist, User
+
+    if isinstance(instance, User):
+        return {instance.pk}
+    if isinstance(instance, (Municipio, Cliente, Playlist)):
+        return {instance.franqueado_id}
+    if isinstance(instance, DispositivoTV):
+        return set(Municipio.objects.filter(pk=instance.municipio_id).values_list('franqueado_id', flat=True))
+    return set()
+
+
+# ─── compilação ──────────────────────────────────────────────────────────────
+
+def _compilar_geral():
+    from .models import Cliente, DispositivoTV, Municipio, User
+
+    franqueados = list(User.objects.filter(role='FRANCHISEE').order_by('username').values_list('id', flat=True))
+    return {
+        'totais': {
+            'total_franchisees': len(franqueados),
+            'total_municipios': Municipio.objects.count(),
+            'total_clients': Cliente.objects.count(),
+            'total_devices': DispositivoTV.objects.count(),
+        },
+        'franqueados': franqueados,
+    }
+
+
+def _contagem(queryset, campo):
+    return dict(queryset.values_list(campo).annotate(n=Count('id')).order_by())
+
+
+def _compilar_secoes(ids):
+    """{franqueado_id: seção} para os franqueados `ids` — consultas fixas, qualquer quantidade."""
+    from .models import Cliente, DispositivoTV, Municipio, Playlist, User
+
+    municipios = _contagem(Municipio.objects.filter(franqueado_id__in=ids), 'franqueado_id')
+    clientes = _contagem(Cliente.objects.filter(franqueado_id__in=ids), 'franqueado_id')
+    playlists = _contagem(Playlist.objects.filter(franqueado_id__in=ids), 'franqueado_id')
+    dispositivos = {
+        linha['municipio__franqueado']: linha
+        for linha in DispositivoTV.objects.filter(municipio__franqueado_id__in=ids)
+        .values('municipio__franqueado')
+        .annotate(total=Count('id'), publico=Sum('publico_estimado_mes'))
+        .order_by()
+    }
+    return {
+        u.id: {
+            'franqueado': {
+                'id': u.id, 'pk': u.pk, 'username': u.username, 'email': u.email,
+                'nome': u.get_full_name() or u.username,
+            },
+            'stats': {
+                'total_municipios': municipios.get(u.id, 0),
+                'total_clientes': clientes.get(u.id, 0),
+                'total_playlists': playlists.get(u.id, 0),
+                'total_dispositivos': dispositivos.get(u.id, {}).get('total', 0),
+                'publico_total': dispositivos.get(u.id, {}).get('publico') or 0,
+            },
+        }
+        for u in User.objects.filter(id__in=ids, role='FRANCHISEE')
+    }
+
+
+# ─── leitura ─────────────────────────────────────────────────────────────────
+
+def resumo():
+    """(totais, franqueados_data) do dashboard do proprietário."""
+    from .singleflight import executar
+
+    def compilar_geral():
+        geral = _compilar_geral()
+        cache.set(GERAL_KEY, geral, _ttl())
+        return geral
+
+    geral = cache.get(GERAL_KEY) or executar(GERAL_KEY, compilar_geral, lambda: cache.get(GERAL_KEY))
+
+    chaves = {fid: _chave_secao(fid) for fid in geral['franqueados']}
+    em_cache = cache.get_many(list(chaves.values()))
+    faltando = [fid for fid, chave in chaves.items() if chave not in em_cache]
+    if faltando:
+        # Hash dos ids: a lista inteira estouraria o varchar(255) do DatabaseCache
+        ids = ','.join(map(str, sorted(faltando)))
+        chave_lote = f'{SECAO_PREFIX}lote:' + hashlib.sha1(ids.encode()).hexdigest()
+
+        def ler_cache():
+            achadas = cache.get_many([chaves[fid] for fid in faltando])
+            return achadas if len(achadas) == len(faltando) else None
+
+        def compilar():
+            secoes = _compilar_secoes(faltando)
+            novas = {chaves[fid]: secao for fid, secao in secoes.items()}
+            cache.set_many(novas, _ttl())
+            return novas
+
+        em_cache.update(executar(chave_lote, compilar, ler_cache))
+
+    franqueados_data = [em_cache[chaves[fid]] for fid in geral['franqueados'] if chaves[fid] in em_cache]
+    return geral['totais'], franqueados_data
+
+
+# ─── listas sob demanda ──────────────────────────────────────────────────────
+
+def _pagina(queryset, numero, item):
+    pagina = Paginator(queryset, POR_PAGINA).get_page(numero)
+    return {
+        'itens': [item(obj) for obj in pagina],
+        'pagina': pagina.number,
+        'paginas': pagina.paginator.num_pages,
+        'total': pagina.paginator.count,
+        'tem_proxima': pagina.has_next(),
+    }
+
+
+def _municipios(franqueado_id):
+    from .models import Municipio
+
+    queryset = Municipio.objects.filter(franqueado_id=franqueado_id).annotate(
+        publico_total=Sum('dispositivos__publico_estimado_mes'),
+        dispositivos_count=Count('dispositivos'),
+    ).order_by('nome', 'pk')
+
+    def item(mun):
+        return {
+            'pk': mun.pk,
+            'nome': mun.nome,
+            'estado': mun.estado,
+            'publico_total': mun.publico_total or 0,
+            'dispositivos_count': mun.dispositivos_count,
+            'url': reverse('municipio_update', args=[mun.pk]),
+            'dispositivos_url': reverse('dashboard_municipio_dispositivos', args=[mun.pk]),
+        }
+    return queryset, item
+
+
+def _clientes(franqueado_id):
+    from .models import Cliente
+
+    queryset = Cliente.objects.filter(franqueado_id=franqueado_id).select_related('user').annotate(
+        total_municipios=Count('municipios'),
+    ).order_by('empresa', 'pk')
+
+    def item(cli):
+        return {
+            'pk': cli.pk,
+            'empresa': cli.empresa,
+            'total_municipios': cli.total_municipios,
+            'usuario': cli.user.get_full_name() or cli.user.username,
+            'url': reverse('cliente_update', args=[cli.pk]),
+        }
+    return queryset, item
+
+
+def _playlists(franqueado_id):
+    from .models import Playlist
+
+    queryset = Playlist.objects.filter(franqueado_id=franqueado_id).select_related('municipio').annotate(
+        total_videos=Count('items'),
+    ).order_by('nome', 'pk')
+
+    def item(pl):
+        return {
+            'pk': pl.pk,
+            'nome': pl.nome,
+            'ativa': pl.ativa,
+            'municipio': f'{pl.municipio.nome}/{pl.municipio.estado}',
+            'total_videos': pl.total_videos,
+            'url': reverse('playlist_detail', args=[pl.pk]),
+        }
+    return queryset, item
+
+
+LISTAS = {'municipios': _municipios, 'clientes': _clientes, 'playlists': _playlists}
+
+
+def listar(lista, franqueado_id, numero=1):
+    """Página `numero` da lista (chave de LISTAS) do franqueado."""
+    queryset, item = LISTAS[lista](franqueado_id)
+    return _pagina(queryset, numero, item)
+
+
+def dispositivos_municipio(municipio_id, numero=1):
+    """Página `numero` dos dispositivos do município."""
+    from .models import DispositivoTV
+
+    queryset = DispositivoTV.objects.filter(municipio_id=municipio_id).select_related(
+        'playlist_atual',
+    ).order_by('nome', 'pk')
+
+    def item(d):
+        return {
+            'pk': d.pk,
+            'nome': d.nome,
+            'localizacao': d.localizacao or '',
+            'ativo': d.ativo,
+            'publico_estimado_mes': d.publico_estimado_mes or 0,
+            'playlist': d.playlist_atual.nome if d.playlist_atual else None,
+            'url': reverse('dispositivo_detail', args=[d.pk]),
+        }
+    return _pagina(queryset, numero, item)
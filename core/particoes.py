@@ -0,0 +1,193 @@
+"""
+Particionamento mensal e retenção dos logs de exibição.
+
+LogExibicao e LogExibicaoWebView ganham uma linha por exibição por TV, para
+sempre. No PostgreSQL as duas tabelas são particionadas por mês em
+data_hora_inicio (PARTITION BY RANGE):
+
+- a migração 0035 converte cada tabela (DDL congelada na própria migração):
+  os dados existentes viram a partição `<tabela>_legado` — tudo até o fim do
+  mês da conversão — sem cópia de linhas; a validação do limite e o índice
+  da nova PK rodam antes, sem bloquear a escrita, e o ATTACH só mexe no
+  catálogo;
+- garantir_particoes() cria a partição do mês atual e dos próximos
+  TV_LOG_PARTITIONS_AHEAD meses (diariamente, pelo scheduler de core/apps.py);
+  eventos fora de qualquer mês criado (backlog muito antigo) caem na partição
+  `<tabela>_padrao`;
+- consultas com filtro em data_hora_inicio só leem as partições do período.
+
+arquivar() (comando `arquivar_logs`) grava um mês em NDJSON gzip no storage
+padrão (R2 em produção) e o remove do banco: se o mês é uma partição
+própria, DETACH + DROP — O(1), sem DELETE nem vacuum; senão (SQLite, meses
+dentro da partição legado ou da padrão), DELETE em lotes por id.
+
+Os limites das partições são meses em UTC.
+"""
+import gzip
+import logging
+import re
+import tempfile
+from datetime import timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .fastpath import codificar_json
+
+logger = logging.getLogger(__name__)
+
+TABELAS = ('core_logexibicao', 'core_logexibicaowebview')
+PASTA_ARQUIVO = 'arquivo-logs'
+
+
+def modelos():
+    from .models import LogExibicao, LogExibicaoWebView
+    return (LogExibicao, LogExibicaoWebView)
+
+
+def suportado(connection=None):
+    return (connection or connections['default']).vendor == 'postgresql'
+
+
+def mes_de(instante):
+    """Primeiro instante (UTC) do mês de `instante`."""
+    return instante.astimezone(dt_timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def proximo_mes(mes):
+    return (mes + timedelta(days=32)).replace(day=1)
+
+
+def nome_particao(tabela, mes):
+    return f'{tabela}_p{mes:%Y%m}'
+
+
+def _particionada(cursor, tabela):
+    cursor.execute('SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)', [tabela])
+    return cursor.fetchone() is not None
+
+
+def _e_particao(cursor, nome):
+    cursor.execute('SELECT 1 FROM pg_inherits WHERE inhrelid = to_regclass(%s)', [nome])
+    return cursor.fetchone() is not None
+
+
+def _fim_legado(cursor, tabela):
+    """Limite superior da partição legado (None se não existe)."""
+    cursor.execute(
+        'SELECT pg_get_expr(relpartbound, oid) FROM pg_class WHERE oid = to_regclass(%s)', [f'{tabela}_legado'],
+    )
+    linha = cursor.fetchone()
+    achado = re.search(r"TO \('([^']+)'\)", linha[0] or '') if linha else None
+    return parse_datetime(achado.group(1)) if achado else None
+
+
+# ─── manutenção (PostgreSQL) ─────────────────────────────────────────────────
+
+def garantir_particoes(agora=None, connection=None):
+    """Cria as partições do mês atual e dos próximos meses. Retorna os nomes criados."""
+    connection = connection or connections['default']
+    if not suportado(connection):
+        return []
+    q = connection.ops.quote_name
+    adiante = getattr(settings, 'TV_LOG_PARTITIONS_AHEAD', 2)
+    criadas = []
+    with connection.cursor() as cursor:
+        for tabela in TABELAS:
+            if not _particionada(cursor, tabela):
+                continue
+            legado = _fim_legado(cursor, tabela)
+            mes = mes_de(agora or timezone.now())
+            for _ in range(adiante + 1):
+                nome = nome_particao(tabela, mes)
+                if (legado is None or mes >= legado) and not _e_particao(cursor, nome):
+                    cursor.execute(
+                        f'CREATE TABLE {q(nome)} PARTITION OF {q(tabela)} FOR VALUES FROM (%s) TO (%s)',
+                        [mes.isoformat(), proximo_mes(mes).isoformat()],
+                    )
+                    criadas.append(nome)
+                mes = proximo_mes(mes)
+    if criadas:
+        logger.info('particoes: criadas %s', ', '.join(criadas))
+    return criadas
+
+
+# ─── retenção ────────────────────────────────────────────────────────────────
+
+def meses_anteriores(modelo, corte):
+    """Meses (UTC) com logs anteriores a `corte`, do mais antigo ao mais recente."""
+    primeiro = modelo.objects.filter(data_hora_inicio__lt=corte).aggregate(m=Min('data_hora_inicio'))['m']
+    meses = []
+    if primeiro is not None:
+        mes = mes_de(primeiro)
+        while mes < corte:
+            meses.append(mes)
+            mes = proximo_mes(mes)
+    return meses
+
+
+def _exportar(qs, tabela, mes, lote):
+    """Grava o queryset em NDJSON gzip no storage. Retorna (caminho, linhas, maior id)."""
+    ultimo_id = qs.aggregate(m=Max('id'))['m']
+    if ultimo_id is None:
+        return None, 0, None
+    linhas = 0
+    with tempfile.TemporaryFile() as tmp:
+        with gzip.GzipFile(fileobj=tmp, mode='wb') as gz:
+            for linha in qs.filter(id__lte=ultimo_id).values().iterator(chunk_size=lote):
+                gz.write(codificar_json(linha) + b'\n')
+                linhas += 1
+        tmp.seek(0)
+        # save() escolhe outro nome se o mês já tiver arquivo (sobras de arquivamento anterior)
+        caminho = default_storage.save(f'{PASTA_ARQUIVO}/{tabela}/{mes:%Y-%m}.ndjson.gz', File(tmp))
+    return caminho, linhas, ultimo_id
+
+
+def arquivar(modelo, mes, lote=5000):
+    """
+    Grava os logs do mês em `arquivo-logs/<tabela>/<AAAA-MM>.ndjson.gz` no
+    storage padrão e os remove do banco. Retorna (caminho, linhas); caminho
+    None se o mês estava vazio.
+    """
+    connection = connections['default']
+    q = connection.ops.quote_name
+    tabela = modelo._meta.db_table
+    particao = nome_particao(tabela, mes)
+    qs = modelo.objects.filter(data_hora_inicio__gte=mes, data_hora_inicio__lt=proximo_mes(mes)).order_by()
+
+    propria = False
+    if suportado(connection):
+        with connection.cursor() as cursor:
+            propria = _e_particao(cursor, particao)
+
+    if propria:
+        # Exporta sem trava: o upload pode levar minutos e a partição segue aceitando backlog
+        caminho, linhas, _ = _exportar(qs, tabela, mes, lote)
+        with transaction.atomic(), connection.cursor() as cursor:
+            # Bloqueia escrita tardia na partição até o DROP: nada some sem arquivar
+            cursor.execute(f'LOCK TABLE {q(particao)} IN SHARE MODE')
+            if qs.count() != linhas:
+                # Chegou backlog depois da exportação (raro): refaz o arquivo já sob a trava
+                if caminho:
+                    default_storage.delete(caminho)
+                caminho, linhas, _ = _exportar(qs, tabela, mes, lote)
+            cursor.execute(f'ALTER TABLE {q(tabela)} DETACH PARTITION {q(particao)}')
+            cursor.execute(f'DROP TABLE {q(particao)}')
+    else:
+        caminho, linhas, ultimo_id = _exportar(qs, tabela, mes, lote)
+        # Só o que foi arquivado (id ≤ ultimo_id); cada lote é uma transação curta
+        restantes = qs.filter(id__lte=ultimo_id) if ultimo_id is not None else qs.none()
+        while True:
+            ids = list(restantes.values_list('id', flat=True)[:lote])
+            if not ids:
+                break
+            restantes.filter(id__in=ids).delete()
+
+    if caminho:
+        logger.info('particoes: %s %s arquivado em %s (%d linhas)', tabela, f'{mes:%Y-%m}', caminho, linhas)
+    return caminho, linhas
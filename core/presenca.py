@@ -0,0 +1,271 @@
+"""
+Presença das TVs (ultima_sincronizacao) com gravação agrupada.
+
+Heartbeat, auth, check-schedule e o canal de push marcam o dispositivo como
+vivo a cada chamada. Gravar isso no banco a cada chamada era a maior fonte
+de escrita do sistema. Agora:
+
+- tocar() só anota o instante na memória do processo (sem I/O);
+- uma thread por processo, a cada TV_PRESENCE_FLUSH_SECONDS, publica no
+  cache compartilhado e grava no banco — com um UPDATE para o lote todo —
+  apenas os dispositivos cujo instante avançou mais que
+  TV_PRESENCE_WRITE_SECONDS desde a última gravação (ou cuja versao_app
+  mudou). Na mesma passada, quem estava com alerta de offline tem o flag
+  resetado e recebe o e-mail de reconexão;
+- leituras (esta_online, status_conexao, check_offline_devices) usam
+  carregar(), que junta banco, cache e o que está pendente no processo;
+- cada gravação agenda o prazo de offline do dispositivo num heap
+  (expirados(), usado por check_offline_devices).
+
+O atraso máximo de ultima_sincronizacao no banco fica em torno de
+TV_PRESENCE_WRITE_SECONDS + TV_PRESENCE_FLUSH_SECONDS — bem abaixo do limite
+de offline (DEVICE_OFFLINE_THRESHOLD_MINUTES).
+"""
+import atexit
+import heapq
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.db.models import Case, DateTimeField, Value, When
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'tvpresenca:v2:'
+CACHE_TTL = 86400
+
+_lock = threading.Lock()
+_pendentes = {}    # identificador → (instante, versao_app) desde a última passada
+_publicados = {}   # identificador → (instante, versao_app) gravado por este processo
+_thread = None
+
+# Prazos de offline: heap de (expira_em, identificador). Entradas antigas do
+# mesmo dispositivo ficam no heap e são descartadas ao sair (comparando com _expira).
+_heap = []
+_expira = {}       # identificador → prazo mais recente
+_semeado_em = None
+
+
+def _chave(identificador_unico):
+    return f'{KEY_PREFIX}{identificador_unico}'
+
+
+def _config(nome, padrao):
+    return getattr(settings, nome, padrao)
+
+
+# ─── escrita ─────────────────────────────────────────────────────────────────
+
+def tocar(identificador_unico, versao_app=''):
+    """Registra sinal de vida do dispositivo (memória; gravado pela thread de flush)."""
+    identificador_unico = str(identificador_unico)
+    agora = timezone.now()
+    if _config('TV_PRESENCE_FLUSH_SECONDS', 15) <= 0:
+        _publicar({identificador_unico: (agora, versao_app or '')})
+        return
+    with _lock:
+        anterior = _pendentes.get(identificador_unico)
+        _pendentes[identificador_unico] = (agora, versao_app or (anterior[1] if anterior else ''))
+        _iniciar()
+
+
+def _iniciar():
+    global _thread
+    if _thread is None:
+        _thread = threading.Thread(target=_loop, name='tv-presenca-flush', daemon=True)
+        _thread.start()
+        atexit.register(esvaziar, forcar=True)
+
+
+def _loop():
+    while True:
+        time.sleep(max(1, _config('TV_PRESENCE_FLUSH_SECONDS', 15)))
+        try:
+            esvaziar()
+        except Exception:
+            logger.exception('presenca: falha ao gravar presença')
+        finally:
+            close_old_connections()
+
+
+def esvaziar(forcar=False):
+    """
+    Publica a presença pendente que avançou mais que a granularidade.
+    forcar=True grava tudo (encerramento do processo). Retorna quantos gravou.
+    """
+    granularidade = timezone.timedelta(seconds=_config('TV_PRESENCE_WRITE_SECONDS', 60))
+    with _lock:
+        pendentes = dict(_pendentes)
+        _pendentes.clear()
+    devidos = {}
+    for ident, (instante, versao) in pendentes.items():
+        publicado = _publicados.get(ident)
+        if (
+            forcar or publicado is None
+            or instante - publicado[0] >= granularidade
+            or (versao and versao != publicado[1])
+        ):
+            devidos[ident] = (instante, versao)
+    if devidos:
+        _publicar(devidos)
+    return len(devidos)
+
+
+def _publicar(devidos):
+    """Cache compartilhado + um UPDATE em lote; reconexões ganham e-mail."""
+    from .models import DispositivoTV
+
+    cache.set_many({_chave(i): v for i, v in devidos.items()}, CACHE_TTL)
+    ativos = DispositivoTV.objects.filter(identificador_unico__in=list(devidos), ativo=True)
+    ativos.update(ultima_sincronizacao=Case(
+        *[When(identificador_unico=i, then=Value(instante)) for i, (instante, _) in devidos.items()],
+        output_field=DateTimeField(),
+    ))
+    # versao_app: raro mudar — um UPDATE por versão distinta
+    por_versao = {}
+    for ident, (_, versao) in devidos.items():
+        if versao and versao != _publicados.get(ident, (None, ''))[1]:
+            por_versao.setdefault(versao, []).append(ident)
+    for versao, idents in por_versao.items():
+        ativos.filter(identificador_unico__in=idents).exclude(versao_app=versao).update(versao_app=versao)
+    _publicados.update(devidos)
+    limite = _limite_offline()
+    for ident, (instante, _) in devidos.items():
+        agendar(ident, instante + limite)
+
+    _reconectados(devidos)
+
+
+def _reconectados(devidos):
+    """Dispositivos com alerta de offline ativo que voltaram: reseta o flag e avisa."""
+    from .models import DispositivoTV
+
+    voltaram = list(DispositivoTV.objects.filter(
+        identificador_unico__in=list(devidos), ativo=True, alerta_desconexao_enviado=True,
+    ).select_related('municipio', 'municipio__franqueado', 'franqueado'))
+    if not voltaram:
+        return
+    DispositivoTV.objects.filter(id__in=[d.id for d in voltaram]).update(alerta_desconexao_enviado=False)
+    try:
+        from core.alerts import _emails_owners, send_online_alert
+        owners = _emails_owners()
+        for dispositivo in voltaram:
+            dispositivo.alerta_desconexao_enviado = False
+            send_online_alert(dispositivo, owners)
+    except Exception:
+        logger.exception('presenca: falha ao enfileirar alerta de reconexão')
+
+
+# ─── leitura ─────────────────────────────────────────────────────────────────
+
+def carregar(dispositivos):
+    """
+    Atualiza ultima_sincronizacao das instâncias com o valor mais recente
+    entre banco, cache compartilhado e pendências deste processo — uma
+    consulta ao cache para a lista toda.
+    """
+    dispositivos = [d for d in dispositivos if not getattr(d, '_presenca_carregada', False)]
+    if not dispositivos:
+        return
+    valores = cache.get_many([_chave(d.identificador_unico) for d in dispositivos])
+    with _lock:
+        locais = {d.identificador_unico: _pendentes.get(str(d.identificador_unico)) for d in dispositivos}
+    for d in dispositivos:
+        candidatos = [d.ultima_sincronizacao, (valores.get(_chave(d.identificador_unico)) or (None,))[0]]
+        if locais[d.identificador_unico]:
+            candidatos.append(locais[d.identificador_unico][0])
+        candidatos = [c for c in candidatos if c is not None]
+        if candidatos:
+            d.ultima_sincronizacao = max(candidatos)
+        d._presenca_carregada = True
+
+
+def ultimo_contato(dispositivo):
+    """ultima_sincronizacao mais recente conhecida do dispositivo."""
+    carregar([dispositivo])
+    return dispositivo.ultima_sincronizacao
+
+
+# ─── expiração (detecção de offline) ─────────────────────────────────────────
+# Em vez de varrer todos os dispositivos a cada minuto, cada presença gravada
+# agenda o prazo em que o dispositivo vira offline (instante + limite). A
+# verificação só olha os prazos que venceram desde a última passada — custo
+# proporcional a quem mudou de estado, não ao tamanho da frota.
+#
+# O heap é semeado do banco na primeira verificação do processo e reconciliado
+# a cada TV_OFFLINE_RECONCILE_SECONDS — cobre dispositivos que só falam com
+# outro processo e reinícios.
+
+def _limite_offline():
+    return timezone.timedelta(minutes=_config('DEVICE_OFFLINE_THRESHOLD_MINUTES', 10))
+
+
+def agendar(identificador_unico, expira_em):
+    """Agenda (ou adia) o prazo de offline do dispositivo."""
+    identificador_unico = str(identificador_unico)
+    with _lock:
+        atual = _expira.get(identificador_unico)
+        if atual is not None and expira_em <= atual:
+            return
+        _expira[identificador_unico] = expira_em
+        heapq.heappush(_heap, (expira_em, identificador_unico))
+
+
+def _semear():
+    """Agenda todos os dispositivos online no banco (início e reconciliação)."""
+    global _semeado_em
+    from .models import DispositivoTV
+
+    limite = _limite_offline()
+    for ident, ultima in DispositivoTV.objects.filter(
+        ativo=True, alerta_desconexao_enviado=False, ultima_sincronizacao__isnull=False,
+    ).values_list('identificador_unico', 'ultima_sincronizacao').iterator():
+        agendar(ident, ultima + limite)
+    with _lock:
+        # Compacta: descarta entradas superadas acumuladas desde a última semeadura
+        _heap[:] = [(e, i) for e, i in _heap if _expira.get(i) == e]
+        heapq.heapify(_heap)
+    _semeado_em = time.monotonic()
+
+
+def expirados():
+    """
+    Dispositivos (instâncias, ativos, sem alerta) cujo prazo de offline venceu
+    desde a última chamada e que continuam sem contato — confirmados no banco
+    e no cache compartilhado. Quem teve contato recente é reagendado.
+    """
+    from .models import DispositivoTV
+
+    reconciliar = _config('TV_OFFLINE_RECONCILE_SECONDS', 3600)
+    if _semeado_em is None or time.monotonic() - _semeado_em >= reconciliar:
+        _semear()
+
+    agora = timezone.now()
+    vencidos = set()
+    with _lock:
+        while _heap and _heap[0][0] <= agora:
+            expira_em, ident = heapq.heappop(_heap)
+            if _expira.get(ident) == expira_em:
+                del _expira[ident]
+                vencidos.add(ident)
+    if not vencidos:
+        return []
+
+    limite = _limite_offline()
+    candidatos = list(DispositivoTV.objects.filter(
+        identificador_unico__in=vencidos, ativo=True,
+        alerta_desconexao_enviado=False, ultima_sincronizacao__isnull=False,
+    ).select_related('municipio', 'municipio__franqueado', 'franqueado'))
+    carregar(candidatos)
+
+    offline = []
+    for d in candidatos:
+        if d.ultima_sincronizacao + limite <= agora:
+            offline.append(d)
+        else:
+            agendar(d.identificador_unico, d.ultima_sincronizacao + limite)
+    return offline
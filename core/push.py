@@ -0,0 +1,276 @@
+"""
+Canal de push das TVs: long-poll e Server-Sent Events.
+
+Em vez de repetir POST /api/tv/auth/ às cegas, o app segura uma conexão em
+GET /api/tv/push/<identificador>/?versao=<versao_manifesto> e é acordado
+quando o manifesto muda:
+
+- no mesmo processo, os sinais que invalidam manifestos (core/manifest.py →
+  invalidar_tudo / invalidar_dispositivo) chamam avisar(), que acorda na
+  hora quem espera por aquele dispositivo (ou todos) e publica o aviso no
+  cache compartilhado (AVISOS_KEY);
+- mudanças vindas de outro processo (comando de management, outra réplica)
+  são percebidas por uma única thread vigia por processo, que lê AVISOS_KEY
+  a cada TV_PUSH_CHECK_SECONDS e acorda só as conexões locais afetadas;
+- fronteiras de horário: cada conexão verifica de novo sozinha no
+  valido_ate do manifesto que já conhece.
+
+Uma conexão parada não lê o cache: o custo por processo é uma leitura a
+cada TV_PUSH_CHECK_SECONDS, mais uma por conexão acordada.
+
+Ao acordar, a versão é recalculada via obter_manifesto — TVs da mesma
+classe de programação reaproveitam a fila compilada uma vez (core/manifest.py).
+
+A espera é assíncrona (asyncio): no processo de push (mediaexpand/asgi.py,
+start_push.sh) uma conexão parada não ocupa thread — core/fastpath.py leva o
+push direto à view, sem os middlewares síncronos. O número de conexões
+simultâneas por processo é limitado por TV_PUSH_MAX_CONEXOES; acima disso o
+app recebe 429 + Retry-After e continua no polling normal. No site (gunicorn
+gthread, start.sh) cada conexão seguraria uma thread e o limite fica em 2: o
+push ali fica praticamente desligado — o manifesto indica às TVs o endereço
+do processo de push (TV_PUSH_URL → push_url).
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+TODOS = '*'
+# Avisos recentes publicados no cache compartilhado, lidos pela vigia de cada processo
+AVISOS_KEY = 'tvpush:avisos'
+AVISOS_MAX = 100
+# Avisos com mais dispositivos que isso são publicados como "todos"
+AVISO_MAX_ALVOS = 500
+# Intervalo da checagem dos avisos locais (memória do processo, custo zero)
+INTERVALO_LOCAL = 0.5
+HEARTBEAT_SEGUNDOS = 15
+PRESENCA_SEGUNDOS = 60
+
+_lock = threading.Lock()
+_avisos = {}
+_conexoes = 0
+_vigia = None
+# Fichas dos avisos publicados por este processo (já entregues localmente)
+_proprios = deque(maxlen=AVISOS_MAX)
+
+
+# ─── avisos locais ───────────────────────────────────────────────────────────
+
+def notificar(identificador_unico=None):
+    """Acorda as conexões do dispositivo (ou de todos, sem identificador)."""
+    chave = str(identificador_unico) if identificador_unico else TODOS
+    with _lock:
+        _avisos[chave] = _avisos.get(chave, 0) + 1
+
+
+def _marca(identificador_unico):
+    return _avisos.get(TODOS, 0), _avisos.get(identificador_unico, 0)
+
+
+def avisar(identificadores=None):
+    """
+    notificar() neste processo e publica o aviso para os demais. Sem
+    identificadores, vale para todos os dispositivos.
+    """
+    from django.core.cache import caches
+
+    alvos = [str(i) for i in identificadores if i] if identificadores is not None else [TODOS]
+    if not alvos:
+        return
+    for alvo in alvos:
+        notificar(None if alvo == TODOS else alvo)
+    ficha = uuid.uuid4().hex
+    with _lock:
+        _proprios.append(ficha)
+    # Leitura + escrita não atômicas: um aviso perdido numa corrida só atrasa
+    # aquela TV até a próxima reconexão (TV_PUSH_TIMEOUT_SECONDS)
+    publicados = caches['estado'].get(AVISOS_KEY) or []
+    publicados.append((ficha, alvos if len(alvos) <= AVISO_MAX_ALVOS else [TODOS]))
+    caches['estado'].set(AVISOS_KEY, publicados[-AVISOS_MAX:], None)
+
+
+# ─── vigia (uma por processo) ────────────────────────────────────────────────
+
+def _novos_avisos(publicados, visto):
+    """
+    Alvos dos avisos publicados depois de `visto` (ficha do último aviso lido;
+    '' se a lista estava vazia) — [TODOS] se `visto` já saiu da lista.
+    """
+    fichas = [ficha for ficha, _ in publicados]
+    if visto == '':
+        novos = publicados
+    elif visto in fichas:
+        novos = publicados[fichas.index(visto) + 1:]
+    else:
+        return [TODOS]
+    return [alvo for ficha, alvos in novos if ficha not in _proprios for alvo in alvos]
+
+
+def _vigiar():
+    from django.core.cache import caches
+    from django.db import close_old_connections
+
+    visto = None  # primeira leitura: só registra onde a lista está
+    while True:
+        try:
+            publicados = caches['estado'].get(AVISOS_KEY) or []
+            if visto is not None:
+                for alvo in set(_novos_avisos(publicados, visto)):
+                    notificar(None if alvo == TODOS else alvo)
+            visto = publicados[-1][0] if publicados else ''
+        except Exception:
+            logger.exception('push: falha ao ler os avisos compartilhados')
+        finally:
+            close_old_connections()
+        time.sleep(getattr(settings, 'TV_PUSH_CHECK_SECONDS', 5))
+
+
+def _iniciar_vigia():
+    global _vigia
+    if _vigia is None:
+        _vigia = threading.Thread(target=_vigiar, name='tvpush-vigia', daemon=True)
+        _vigia.start()
+
+
+# ─── capacidade ──────────────────────────────────────────────────────────────
+
+def reservar_conexao():
+    """True se há vaga para mais uma conexão de push neste processo."""
+    global _conexoes
+    with _lock:
+        if _conexoes >= getattr(settings, 'TV_PUSH_MAX_CONEXOES', 2):
+            return False
+        _conexoes += 1
+        _iniciar_vigia()
+        return True
+
+
+def liberar_conexao():
+    global _conexoes
+    with _lock:
+        _conexoes = max(0, _conexoes - 1)
+
+
+# ─── espera ──────────────────────────────────────────────────────────────────
+
+def versao_atual(identificador_unico, request):
+    """
+    (versao, valido_ate) do manifesto vigente do dispositivo (compila se
+    preciso), ou (None, None) se inativo.
+    """
+    from . import manifest
+    from .models import DispositivoTV
+
+    entry = manifest.manifesto_em_cache(identificador_unico, request)
+    if entry is None:
+        dispositivo = DispositivoTV.objects.select_related('municipio').filter(
+            identificador_unico=identificador_unico, ativo=True,
+        ).first()
+        if dispositivo is None:
+            return None, None
+        entry = manifest.obter_manifesto(dispositivo, request)
+    return entry['versao'], entry['valido_ate']
+
+
+def registrar_presenca(identificador_unico):
+    """Conexão de push aberta conta como sinal de vida do app."""
+    from . import presenca
+    presenca.tocar(identificador_unico)
+
+
+async def aguardar_mudanca(identificador_unico, versao, request, timeout, estado=None):
+    """
+    Espera até `timeout` segundos a versão do manifesto deixar de ser `versao`.
+    Retorna a versão nova ('' se o dispositivo foi desativado) ou None no timeout.
+
+    A versão é lida na primeira chamada, quando chega um aviso para o
+    dispositivo e no valido_ate do manifesto. `estado` (dict) guarda isso
+    entre chamadas seguidas da mesma conexão (SSE).
+    """
+    loop = asyncio.get_running_loop()
+    limite = loop.time() + timeout
+    if estado is None:
+        estado = {}
+
+    while True:
+        agora = loop.time()
+        if _marca(identificador_unico) != estado.get('marca') or agora >= estado.get('proxima', agora):
+            estado['marca'] = _marca(identificador_unico)
+            atual, valido_ate = await sync_to_async(versao_atual)(identificador_unico, request)
+            if atual != versao:
+                return atual or ''
+            restante = (valido_ate - timezone.now()).total_seconds()
+            estado['proxima'] = loop.time() + max(restante, 1)
+        if agora >= limite:
+            return None
+        await asyncio.sleep(min(INTERVALO_LOCAL, limite - agora))
+
+
+async def long_poll(identificador_unico, versao, request, timeout):
+    """Corpo da resposta do long-poll: {'mudou': bool, 'versao_manifesto': ...}."""
+    try:
+        atual = await aguardar_mudanca(identificador_unico, versao, request, timeout)
+    finally:
+        liberar_conexao()
+    if atual is None:
+        return {'mudou': False, 'versao_manifesto': versao}
+    return {'mudou': True, 'versao_manifesto': atual or None}
+
+
+async def eventos(identificador_unico, versao, request, duracao):
+    """
+    Stream SSE: `event: manifesto` a cada nova versão, comentário de
+    heartbeat a cada HEARTBEAT_SEGUNDOS. Fecha após `duracao` segundos
+    (o EventSource reconecta sozinho) ou se o dispositivo for desativado.
+    """
+    loop = asyncio.get_running_loop()
+    fim = loop.time() + duracao
+    proxima_presenca = loop.time() + PRESENCA_SEGUNDOS
+    estado = {}
+    try:
+        yield 'retry: 5000\n\n'
+        while (restante := fim - loop.time()) > 0:
+            atual = await aguardar_mudanca(
+                identificador_unico, versao, request, min(HEARTBEAT_SEGUNDOS, restante), estado,
+            )
+            if loop.time() >= proxima_presenca:
+                await sync_to_async(registrar_presenca)(identificador_unico)
+                proxima_presenca = loop.time() + PRESENCA_SEGUNDOS
+            if atual is None:
+                yield ': ping\n\n'
+                continue
+            if not atual:
+                yield 'event: desativado\ndata: {}\n\n'
+                return
+            versao = atual
+            yield f'event: manifesto\ndata: {json.dumps({"versao_manifesto": versao})}\n\n'
+    finally:
+        liberar_conexao()
+
+
+def eventos_sincronos(*args):
+    """
+    eventos() para servidores WSGI (gunicorn gthread): o Django consumiria um
+    iterador assíncrono inteiro antes de enviar — aqui um event loop próprio
+    da thread produz cada evento e ele é enviado assim que fica pronto.
+    """
+    loop = asyncio.new_event_loop()
+    agen = eventos(*args)
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(anext(agen))
+            except StopAsyncIteration:
+                return
+    finally:
+        loop.run_until_complete(agen.aclose())
+        loop.close()
@@ -253,89 +253,92 @@ class PlaylistTVSerializer(serializers.ModelSerializer):
         return url
 
     def get_videos(self, obj):
-        from django.urls import reverse
-
         items = obj.items.filter(ativo=True).select_related('video', 'conteudo_corporativo').order_by('ordem')
+        dispositivo_id = self.context.get('dispositivo_id')
         result = []
-
         for item in items:
-            # ── Conteúdo corporativo → HTML via WebView ──
-            if item.conteudo_corporativo:
-                cc = item.conteudo_corporativo
-                if not cc.ativo:
-                    continue
-
-                # DESIGN type → renders via Fabric.js static canvas
-                if cc.tipo == 'DESIGN':
-                    html_path = reverse('design_render_tv', kwargs={'pk': cc.id})
-                else:
-                    html_path = reverse('tv-corporativo-html', kwargs={
-                        'tipo': cc.tipo.lower(),
-                        'playlist_id': obj.id,
-                    })
-                html_url = self._build_url(html_path)
-                # Append conteudo_id + dispositivo_id so the view resolves the exact CC
-                sep = '&' if '?' in html_url else '?'
-                html_url = f'{html_url}{sep}conteudo_id={cc.id}'
-                dispositivo_id = self.context.get('dispositivo_id')
-                if dispositivo_id:
-                    html_url = f'{html_url}&dispositivo_id={dispositivo_id}'
-
-                for _ in range(item.repeticoes):
-                    result.append({
-                        'id': 900000 + cc.id,
-                        'titulo': cc.titulo,
-                        'tipo': 'corporativo',
-                        'subtipo': cc.tipo,
-                        'duracao_segundos': cc.duracao_segundos,
-                        'ativo': True,
-                        'texto_tarja': None,
-                        'qrcode': None,
-                        'arquivo_url': html_url,
-                    })
-                continue
-
-            # ── Vídeo normal ──
-            if not item.video:
-                continue
-            video = item.video
-            if (not video.arquivo and not video.url_externa) or not video.ativo:
-                continue
-            # Verificar visibilidade: APPROVED sempre, SCHEDULED se na janela de datas
-            if not video.esta_visivel_nas_tvs:
-                continue
-                
-            for _ in range(item.repeticoes):
-                if video.url_externa:
-                    arquivo_url = video.url_externa
-                else:
-                    arquivo_url = self._build_url(video.arquivo.url)
-                
-                video_data = {
-                    'id': video.id,
-                    'tipo': 'video',
-                    'titulo': video.titulo,
-                    'arquivo_url': arquivo_url,
-                    'duracao_segundos': video.duracao_segundos,
-                    'ativo': video.ativo,
-                    'texto_tarja': video.texto_tarja,
-                    'orientacao': video.orientacao,  # HORIZONTAL | VERTICAL
-                }
-                
-                if video.qrcode_url_destino:
-                    tracking_url = self._build_url(f'/r/{video.qrcode_tracking_code}/')
-                    video_data['qrcode'] = {
-                        'tracking_url': tracking_url,
-                        'descricao': video.qrcode_descricao or '',
-                    }
-                else:
-                    video_data['qrcode'] = None
-                
-                result.append(video_data)
-
+            result.extend(serializar_item_tv(item, self._build_url, obj.id, dispositivo_id))
         return result
 
 
+def serializar_item_tv(item, build_url, playlist_id, dispositivo_id=None, now=None):
+    """
+    Converte um PlaylistItem nos dicts enviados ao app de TV (um por repetição).
+    Retorna [] se o item não deve aparecer (inativo, sem arquivo, fora da janela).
+
+    build_url: função path -> URL absoluta (HTTPS em produção).
+    """
+    from django.urls import reverse
+
+    # ── Conteúdo corporativo → HTML via WebView ──
+    if item.conteudo_corporativo_id:
+        cc = item.conteudo_corporativo
+        if not cc.ativo:
+            return []
+
+        # DESIGN type → renders via Fabric.js static canvas
+        if cc.tipo == 'DESIGN':
+            html_path = reverse('design_render_tv', kwargs={'pk': cc.id})
+        else:
+            html_path = reverse('tv-corporativo-html', kwargs={
+                'tipo': cc.tipo.lower(),
+                'playlist_id': playlist_id,
+            })
+        html_url = build_url(html_path)
+        # Append conteudo_id + dispositivo_id so the view resolves the exact CC
+        sep = '&' if '?' in html_url else '?'
+        html_url = f'{html_url}{sep}conteudo_id={cc.id}'
+        if dispositivo_id:
+            html_url = f'{html_url}&dispositivo_id={dispositivo_id}'
+
+        return [{
+            'id': 900000 + cc.id,
+            'titulo': cc.titulo,
+            'tipo': 'corporativo',
+            'subtipo': cc.tipo,
+            'duracao_segundos': cc.duracao_segundos,
+            'ativo': True,
+            'texto_tarja': None,
+            'qrcode': None,
+            'arquivo_url': html_url,
+        } for _ in range(item.repeticoes)]
+
+    # ── Vídeo normal ──
+    if not item.video_id:
+        return []
+    video = item.video
+    if (not video.arquivo and not video.url_externa) or not video.ativo:
+        return []
+    # Verificar visibilidade: APPROVED sempre, SCHEDULED se na janela de datas
+    if not video.esta_visivel_em(now):
+        return []
+
+    if video.url_externa:
+        arquivo_url = video.url_externa
+    else:
+        arquivo_url = build_url(video.arquivo.url)
+
+    if video.qrcode_url_destino:
+        qrcode = {
+            'tracking_url': build_url(f'/r/{video.qrcode_tracking_code}/'),
+            'descricao': video.qrcode_descricao or '',
+        }
+    else:
+        qrcode = None
+
+    return [{
+        'id': video.id,
+        'tipo': 'video',
+        'titulo': video.titulo,
+        'arquivo_url': arquivo_url,
+        'duracao_segundos': video.duracao_segundos,
+        'ativo': video.ativo,
+        'texto_tarja': video.texto_tarja,
+        'orientacao': video.orientacao,  # HORIZONTAL | VERTICAL
+        'qrcode': dict(qrcode) if qrcode else None,
+    } for _ in range(item.repeticoes)]
+
+
 class DispositivoTVAuthSerializer(serializers.Serializer):
     """Serializer para autenticação de dispositivos TV"""
     identificador_unico = serializers.CharField(max_length=100)
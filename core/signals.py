@@ -0,0 +1,157 @@
+"""
+Receivers de sinais do app core.
+
+Mantêm o manifesto pré-compilado das TVs (core/manifest.py) e a timeline
+semanal (core/timeline.py) coerentes com o banco: alteração de conteúdo
+troca o token das playlists afetadas e descarta só o que é das TVs que as
+exibem; alterações de município, agendamento, horário ou do próprio
+dispositivo descartam apenas o que é daquelas TVs.
+
+Também marcam como desatualizados os snapshots de métricas dos clientes
+afetados (core/metricas.py), recalculados em segundo plano, e descartam os
+cabeçalhos do dashboard do proprietário dos franqueados afetados
+(core/painel.py).
+"""
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import manifest, metricas, painel, timeline
+from .models import (
+    User, Cliente, Municipio, Video, Playlist, PlaylistItem, ConteudoCorporativo,
+    DispositivoTV, AgendamentoExibicao, HorarioFuncionamento,
+)
+
+# Campos gravados pelos endpoints de presença da TV — não alteram o manifesto
+CAMPOS_PRESENCA = {'ultima_sincronizacao', 'versao_app', 'alerta_desconexao_enviado'}
+
+
+@receiver(post_save, sender=Municipio)
+@receiver(post_delete, sender=Municipio)
+def invalidar_manifestos_municipio(sender, instance, **kwargs):
+    # O nome do município vai no manifesto de cada TV dele
+    manifest.invalidar_dispositivos(
+        DispositivoTV.objects.filter(municipio_id=instance.pk).values_list('identificador_unico', flat=True)
+    )
+    metricas.marcar()
+
+
+@receiver(pre_delete, sender=Playlist)
+def guardar_dispositivos_playlist(sender, instance, **kwargs):
+    # Depois da exclusão os agendamentos (CASCADE) já não apontam para ela
+    instance._dispositivos = manifest.dispositivos_das_playlists([instance.pk])
+
+
+@receiver(post_save, sender=Playlist)
+@receiver(post_delete, sender=Playlist)
+def invalidar_manifestos_playlist(sender, instance, **kwargs):
+    afetados = manifest.invalidar_playlists([instance.pk], getattr(instance, '_dispositivos', None))
+    # Playlist ativada/desativada muda os agendamentos elegíveis dessas TVs
+    timeline.invalidar_timelines([pk for pk, _ in afetados])
+    manifest.invalidar_agendas([identificador for _, identificador in afetados])
+    metricas.marcar(playlist_ids=[instance.pk])
+
+
+@receiver(post_save, sender=PlaylistItem)
+@receiver(post_delete, sender=PlaylistItem)
+def invalidar_manifestos_item(sender, instance, **kwargs):
+    manifest.invalidar_playlists([instance.playlist_id])
+    metricas.marcar(
+        playlist_ids=[instance.playlist_id],
+        cliente_ids=Video.objects.filter(pk=instance.video_id).values_list('cliente_id', flat=True),
+    )
+
+
+@receiver(post_save, sender=Video)
+@receiver(post_delete, sender=Video)
+def invalidar_manifestos_video(sender, instance, **kwargs):
+    manifest.invalidar_video(video_id=instance.pk)
+    metricas.marcar(
+        playlist_ids=PlaylistItem.objects.filter(video_id=instance.pk).values_list('playlist_id', flat=True),
+        cliente_ids=[instance.cliente_id],
+    )
+
+
+@receiver(post_save, sender=ConteudoCorporativo)
+@receiver(post_delete, sender=ConteudoCorporativo)
+def invalidar_manifestos_corporativo(sender, instance, **kwargs):
+    manifest.invalidar_video(conteudo_corporativo_id=instance.pk)
+
+
+@receiver(post_save, sender=DispositivoTV)
+@receiver(post_delete, sender=DispositivoTV)
+def invalidar_manifesto_dispositivo(sender, instance, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= CAMPOS_PRESENCA:
+        return
+    manifest.invalidar_dispositivo(instance.identificador_unico)
+    manifest.invalidar_agenda(instance.identificador_unico)
+    timeline.invalidar_timeline(instance.pk)
+    # A playlist anterior não é conhecida aqui: marca todos (edição de TV é rara)
+    metricas.marcar()
+
+
+def _identificador(dispositivo_id):
+    return DispositivoTV.objects.filter(
+        pk=dispositivo_id
+    ).values_list('identificador_unico', flat=True).first()
+
+
+@receiver(post_save, sender=AgendamentoExibicao)
+@receiver(post_delete, sender=AgendamentoExibicao)
+def invalidar_manifesto_agendamento(sender, instance, **kwargs):
+    identificador = _identificador(instance.dispositivo_id)
+    manifest.invalidar_dispositivo(identificador)
+    manifest.invalidar_agenda(identificador)
+    timeline.invalidar_timeline(instance.dispositivo_id)
+    # Horas de exibição do dispositivo contam para os clientes da playlist atual dele
+    metricas.marcar(playlist_ids=DispositivoTV.objects.filter(
+        pk=instance.dispositivo_id,
+    ).values_list('playlist_atual_id', flat=True))
+
+
+@receiver(post_save, sender=HorarioFuncionamento)
+@receiver(post_delete, sender=HorarioFuncionamento)
+def invalidar_timeline_horario(sender, instance, **kwargs):
+    manifest.invalidar_agenda(_identificador(instance.dispositivo_id))
+    timeline.invalidar_timeline(instance.dispositivo_id)
+
+
+# ─── Dashboard do proprietário ───────────────────────────────────────────────
+
+def _alteracao_relevante(instance, update_fields):
+    if not update_fields:
+        return True
+    if isinstance(instance, DispositivoTV):
+        return not set(update_fields) <= CAMPOS_PRESENCA
+    if isinstance(instance, User):
+        return not set(update_fields) <= {'last_login'}
+    return True
+
+
+def painel_antes_de_salvar(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Franqueados que exibiam o objeto antes da alteração (troca de franqueado/município)
+    if raw or instance.pk is None or not _alteracao_relevante(instance, update_fields):
+        return
+    antigo = sender.objects.filter(pk=instance.pk).first()
+    instance._painel_franqueados = painel.franqueados_de(antigo) if antigo else set()
+
+
+# Modelos cuja criação/exclusão muda os totais ou a lista de franqueados
+_TOTAIS_PAINEL = (User, Municipio, Cliente, DispositivoTV)
+
+
+def painel_salvo(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+    if raw or not _alteracao_relevante(instance, update_fields):
+        return
+    afetados = painel.franqueados_de(instance) | getattr(instance, '_painel_franqueados', set())
+    # Usuário pode ter mudado de papel (entra/sai da lista de franqueados)
+    painel.invalidar(afetados, geral=sender is User or (created and sender in _TOTAIS_PAINEL))
+
+
+def painel_removido(sender, instance, **kwargs):
+    painel.invalidar(painel.franqueados_de(instance), geral=sender in _TOTAIS_PAINEL)
+
+
+for _modelo in (User, Municipio, Cliente, Playlist, DispositivoTV):
+    pre_save.connect(painel_antes_de_salvar, sender=_modelo, dispatch_uid=f'painel_pre_{_modelo.__name__}')
+    post_save.connect(painel_salvo, sender=_modelo, dispatch_uid=f'painel_post_{_modelo.__name__}')
+    post_delete.connect(painel_removido, sender=_modelo, dispatch_uid=f'painel_del_{_modelo.__name__}')
@@ -0,0 +1,102 @@
+"""
+Single-flight: requisições simultâneas pela mesma compilação esperam uma
+única execução em andamento em vez de repetirem o trabalho.
+
+Depois de um deploy ou do liga-geral das 8h, centenas de TVs chamam
+/api/tv/auth/ ao mesmo tempo e todas encontram o cache vazio. Com
+executar():
+
+- dentro do processo, a primeira thread compila e as demais esperam o
+  resultado dela (threading.Event);
+- entre processos (workers/réplicas), quem compila segura uma trava no
+  cache compartilhado (cache.add — atômico no DatabaseCache; alias 'estado',
+  que não sofre cull); os outros
+  processos esperam o resultado aparecer no cache via `ler_cache`.
+
+Se quem compila falhar ou demorar mais que o timeout, quem espera compila
+por conta própria — nunca fica pior do que sem a coalescência.
+"""
+import logging
+import threading
+import time
+
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+LOCK_PREFIX = 'singleflight:'
+TIMEOUT = 30
+INTERVALO = 0.05
+
+
+class _Chamada:
+    __slots__ = ('evento', 'resultado', 'ok')
+
+    def __init__(self):
+        self.evento = threading.Event()
+        self.resultado = None
+        self.ok = False
+
+
+_lock = threading.Lock()
+_em_andamento = {}
+
+
+def _aguardar_outro_processo(chave, ler_cache, timeout):
+    """Espera a compilação de outro processo aparecer no cache; None se não aparecer."""
+    limite = time.monotonic() + timeout
+    intervalo = INTERVALO
+    while time.monotonic() < limite:
+        time.sleep(intervalo)
+        resultado = ler_cache()
+        if resultado is not None:
+            return resultado
+        if caches['estado'].get(f'{LOCK_PREFIX}{chave}') is None:
+            # Trava liberada sem resultado (falhou): uma última leitura e desiste
+            return ler_cache()
+        intervalo = min(intervalo * 2, 0.5)
+    return None
+
+
+def _compilar(chave, fn, ler_cache, timeout):
+    lock_key = f'{LOCK_PREFIX}{chave}'
+    if ler_cache is not None and not caches['estado'].add(lock_key, 1, timeout):
+        resultado = _aguardar_outro_processo(chave, ler_cache, timeout)
+        if resultado is not None:
+            return resultado
+        logger.info('singleflight: %s sem resultado do outro processo, compilando', chave)
+        return fn()
+    try:
+        return fn()
+    finally:
+        if ler_cache is not None:
+            caches['estado'].delete(lock_key)
+
+
+def executar(chave, fn, ler_cache=None, timeout=TIMEOUT):
+    """
+    Executa fn() uma única vez por chave entre as chamadas simultâneas.
+
+    chave: identifica a compilação (ex: 'classe:<assinatura>:<host>').
+    ler_cache: função que devolve o resultado já guardado no cache
+    compartilhado, ou None — habilita a coalescência entre processos.
+    """
+    with _lock:
+        chamada = _em_andamento.get(chave)
+        lider = chamada is None
+        if lider:
+            chamada = _em_andamento[chave] = _Chamada()
+
+    if not lider:
+        if chamada.evento.wait(timeout) and chamada.ok:
+            return chamada.resultado
+        return fn()
+
+    try:
+        chamada.resultado = _compilar(chave, fn, ler_cache, timeout)
+        chamada.ok = True
+        return chamada.resultado
+    finally:
+        with _lock:
+            _em_andamento.pop(chave, None)
+        chamada.evento.set()
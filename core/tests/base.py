@@ -0,0 +1,72 @@
+"""
+Base dos testes do app core: cache local em memória (o DatabaseCache exigiria
+createcachetable no banco de teste) e fábricas mínimas de dados.
+"""
+import uuid
+from unittest import mock
+
+from django.core.cache import cache, caches
+from django.test import RequestFactory, TestCase, override_settings
+
+CACHE_LOCAL = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'testes'},
+    'estado': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'testes-estado'},
+}
+
+
+@override_settings(CACHES=CACHE_LOCAL, ALLOWED_HOSTS=['testserver'])
+class TesteCore(TestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        caches['estado'].clear()
+        # Sem a thread de gravação da presença: ela sobreviveria ao banco de teste
+        iniciar = mock.patch('core.presenca._iniciar')
+        iniciar.start()
+        self.addCleanup(iniciar.stop)
+        self.request = RequestFactory().post('/api/tv/auth/')
+
+
+def criar_franqueado(username='franqueado'):
+    from core.models import User
+    return User.objects.create_user(username=username, password='x', role='FRANCHISEE')
+
+
+def criar_municipio(franqueado, nome='Cidade'):
+    from core.models import Municipio
+    return Municipio.objects.create(nome=nome, estado='SP', franqueado=franqueado)
+
+
+def criar_cliente(franqueado, municipio, username='cliente'):
+    from core.models import Cliente, Segmento, User
+
+    user = User.objects.create_user(username=username, password='x', role='CLIENT')
+    segmento, _ = Segmento.objects.get_or_create(nome='Varejo')
+    cliente = Cliente.objects.create(user=user, empresa=username, segmento=segmento, franqueado=franqueado)
+    cliente.municipios.add(municipio)
+    return cliente
+
+
+def criar_playlist(municipio, cliente, nome, quantidade, duracao=30):
+    """Playlist com `quantidade` vídeos aprovados (URL externa) de `duracao` segundos."""
+    from core.models import Playlist, PlaylistItem, Video
+
+    playlist = Playlist.objects.create(nome=nome, municipio=municipio, franqueado=municipio.franqueado)
+    for ordem in range(quantidade):
+        video = Video.objects.create(
+            cliente=cliente, titulo=f'{nome}-{ordem}', url_externa=f'https://cdn.exemplo/{nome}-{ordem}.mp4',
+            duracao_segundos=duracao, status='APPROVED',
+        )
+        PlaylistItem.objects.create(playlist=playlist, video=video, ordem=ordem)
+    return playlist
+
+
+def criar_dispositivo(municipio, nome='TV'):
+    from core.models import DispositivoTV
+    return DispositivoTV.objects.create(nome=nome, identificador_unico=str(uuid.uuid4()), municipio=municipio)
+
+
+def agendar(dispositivo, playlist, percentual=100):
+    from core.models import AgendamentoExibicao
+    return AgendamentoExibicao.objects.create(dispositivo=dispositivo, playlist=playlist, percentual=percentual)
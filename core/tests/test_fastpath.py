@@ -0,0 +1,70 @@
+import io
+import json
+
+from django.test import override_settings
+
+from core.fastpath import TVFastPath
+
+from .base import TesteCore, criar_dispositivo, criar_franqueado, criar_municipio
+
+
+def _environ(path, corpo, **extra):
+    dados = json.dumps(corpo).encode()
+    environ = {
+        'REQUEST_METHOD': 'POST', 'PATH_INFO': path, 'SCRIPT_NAME': '', 'QUERY_STRING': '',
+        'SERVER_NAME': 'testserver', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': 'testserver', 'CONTENT_TYPE': 'application/json', 'CONTENT_LENGTH': str(len(dados)),
+        'wsgi.url_scheme': 'http', 'wsgi.input': io.BytesIO(dados), 'wsgi.errors': io.StringIO(),
+    }
+    environ.update(extra)
+    return environ
+
+
+@override_settings(
+    SECURE_CONTENT_TYPE_NOSNIFF=True, SECURE_HSTS_SECONDS=3600, X_FRAME_OPTIONS='DENY',
+    SECURE_PROXY_SSL_HEADER=('HTTP_X_FORWARDED_PROTO', 'https'),
+)
+class FastPathSegurancaTests(TesteCore):
+
+    def setUp(self):
+        super().setUp()
+        self.dispositivo = criar_dispositivo(criar_municipio(criar_franqueado()))
+        self.repassadas = []
+        self.app = TVFastPath(self._django)
+
+    def _django(self, environ, start_response):
+        self.repassadas.append(environ['PATH_INFO'])
+        start_response('418 Pilha Django', [])
+        return [b'']
+
+    def _chamar(self, **extra):
+        resposta = {}
+
+        def start_response(status, headers):
+            resposta['status'] = status
+            resposta['headers'] = dict(headers)
+
+        environ = _environ('/api/tv/heartbeat/', {'identificador_unico': self.dispositivo.identificador_unico}, **extra)
+        b''.join(self.app(environ, start_response))
+        return resposta['status'], resposta['headers']
+
+    def test_headers_de_seguranca(self):
+        status, headers = self._chamar(HTTP_X_FORWARDED_PROTO='https')
+        self.assertTrue(status.startswith('200'))
+        self.assertEqual(self.repassadas, [])
+        self.assertEqual(headers['X-Content-Type-Options'], 'nosniff')
+        self.assertEqual(headers['X-Frame-Options'], 'DENY')
+        self.assertEqual(headers['Strict-Transport-Security'], 'max-age=3600')
+        self.assertIn('Referrer-Policy', headers)
+
+    def test_host_nao_permitido_vai_para_o_django(self):
+        status, _ = self._chamar(HTTP_HOST='atacante.example')
+        self.assertTrue(status.startswith('418'))
+
+    @override_settings(SECURE_SSL_REDIRECT=True)
+    def test_redirecionamento_https_vai_para_o_django(self):
+        self.app = TVFastPath(self._django)
+        status, _ = self._chamar()
+        self.assertTrue(status.startswith('418'))
+        status, _ = self._chamar(HTTP_X_FORWARDED_PROTO='https')
+        self.assertTrue(status.startswith('200'))
@@ -0,0 +1,152 @@
+import gzip
+import io
+import json
+from unittest import mock
+
+from django.db import OperationalError
+from django.test import override_settings
+
+from core import logs
+
+from .base import TesteCore, criar_cliente, criar_dispositivo, criar_franqueado, criar_municipio, criar_playlist
+
+
+class _ComVideo(TesteCore):
+
+    def setUp(self):
+        super().setUp()
+        franqueado = criar_franqueado()
+        municipio = criar_municipio(franqueado)
+        self.playlist = criar_playlist(municipio, criar_cliente(franqueado, municipio), 'a', 1)
+        self.video = self.playlist.items.get().video
+        self.dispositivo = criar_dispositivo(municipio)
+
+    def _evento(self, evento_id, fim='2026-10-17T10:00:30-03:00', **extra):
+        return {
+            'tipo': 'video', 'evento_id': evento_id, 'video_id': self.video.id,
+            'tempo_exibicao_segundos': 30, 'playlist_id': self.playlist.id, 'data_hora_fim': fim, **extra,
+        }
+
+    def _backlog(self, linhas, comprimido=False):
+        corpo = b''.join(linha if isinstance(linha, bytes) else json.dumps(linha).encode() + b'\n' for linha in linhas)
+        if comprimido:
+            corpo = gzip.compress(corpo)
+        with self.assertLogs('core.logs', 'INFO'):
+            return logs.registrar_backlog(self.dispositivo.id, io.BytesIO(corpo), comprimido=comprimido)
+
+    def _gravados(self):
+        from core.models import LogExibicao
+        return sorted(LogExibicao.objects.filter(dispositivo=self.dispositivo).values_list('evento_id', flat=True))
+
+
+@override_settings(TV_LOG_FLUSH_SECONDS=0)
+class EventoIdTests(_ComVideo):
+
+    def test_mesmo_evento_pelos_tres_caminhos(self):
+        evento = self._evento('e1')
+        resultado = logs.registrar_lote(self.dispositivo.id, [evento, evento])
+        self.assertEqual((resultado['criados']['video'], resultado['duplicados']), (1, 1))
+
+        logs.enfileirar(self.dispositivo.id, evento)  # buffer desligado: grava na hora
+        buffer = logs._Buffer()
+        buffer._pendentes = [(self.dispositivo.id, logs._normalizar(evento, logs.timezone.now()))]
+        buffer.esvaziar()
+
+        resultado = self._backlog([evento, self._evento('e2')])
+        self.assertEqual((resultado['criados']['video'], resultado['duplicados']), (1, 1))
+        self.assertEqual(self._gravados(), ['e1', 'e2'])
+
+    def test_reenvio_com_outro_horario(self):
+        logs.registrar_lote(self.dispositivo.id, [self._evento('e1')])
+        # O relógio da TV mudou entre o envio e o reenvio: a reserva do evento_id ainda vale
+        resultado = logs.registrar_lote(self.dispositivo.id, [self._evento('e1', fim='2026-10-17T10:05:00-03:00')])
+        self.assertEqual(resultado['duplicados'], 1)
+        self.assertEqual(self._gravados(), ['e1'])
+
+    def test_reenvio_depois_da_reserva_expirar(self):
+        from core.models import EventoRecebido
+
+        logs.registrar_lote(self.dispositivo.id, [self._evento('e1')])
+        EventoRecebido.objects.all().delete()
+        resultado = logs.registrar_lote(self.dispositivo.id, [self._evento('e1')])
+        self.assertEqual((resultado['criados']['video'], resultado['duplicados']), (0, 1))
+        self.assertEqual(self._gravados(), ['e1'])
+
+
+class BacklogNdjsonTests(_ComVideo):
+
+    def test_linhas_malformadas(self):
+        resultado = self._backlog([
+            self._evento('e1'),
+            b'{"tipo": "video", "video_id": \n',
+            b'\n',
+            b'[1, 2]\n',
+            self._evento('e2', tipo='audio'),
+            b'\xff\xfe\n',
+            b'{"tipo": "video", "evento_id": "' + b'x' * logs.BACKLOG_MAX_LINHA + b'"}\n',
+            self._evento('e3', video_id=None),
+            self._evento('e4'),
+        ])
+        self.assertEqual(resultado['linhas'], 9)
+        self.assertEqual(resultado['criados']['video'], 2)
+        self.assertEqual([r['indice'] for r in resultado['rejeitados']], [2, 4, 5, 6, 7, 8])
+        self.assertEqual(resultado['rejeitados'][4]['erro'], 'linha muito longa')
+        self.assertNotIn('erro', resultado)
+        self.assertEqual(self._gravados(), ['e1', 'e4'])
+
+    def test_sem_quebra_no_fim(self):
+        resultado = self._backlog([self._evento('e1'), json.dumps(self._evento('e2')).encode()])
+        self.assertEqual(resultado['criados']['video'], 2)
+
+    def test_gzip_truncado_grava_o_que_veio_antes(self):
+        corpo = gzip.compress(b''.join(json.dumps(self._evento(f'e{i}')).encode() + b'\n' for i in range(3)))
+        # Sem o trailer do gzip (upload interrompido no fim)
+        with self.assertLogs('core.logs', 'INFO'):
+            resultado = logs.registrar_backlog(self.dispositivo.id, io.BytesIO(corpo[:-8]), comprimido=True)
+        self.assertIn('erro', resultado)
+        self.assertEqual(self._gravados(), ['e0', 'e1', 'e2'])
+
+
+@override_settings(TV_LOG_FLUSH_ATTEMPTS=3)
+class BufferFalhaTests(TesteCore):
+
+    def setUp(self):
+        super().setUp()
+        self.buffer = logs._Buffer()
+        self.gravados = []
+
+    def _gravar_pendentes(self, itens):
+        if any(e.get('ruim') for _, e in itens):
+            raise ValueError('evento ruim')
+        self.gravados.extend(d for d, _ in itens)
+
+    def _encher(self, ruins=(3,)):
+        self.buffer._pendentes = [(i, {'tipo': 'video', 'ruim': i in ruins}) for i in range(8)]
+
+    def test_evento_ruim_nao_trava_o_lote(self):
+        self._encher()
+        with mock.patch('core.logs.gravar_pendentes', side_effect=self._gravar_pendentes), \
+                self.assertLogs('core.logs', 'ERROR'):
+            self.buffer.esvaziar()
+        self.assertEqual(sorted(self.gravados), [0, 1, 2, 4, 5, 6, 7])
+        self.assertEqual([(d, e['tentativas']) for d, e in self.buffer._pendentes], [(3, 1)])
+
+    def test_descarta_apos_tentativas(self):
+        self._encher(ruins=(3, 6))
+        with mock.patch('core.logs.gravar_pendentes', side_effect=self._gravar_pendentes), \
+                self.assertLogs('core.logs', 'ERROR') as registro:
+            for _ in range(3):
+                self.buffer.esvaziar()
+        self.assertEqual(len(self.buffer), 0)
+        self.assertEqual(len(self.gravados), 6)
+        self.assertEqual(sum('descartado após 3 tentativas' in linha for linha in registro.output), 2)
+
+    def test_banco_fora_do_ar_devolve_sem_contar_tentativa(self):
+        self._encher(ruins=())
+        with mock.patch('core.logs.gravar_pendentes', side_effect=OperationalError('sem conexão')) as gravar, \
+                self.assertLogs('core.logs', 'ERROR'):
+            self.buffer.esvaziar()
+        # Sem dividir o lote: uma única tentativa
+        self.assertEqual(gravar.call_count, 1)
+        self.assertEqual(len(self.buffer), 8)
+        self.assertFalse(any('tentativas' in e for _, e in self.buffer._pendentes))
@@ -0,0 +1,133 @@
+from django.core.cache import cache, caches
+from django.test import override_settings
+
+from core import manifest
+
+from .base import TesteCore, agendar, criar_cliente, criar_dispositivo, criar_franqueado, criar_municipio, criar_playlist
+
+
+@override_settings(TV_PUSH_URL='')
+class ManifestoETagTests(TesteCore):
+
+    def setUp(self):
+        super().setUp()
+        franqueado = criar_franqueado()
+        self.municipio = criar_municipio(franqueado)
+        cliente = criar_cliente(franqueado, self.municipio)
+        self.playlist_a = criar_playlist(self.municipio, cliente, 'a', 3)
+        self.playlist_b = criar_playlist(self.municipio, cliente, 'b', 2)
+        self.tv_a = criar_dispositivo(self.municipio, 'TV A')
+        self.tv_b = criar_dispositivo(self.municipio, 'TV B')
+        agendar(self.tv_a, self.playlist_a)
+        agendar(self.tv_b, self.playlist_b)
+
+    def _auth(self, dispositivo, etag=None):
+        extra = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.post(
+            '/api/tv/auth/', {'identificador_unico': dispositivo.identificador_unico},
+            content_type='application/json', **extra,
+        )
+
+    def _etags(self):
+        etags = {}
+        for tv in (self.tv_a, self.tv_b):
+            response = self._auth(tv)
+            self.assertEqual(response.status_code, 200)
+            etags[tv.pk] = response['ETag']
+            self.assertEqual(self._auth(tv, response['ETag']).status_code, 304)
+        return etags
+
+    def test_304_sem_consultar_tabelas_do_app(self):
+        etag = self._etags()[self.tv_a.pk]
+        # Só a presença em memória e o cache (locmem nos testes): nenhuma consulta SQL
+        with self.assertNumQueries(0):
+            self.assertEqual(self._auth(self.tv_a, etag).status_code, 304)
+
+    def test_alterar_video_invalida_so_quem_exibe(self):
+        etags = self._etags()
+        video = self.playlist_a.items.first().video
+        video.titulo = 'novo título'
+        video.save()
+
+        self.assertEqual(self._auth(self.tv_a, etags[self.tv_a.pk]).status_code, 200)
+        self.assertEqual(self._auth(self.tv_b, etags[self.tv_b.pk]).status_code, 304)
+
+    def test_item_novo_muda_etag(self):
+        etags = self._etags()
+        item = self.playlist_b.items.first()
+        item.pk = None
+        item.ordem = 99
+        item.save()
+
+        response = self._auth(self.tv_b, etags[self.tv_b.pk])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etags[self.tv_b.pk])
+        self.assertEqual(self._auth(self.tv_a, etags[self.tv_a.pk]).status_code, 304)
+
+    def test_desativar_playlist_invalida_agendados(self):
+        etags = self._etags()
+        self.playlist_a.ativa = False
+        self.playlist_a.save()
+
+        response = self._auth(self.tv_a, etags[self.tv_a.pk])
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.json()['playlist'])
+        self.assertEqual(self._auth(self.tv_b, etags[self.tv_b.pk]).status_code, 304)
+
+    def test_municipio_renomeado_invalida_suas_tvs(self):
+        etags = self._etags()
+        self.municipio.nome = 'Outra Cidade'
+        self.municipio.save()
+
+        for tv in (self.tv_a, self.tv_b):
+            response = self._auth(tv, etags[tv.pk])
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('Outra Cidade', response.json()['municipio'])
+
+    def test_invalidar_tudo(self):
+        etags = self._etags()
+        manifest.invalidar_tudo()
+        # Mesmo conteúdo: recompila, mas a versão (ETag) não muda
+        self.assertIsNone(manifest.manifesto_em_cache(self.tv_a.identificador_unico, self._request()))
+        self.assertEqual(self._auth(self.tv_a, etags[self.tv_a.pk]).status_code, 304)
+
+    def _request(self):
+        from django.test import RequestFactory
+        return RequestFactory().post('/api/tv/auth/')
+
+
+# Tabelas criadas pelo createcachetable do banco de teste (settings.CACHES)
+CACHE_BANCO = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'django_cache',
+        'OPTIONS': {'MAX_ENTRIES': 5, 'CULL_FREQUENCY': 1},
+    },
+    'estado': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'django_cache_estado',
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': 10 ** 9},
+    },
+}
+
+
+@override_settings(CACHES=CACHE_BANCO)
+class ManifestoDatabaseCacheTests(ManifestoETagTests):
+    """Mesmos cenários com o DatabaseCache de produção (sem Redis)."""
+
+    def test_304_sem_consultar_tabelas_do_app(self):
+        etag = self._etags()[self.tv_a.pk]
+        # Entrada da TV (django_cache) + geração/tokens (django_cache_estado)
+        with self.assertNumQueries(2):
+            self.assertEqual(self._auth(self.tv_a, etag).status_code, 304)
+
+    def test_cull_nao_apaga_geracao_nem_tokens(self):
+        etags = self._etags()
+        gen = caches['estado'].get(manifest.GEN_KEY)
+        for i in range(20):
+            cache.set(f'teste:cull:{i}', i)
+        # CULL_FREQUENCY=1 esvazia o 'default' a cada cull; o 'estado' fica intacto
+        self.assertEqual(caches['estado'].get(manifest.GEN_KEY), gen)
+        self.assertEqual(self._auth(self.tv_a, etags[self.tv_a.pk]).status_code, 304)
+        self.assertEqual(self._auth(self.tv_b, etags[self.tv_b.pk]).status_code, 304)
@@ -0,0 +1,114 @@
+import threading
+from unittest import mock
+
+from django.core.cache import caches
+
+from core import singleflight
+
+from .base import TesteCore
+
+
+class SingleFlightTests(TesteCore):
+
+    def _em_thread(self, fn):
+        """Roda fn numa thread; devolve (thread, resultado {'valor'|'erro'})."""
+        resultado = {}
+
+        def alvo():
+            try:
+                resultado['valor'] = fn()
+            except Exception as e:
+                resultado['erro'] = e
+
+        thread = threading.Thread(target=alvo)
+        thread.start()
+        return thread, resultado
+
+    def _lider_bloqueado(self, chave, falha=None):
+        """Líder que só termina quando `liberar` é setado (levantando `falha`, se houver)."""
+        comecou, liberar = threading.Event(), threading.Event()
+
+        def compilar():
+            comecou.set()
+            liberar.wait(5)
+            if falha:
+                raise falha
+            return 'lider'
+
+        thread, resultado = self._em_thread(lambda: singleflight.executar(chave, compilar))
+        self.assertTrue(comecou.wait(5))
+        return thread, resultado, liberar
+
+    def _seguidor(self, chave, fn):
+        """Chama executar() numa thread e só retorna quando ela já espera o líder."""
+        chamada = singleflight._em_andamento[chave]
+        evento, esperando = chamada.evento, threading.Event()
+
+        class Evento:
+            def wait(self, timeout):
+                esperando.set()
+                return evento.wait(timeout)
+
+            def set(self):
+                evento.set()
+
+        chamada.evento = Evento()
+        thread, resultado = self._em_thread(lambda: singleflight.executar(chave, fn))
+        self.assertTrue(esperando.wait(5))
+        return thread, resultado
+
+    def test_seguidores_recebem_o_resultado_do_lider(self):
+        thread, resultado, liberar = self._lider_bloqueado('k')
+        seguidor, obtido = self._seguidor('k', lambda: 'seguidor')
+        liberar.set()
+        thread.join(5)
+        seguidor.join(5)
+        self.assertEqual(resultado, {'valor': 'lider'})
+        self.assertEqual(obtido, {'valor': 'lider'})
+
+    def test_falha_do_lider_faz_o_seguidor_compilar(self):
+        thread, resultado, liberar = self._lider_bloqueado('k', falha=RuntimeError('falhou'))
+        seguidor, obtido = self._seguidor('k', lambda: 'seguidor')
+        liberar.set()
+        thread.join(5)
+        seguidor.join(5)
+        self.assertIsInstance(resultado['erro'], RuntimeError)
+        self.assertEqual(obtido, {'valor': 'seguidor'})
+        # A chave foi liberada: a próxima chamada é líder de novo
+        self.assertEqual(singleflight.executar('k', lambda: 'nova'), 'nova')
+
+    def test_timeout_do_lider_faz_o_seguidor_compilar(self):
+        thread, resultado, liberar = self._lider_bloqueado('k')
+        try:
+            self.assertEqual(singleflight.executar('k', lambda: 'seguidor', timeout=0.1), 'seguidor')
+        finally:
+            liberar.set()
+            thread.join(5)
+        self.assertEqual(resultado, {'valor': 'lider'})
+
+    def test_outro_processo_falha_e_libera_a_trava(self):
+        estado = caches['estado']
+        estado.add(f'{singleflight.LOCK_PREFIX}k', 1, 30)
+        leituras = []
+
+        def ler_cache():
+            leituras.append(1)
+            if len(leituras) == 2:
+                estado.delete(f'{singleflight.LOCK_PREFIX}k')  # o outro processo desistiu sem resultado
+            return None
+
+        with self.assertLogs('core.singleflight', 'INFO'):
+            self.assertEqual(singleflight.executar('k', lambda: 'proprio', ler_cache), 'proprio')
+        self.assertGreaterEqual(len(leituras), 2)
+
+    def test_outro_processo_entrega_no_cache(self):
+        caches['estado'].add(f'{singleflight.LOCK_PREFIX}k', 1, 30)
+        respostas = iter([None, 'do outro'])
+        compilar = mock.Mock(return_value='proprio')
+        self.assertEqual(singleflight.executar('k', compilar, lambda: next(respostas)), 'do outro')
+        compilar.assert_not_called()
+
+    def test_timeout_do_outro_processo(self):
+        caches['estado'].add(f'{singleflight.LOCK_PREFIX}k', 1, 30)
+        with self.assertLogs('core.singleflight', 'INFO'):
+            self.assertEqual(singleflight.executar('k', lambda: 'proprio', lambda: None, timeout=0.2), 'proprio')
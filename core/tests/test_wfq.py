@@ -0,0 +1,93 @@
+from collections import Counter
+from datetime import datetime
+
+from django.test import SimpleTestCase
+
+from core.wfq import distribuir, janela, sequencia
+
+from .base import TesteCore, agendar, criar_cliente, criar_dispositivo, criar_franqueado, criar_municipio, criar_playlist
+
+
+def _itens(prefixo, quantidade, duracao=30):
+    return [{'id': f'{prefixo}{i}', 'duracao_segundos': duracao} for i in range(quantidade)]
+
+
+class SequenciaTests(SimpleTestCase):
+
+    def test_fatia_de_tempo_proxima_do_peso(self):
+        fluxos = [(_itens('a', 7, 15), 50), (_itens('b', 3, 40), 30), (_itens('c', 11, 20), 20)]
+        tempo = Counter()
+        for n, (i, item) in enumerate(sequencia(fluxos), 1):
+            tempo[i] += item['duracao_segundos']
+            if n == 5000:
+                break
+        total = sum(tempo.values())
+        for i, alvo in enumerate((0.5, 0.3, 0.2)):
+            self.assertAlmostEqual(tempo[i] / total, alvo, delta=0.01)
+
+    def test_inicio_desloca_cada_fluxo(self):
+        fluxos = [(_itens('a', 5), 50), (_itens('b', 5), 50)]
+        primeiros = [item['id'] for _, (_, item) in zip(range(4), sequencia(fluxos, [2, 4]))]
+        self.assertEqual(primeiros, ['a2', 'b4', 'a3', 'b0'])
+
+
+class JanelaTests(SimpleTestCase):
+
+    def test_volta_completa_nao_e_janela(self):
+        fila, proximas = janela([(_itens('a', 3), 30), (_itens('b', 1), 70)])
+        self.assertIsNone(proximas)
+        self.assertEqual({item['id'] for item in fila}, {'a0', 'a1', 'a2', 'b0'})
+
+    def test_playlist_longa_gira_entre_janelas(self):
+        # 100 itens a 10% contra 1 item a 90%: nenhuma volta completa cabe em 200 slots
+        fluxos = [(_itens('a', 100), 10), (_itens('b', 1), 90)]
+        vistos, posicoes = [], None
+        for _ in range(5):
+            fila, posicoes = janela(fluxos, 200, posicoes)
+            self.assertEqual(len(fila), 200)
+            self.assertEqual(sum(item['id'] == 'b0' for item in fila), 180)
+            vistos.extend(item['id'] for item in fila if item['id'] != 'b0')
+        # Sequência contínua: cada janela começa onde a anterior parou
+        self.assertEqual(vistos, [f'a{i}' for i in range(100)])
+        self.assertEqual(posicoes, [0, 0])
+
+    def test_distribuir_corta_no_limite(self):
+        fila = distribuir([(_itens('a', 100), 10), (_itens('b', 1), 90)], 200)
+        self.assertEqual(len(fila), 200)
+
+    def test_posicoes_seguem_fluxos_ignorando_vazios(self):
+        _, proximas = janela([([], 50), (_itens('a', 100), 10), (_itens('b', 1), 90)], 200)
+        self.assertEqual(proximas, [0, 20, 0])
+
+
+class PlanoJanelasTests(TesteCore):
+
+    def test_plano_encadeia_janelas(self):
+        from core.manifest import compilar_plano
+
+        franqueado = criar_franqueado()
+        municipio = criar_municipio(franqueado)
+        cliente = criar_cliente(franqueado, municipio)
+        longa = criar_playlist(municipio, cliente, 'longa', 100)
+        curta = criar_playlist(municipio, cliente, 'curta', 1)
+        dispositivo = criar_dispositivo(municipio)
+        agendar(dispositivo, longa, 10)
+        agendar(dispositivo, curta, 90)
+
+        plano = compilar_plano(dispositivo, self.request, dias=1)
+
+        # 200 slots de 30s: cada janela vale 100 min e a seguinte continua a sequência
+        segmentos = [seg for seg in plano['segmentos'] if seg['ligado']]
+        self.assertGreaterEqual(len(segmentos), 5)
+        titulos = []
+        for seg in segmentos[:5]:
+            fila = plano['filas'][seg['fila']]['itens']
+            self.assertEqual(len(fila), 200)
+            duracao = datetime.fromisoformat(seg['fim']) - datetime.fromisoformat(seg['inicio'])
+            self.assertLessEqual(duracao.total_seconds(), 6000)
+            titulos.extend(
+                plano['itens'][i]['titulo'] for i in fila if plano['itens'][i]['titulo'].startswith('longa')
+            )
+        self.assertEqual(titulos, [f'longa-{i}' for i in range(100)])
+        # Janelas repetidas são enviadas uma vez só
+        self.assertLessEqual(len(plano['filas']), 5)
@@ -0,0 +1,272 @@
+"""
+Linha do tempo semanal compilada por dispositivo.
+
+Agendamentos (AgendamentoExibicao) e horários de funcionamento
+(HorarioFuncionamento) são convertidos, uma única vez, em um índice de
+intervalos sobre o "segundo da semana" (0 = segunda 00:00:00):
+
+    fronteiras = [0, 45000, 48600, ...]   # ordenado, um por mudança de estado
+    estados    = [(ags, ligado), ...]     # estado vigente a partir de cada fronteira
+
+Com isso, "o que está ativo em t" e "quando é a próxima mudança" são
+respondidos com uma busca binária (O(log n)), sem consultar o banco.
+A timeline fica no cache compartilhado e é descartada pelos sinais
+(core/signals.py) quando agendamentos, horários ou playlists mudam.
+
+Resolução de 1 segundo: hora_fim é inclusiva (hora_inicio <= agora <= hora_fim),
+então o intervalo compilado é [hora_inicio, hora_fim + 1s).
+"""
+import hashlib
+import json
+import logging
+import uuid
+from bisect import bisect_right
+from datetime import datetime, time, timedelta
+
+from django.core.cache import cache, caches
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+GEN_KEY = 'tvtimeline:gen'
+KEY_PREFIX = 'tvtimeline:v2:disp:'
+TIMELINE_TTL = 7 * 86400
+
+SEGUNDOS_DIA = 86400
+SEGUNDOS_SEMANA = 7 * SEGUNDOS_DIA
+
+
+def _segundos(hora):
+    return hora.hour * 3600 + hora.minute * 60 + hora.second
+
+
+def _segundo_da_semana(dt):
+    local = timezone.localtime(dt)
+    return local.weekday() * SEGUNDOS_DIA + _segundos(local)
+
+
+def _intervalos(dias, hora_inicio, hora_fim):
+    """Intervalos [ini, fim) em segundos da semana para uma faixa diária."""
+    ini = _segundos(hora_inicio) if hora_inicio else 0
+    fim = _segundos(hora_fim) + 1 if hora_fim else SEGUNDOS_DIA
+    if ini >= fim:
+        # Faixa que cruza a meia-noite nunca casa na regra hora_inicio <= agora <= hora_fim
+        return []
+    return [(d * SEGUNDOS_DIA + ini, d * SEGUNDOS_DIA + fim) for d in dias]
+
+
+class _IndiceIntervalos:
+    """Fronteiras ordenadas + estado vigente em cada faixa (estados adjacentes sempre diferentes)."""
+
+    def __init__(self, intervalos, estado_de):
+        """
+        intervalos: lista de (ini, fim, chave)
+        estado_de:  função(frozenset de chaves ativas) -> estado hashable
+        """
+        eventos = {0, SEGUNDOS_SEMANA}
+        for ini, fim, _ in intervalos:
+            eventos.add(ini)
+            eventos.add(fim)
+        pontos = sorted(eventos)
+
+        inicios = sorted(intervalos, key=lambda x: x[0])
+        abertos = []
+        i = 0
+        self.fronteiras = []
+        self.estados = []
+        for pos in pontos[:-1]:
+            while i < len(inicios) and inicios[i][0] <= pos:
+                abertos.append(inicios[i])
+                i += 1
+            abertos = [iv for iv in abertos if iv[1] > pos]
+            estado = estado_de(frozenset(k for _, _, k in abertos))
+            if self.estados and self.estados[-1] == estado:
+                continue
+            self.fronteiras.append(pos)
+            self.estados.append(estado)
+
+    def estado_em(self, sow):
+        return self.estados[bisect_right(self.fronteiras, sow) - 1]
+
+    def proxima_fronteira(self, sow):
+        """Segundos até a próxima mudança de estado a partir de sow, ou None."""
+        if len(self.fronteiras) == 1:
+            return None
+        i = bisect_right(self.fronteiras, sow)
+        if i < len(self.fronteiras):
+            return self.fronteiras[i] - sow
+        # Volta para a semana seguinte: a fronteira 0 só é mudança se o estado difere
+        if self.estados[0] != self.estados[-1]:
+            return SEGUNDOS_SEMANA - sow
+        return SEGUNDOS_SEMANA + self.fronteiras[1] - sow
+
+
+class TimelineDispositivo:
+    """Índice semanal compilado dos agendamentos e horários de um dispositivo."""
+
+    def __init__(self, agendamentos, horarios):
+        # Ordem original do queryset (-prioridade, hora_inicio) como desempate,
+        # igual ao sort estável feito em DispositivoTV.get_agendamentos_ativos_por_horario
+        self._agendamentos = {}
+        self._rank = {}
+        intervalos_ag = []
+        for pos, ag in enumerate(agendamentos):
+            if not ag.playlist or not ag.playlist.ativa:
+                continue
+            self._agendamentos[ag.id] = ag
+            # Agendamentos com horário específico vêm antes dos 24/7
+            self._rank[ag.id] = (1 if ag.is_fulltime else 0, -ag.prioridade, pos)
+            for ini, fim in _intervalos(ag.dias_efetivos, ag.hora_inicio, ag.hora_fim):
+                intervalos_ag.append((ini, fim, ag.id))
+        self.tem_agendamentos = bool(self._agendamentos)
+        self._idx_agendamentos = _IndiceIntervalos(
+            intervalos_ag,
+            lambda ids: tuple(sorted(ids, key=self._rank.__getitem__)),
+        )
+        self.assinatura = self._assinar()
+
+        intervalos_hf = []
+        for h in horarios:
+            dias = h.dias_semana if h.dias_semana else list(range(7))
+            for ini, fim in _intervalos(dias, h.hora_inicio, h.hora_fim):
+                intervalos_hf.append((ini, fim, h.id))
+        self.tem_funcionamento = bool(horarios)
+        if self.tem_funcionamento:
+            self._idx_funcionamento = _IndiceIntervalos(intervalos_hf, bool)
+        else:
+            self._idx_funcionamento = _IndiceIntervalos([], lambda ids: True)  # 24/7
+
+    def _assinar(self):
+        """
+        Hash do que determina a fila exibida: fronteiras da semana e, em cada
+        faixa, as (playlist, percentual) ativas na ordem de prioridade.
+        Dispositivos com a mesma assinatura exibem a mesma programação,
+        ainda que os agendamentos tenham ids, janelas redundantes ou
+        prioridades diferentes.
+        """
+        faixas = [
+            (fronteira, [(self._agendamentos[i].playlist.id, self._agendamentos[i].percentual) for i in ids])
+            for fronteira, ids in zip(self._idx_agendamentos.fronteiras, self._idx_agendamentos.estados)
+        ]
+        return hashlib.sha1(json.dumps(faixas, separators=(',', ':')).encode()).hexdigest()[:20]
+
+    # ─── consultas ──────────────────────────────────────────────────────────
+
+    def agendamentos_em(self, dt):
+        """AgendamentoExibicao ativos em dt, na ordem de prioridade (horário → 24/7)."""
+        ids = self._idx_agendamentos.estado_em(_segundo_da_semana(dt))
+        return [self._agendamentos[i] for i in ids]
+
+    def ligado_em(self, dt):
+        """True se dt está dentro de algum HorarioFuncionamento (ou se não há nenhum)."""
+        return self._idx_funcionamento.estado_em(_segundo_da_semana(dt))
+
+    def proxima_mudanca(self, dt, funcionamento=True, agendamentos=True):
+        """
+        Próximo instante (aware) em que os agendamentos ativos e/ou o estado
+        ligado/desligado mudam. None se o estado é constante a semana toda.
+        """
+        sow = _segundo_da_semana(dt)
+        deltas = []
+        if agendamentos:
+            deltas.append(self._idx_agendamentos.proxima_fronteira(sow))
+        if funcionamento:
+            deltas.append(self._idx_funcionamento.proxima_fronteira(sow))
+        deltas = [d for d in deltas if d is not None]
+        if not deltas:
+            return None
+        return _instante(dt, sow + min(deltas))
+
+
+def _instante(dt, sow_alvo):
+    """Converte um segundo da semana (a partir da semana de dt, pode passar de 7 dias) em datetime aware."""
+    local = timezone.localtime(dt)
+    segunda = local.date() - timedelta(days=local.weekday())
+    dia = segunda + timedelta(days=sow_alvo // SEGUNDOS_DIA)
+    resto = sow_alvo % SEGUNDOS_DIA
+    hora = time(resto // 3600, (resto % 3600) // 60, resto % 60)
+    return timezone.make_aware(datetime.combine(dia, hora), timezone.get_current_timezone())
+
+
+# ─── store ───────────────────────────────────────────────────────────────────
+
+def geracao_atual():
+    gen = caches['estado'].get(GEN_KEY)
+    if gen is None:
+        gen = uuid.uuid4().hex
+        caches['estado'].set(GEN_KEY, gen, None)
+    return gen
+
+
+def invalidar_todas():
+    """Descarta todas as timelines (ex: playlist ativada/desativada)."""
+    caches['estado'].set(GEN_KEY, uuid.uuid4().hex, None)
+
+
+def invalidar_timeline(dispositivo_id):
+    cache.delete(f'{KEY_PREFIX}{dispositivo_id}')
+
+
+def invalidar_timelines(dispositivo_ids):
+    if dispositivo_ids:
+        cache.delete_many([f'{KEY_PREFIX}{i}' for i in dispositivo_ids])
+
+
+def _compilar(dispositivo_ids):
+    """Compila as timelines de vários dispositivos com duas queries no total."""
+    from .models import AgendamentoExibicao, HorarioFuncionamento
+
+    agendamentos = {i: [] for i in dispositivo_ids}
+    for ag in AgendamentoExibicao.objects.filter(
+        dispositivo_id__in=dispositivo_ids,
+        ativo=True,
+        playlist__ativa=True,
+    ).select_related('playlist'):
+        agendamentos[ag.dispositivo_id].append(ag)
+
+    horarios = {i: [] for i in dispositivo_ids}
+    for h in HorarioFuncionamento.objects.filter(
+        dispositivo_id__in=dispositivo_ids,
+        ativo=True,
+    ):
+        horarios[h.dispositivo_id].append(h)
+
+    return {i: TimelineDispositivo(agendamentos[i], horarios[i]) for i in dispositivo_ids}
+
+
+def carregar_timelines(dispositivos):
+    """
+    Consulta em lote: garante dispositivo._timeline para todos os dispositivos,
+    com um get_many no cache e, para os ausentes, duas queries no total.
+    Retorna {dispositivo_id: TimelineDispositivo}.
+    """
+    dispositivos = [d for d in dispositivos if getattr(d, '_timeline', None) is None]
+    if not dispositivos:
+        return {}
+
+    gen = geracao_atual()
+    chaves = {f'{KEY_PREFIX}{d.id}': d.id for d in dispositivos}
+    encontrados = cache.get_many(list(chaves))
+    timelines = {
+        chaves[k]: v['timeline'] for k, v in encontrados.items() if v.get('gen') == gen
+    }
+
+    faltando = [d.id for d in dispositivos if d.id not in timelines]
+    if faltando:
+        novas = _compilar(faltando)
+        cache.set_many(
+            {f'{KEY_PREFIX}{i}': {'gen': gen, 'timeline': t} for i, t in novas.items()},
+            TIMELINE_TTL,
+        )
+        timelines.update(novas)
+
+    for d in dispositivos:
+        d._timeline = timelines[d.id]
+    return timelines
+
+
+def obter_timeline(dispositivo):
+    """Timeline do dispositivo (memoizada na instância)."""
+    if getattr(dispositivo, '_timeline', None) is None:
+        carregar_timelines([dispositivo])
+    return dispositivo._timeline
@@ -3,9 +3,9 @@ from rest_framework.routers import DefaultRouter
 from .views import (
     UserViewSet, MunicipioViewSet, ClienteViewSet, VideoViewSet,
     PlaylistViewSet, PlaylistItemViewSet, DispositivoTVViewSet,
-    LogExibicaoViewSet, TVAPIView, TVLogExibicaoView, TVLogWebViewView,
+    LogExibicaoViewSet, TVAPIView, TVManifestDeltaView, TVPlanoView, TVLogExibicaoView, TVLogWebViewView, TVLogLoteView,
     TVCheckScheduleView, TVCorporativoHTMLView, TVVersionCheckView,
-    TVHeartbeatView, DashboardStatsView
+    TVHeartbeatView, DashboardStatsView, tv_push_view, tv_log_backlog_view
 )
 
 router = DefaultRouter()
@@ -23,12 +23,17 @@ urlpatterns = [
 
     # API para TV App
     path('tv/auth/', TVAPIView.as_view(), name='tv-auth'),
+    path('tv/manifest/delta/', TVManifestDeltaView.as_view(), name='tv-manifest-delta'),
+    path('tv/plano/', TVPlanoView.as_view(), name='tv-plano'),
     path('tv/log-exibicao/', TVLogExibicaoView.as_view(), name='tv-log-exibicao'),
     path('tv/log-webview/', TVLogWebViewView.as_view(), name='tv-log-webview'),
+    path('tv/log-lote/', TVLogLoteView.as_view(), name='tv-log-lote'),
+    path('tv/log-backlog/', tv_log_backlog_view, name='tv-log-backlog'),
     path('tv/check-schedule/<uuid:identificador_unico>/', TVCheckScheduleView.as_view(), name='tv-check-schedule'),
     path('tv/corporativo/<str:tipo>/<int:playlist_id>/', TVCorporativoHTMLView.as_view(), name='tv-corporativo-html'),
     path('tv/version/', TVVersionCheckView.as_view(), name='tv-version-check'),
     path('tv/heartbeat/', TVHeartbeatView.as_view(), name='tv-heartbeat'),
+    path('tv/push/<uuid:identificador_unico>/', tv_push_view, name='tv-push'),
 
     # Dashboard
     path('dashboard/stats/', DashboardStatsView.as_view(), name='dashboard-stats'),
@@ -12,6 +12,8 @@ urlpatterns = [
     # Dashboard
     path('dashboard/', views.dashboard_view, name='dashboard'),
     path('dashboard/metricas/', views.cliente_metricas_view, name='cliente_metricas'),
+    path('dashboard/franqueados/<int:pk>/<str:lista>/', views.dashboard_franqueado_lista_api, name='dashboard_franqueado_lista'),
+    path('dashboard/municipios/<int:pk>/dispositivos/', views.dashboard_municipio_dispositivos_api, name='dashboard_municipio_dispositivos'),
 
     # Users
     path('users/', views.user_list_view, name='user_list'),
@@ -2,7 +2,10 @@ from rest_framework import viewsets, status, permissions, serializers
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
 from django.utils import timezone
+from django.utils.cache import patch_vary_headers
 from django.db.models import Q, Count, Sum
 from django.db import models
 from django.views.decorators.clickjacking import xframe_options_exempt
@@ -12,7 +15,7 @@ from .models import (
     User, Municipio, Cliente, Video,
     Playlist, PlaylistItem, DispositivoTV, LogExibicao, Segmento, AppVersion,
     QRCodeClick, AgendamentoExibicao, ConteudoCorporativo, ConfiguracaoAPI,
-    HorarioFuncionamento, LogExibicaoWebView,
+    HorarioFuncionamento, LogExibicaoWebView, ExibicaoPorDia,
     Campanha, CampanhaCupomConfig, CampanhaLead,
     CampanhaRoletaConfig, CampanhaRoletaPremio, CampanhaJogada,
     CampanhaCartaConfig,
@@ -24,8 +27,11 @@ from .serializers import (
     ClienteSerializer, ClienteCreateSerializer, VideoSerializer,
     PlaylistSerializer, PlaylistItemSerializer, DispositivoTVSerializer,
     LogExibicaoSerializer, LogExibicaoWebViewSerializer,
-    PlaylistTVSerializer, DispositivoTVAuthSerializer
+    DispositivoTVAuthSerializer
 )
+from .compacto import MessagePackRenderer, manifesto_binario, disponivel as _msgpack_disponivel
+from .compressao import resposta_comprimida
+from .fastpath import resposta_json
 from .permissions import (
     IsOwner, IsFranchiseeOrOwner, IsClientOrAbove,
     IsOwnerOfObject, CanManageClients, CanManagePlaylists, CanManageVideos
@@ -333,96 +339,116 @@ class LogExibicaoViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'])
     def stats(self, request):
-        """Estatísticas de exibição"""
-        queryset = self.get_queryset()
+        """Estatísticas de exibição (agregados diários — core/agregacao.py)"""
+        user = request.user
+        agregados = ExibicaoPorDia.objects.all()
+        if user.is_franchisee():
+            agregados = agregados.filter(dispositivo__municipio__franqueado=user)
+        elif not user.is_owner():
+            agregados = agregados.none()
+        totais = agregados.aggregate(total=Sum('exibicoes'), completas=Sum('completas'))
         stats = {
-            'total_exibicoes': queryset.count(),
-            'exibicoes_completas': queryset.filter(completamente_exibido=True).count(),
-            'videos_mais_exibidos': queryset.values('video__titulo').annotate(
-                total=Count('id')
+            'total_exibicoes': totais['total'] or 0,
+            'exibicoes_completas': totais['completas'] or 0,
+            'videos_mais_exibidos': agregados.values('video__titulo').annotate(
+                total=Sum('exibicoes')
             ).order_by('-total')[:10]
         }
         return Response(stats)
 
 
-# ─── Distribuição proporcional por tempo (Weighted Fair Queuing) ─────────────
-def _distribuir_por_percentual(pairs, max_videos=200):
-    """
-    Weighted Fair Queuing baseado em duração real dos vídeos.
+# API específica para o App de TV
+def _proxima_mudanca_header(response, valido_ate):
+    response['X-Next-Change-At'] = timezone.localtime(valido_ate).isoformat()
 
-    Cada playlist acumula créditos de tempo proporcionais ao seu peso (percentual).
-    A playlist com MAIS crédito acumulado ("mais devida") é a próxima a ser exibida.
-    Ao exibir um vídeo, o crédito diminui pela duração real normalizada pela média
-    global — vídeos mais longos "custam" mais crédito, garantindo equidade por tempo
-    de tela e não apenas por contagem de vídeos.
 
-    Ex: playlist A (80 %, vídeos 60 s) e B (20 %, vídeos 15 s):
-        → A aparece ~4× para cada aparição de B (tempo de tela ≈ 80 %/20 %).
+def tv_auth_resposta(request, identificador, versao_app='', renderer=None):
     """
-    import itertools
-    from math import lcm
-    from functools import reduce
-
-    valid = [(list(vids), pct) for vids, pct in pairs if vids and pct and pct > 0]
-    if not valid:
-        return [v for vids, _ in pairs for v in vids]
-    if len(valid) == 1:
-        return list(valid[0][0])
-
-    total_pct = sum(pct for _, pct in valid)
-    weights = [pct / total_pct for _, pct in valid]  # e.g. [0.8, 0.2]
-
-    # Duração média global (todos os vídeos de todas as playlists)
-    all_vids_flat = [v for vids, _ in valid for v in vids]
-    all_durs = [
-        v.get('duracao_segundos', 30)
-        for v in all_vids_flat
-        if isinstance(v, dict) and v.get('duracao_segundos', 0) > 0
-    ]
-    avg_dur = (sum(all_durs) / len(all_durs)) if all_durs else 30.0
-
-    # Tamanho do ciclo: LCM dos tamanhos das playlists, escalado pelo menor peso,
-    # limitado a max_videos para não gerar listas enormes
-    lengths = [len(vids) for vids, _ in valid]
-    try:
-        cycle_len = reduce(lcm, lengths)
-    except Exception:
-        cycle_len = max(lengths)
-    min_weight = min(weights)
-    needed = int(max(lengths) / min_weight)  # garante ciclo completo de cada playlist
-    total = min(max(needed, cycle_len), max_videos)
-
-    iters = [itertools.cycle(vids) for vids, _ in valid]
-    credits = [0.0] * len(valid)
-    result = []
+    Resposta do POST /api/tv/auth/ para dados já validados — compartilhada
+    pela TVAPIView e pelo fast path WSGI (core/fastpath.py).
 
-    for _ in range(total):
-        # Cada playlist acumula crédito proporcional ao seu peso
-        for i in range(len(valid)):
-            credits[i] += weights[i]
+    renderer: JSONRenderer (padrão) ou MessagePackRenderer.
+    """
+    from functools import partial
+    from django.conf import settings
+    from django.http import HttpResponse, HttpResponseNotModified
+    from . import manifest, presenca
+
+    renderer = renderer or JSONRenderer()
+
+    # Fast path: manifesto inalterado → 304 sem tocar no banco. A entrada em
+    # cache só existe para dispositivo ativo (desativar invalida o manifesto).
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        entry = manifest.manifesto_em_cache(identificador, request)
+        if entry and manifest.etag_corresponde(if_none_match, entry['versao']):
+            presenca.tocar(identificador, versao_app)
+            response = HttpResponseNotModified()
+            response['ETag'] = manifest.etag_header(entry['versao'])
+            _proxima_mudanca_header(response, entry['valido_ate'])
+            patch_vary_headers(response, ('Accept',))
+            return response
 
-        # Executa a playlist com maior crédito acumulado (a "mais devida")
-        chosen = max(range(len(valid)), key=lambda i: credits[i])
-        video = next(iters[chosen])
+    try:
+        dispositivo = DispositivoTV.objects.select_related('municipio').get(
+            identificador_unico=identificador,
+            ativo=True
+        )
 
-        # Desconta pela duração real normalizada:
-        # vídeo de 60 s com média 30 s custa 2 créditos; de 15 s custa 0,5.
-        dur = video.get('duracao_segundos', avg_dur) if isinstance(video, dict) else avg_dur
-        if dur <= 0:
-            dur = avg_dur
-        credits[chosen] -= dur / avg_dur
+        presenca.tocar(identificador, versao_app)
 
-        result.append(video)
+        # Retorna TODAS as playlists ativas no horário atual mescladas
+        entry = manifest.obter_manifesto(dispositivo, request)
+        if manifest.etag_corresponde(if_none_match, entry['versao']):
+            response = HttpResponseNotModified()
+        else:
+            # Bytes codificados e comprimidos uma vez por versão (core/compressao.py)
+            codificar = manifesto_binario if isinstance(renderer, MessagePackRenderer) else renderer.render
+            response = resposta_comprimida(
+                request, partial(codificar, entry['body']), renderer.media_type,
+                chave=f"manifesto:{entry['versao']}:{entry['valido_ate'].timestamp():.0f}:{renderer.format}",
+                ttl=getattr(settings, 'TV_MANIFEST_HISTORY_SECONDS', 86400),
+            )
+        response['ETag'] = manifest.etag_header(entry['versao'])
+        _proxima_mudanca_header(response, entry['valido_ate'])
+        patch_vary_headers(response, ('Accept',))
+        return response
 
-    return result
+    except DispositivoTV.DoesNotExist:
+        return HttpResponse(
+            renderer.render({'error': 'Dispositivo não encontrado ou inativo'}),
+            content_type=renderer.media_type, status=status.HTTP_404_NOT_FOUND,
+        )
+    except Exception as e:
+        import traceback as _tb
+        import logging as _logging
+        _logging.getLogger(__name__).error(
+            "TVAPIView 500: %s\n%s", e, _tb.format_exc()
+        )
+        return HttpResponse(
+            renderer.render({'error': f'Erro interno: {type(e).__name__}: {e}'}),
+            content_type=renderer.media_type, status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        )
 
 
-# API específica para o App de TV
 class TVAPIView(APIView):
     """
-    API para o app de TV se autenticar e buscar playlist
+    API para o app de TV se autenticar e buscar playlist.
+
+    O manifesto é pré-compilado e cacheado por dispositivo (core/manifest.py).
+    A resposta leva ETag = versao_manifesto; se o app reenviar a versão em
+    If-None-Match e nada mudou, responde 304 sem recompilar nada.
+
+    Com `Accept: application/x-msgpack` o manifesto vai na forma compacta
+    (core/compacto.py), codificada uma vez por versão.
+
+    Em produção os POSTs comuns das TVs são atendidos antes do Django pelo
+    fast path WSGI (core/fastpath.py), que chama o mesmo tv_auth_resposta.
     """
     permission_classes = [permissions.AllowAny]
+    renderer_classes = list(api_settings.DEFAULT_RENDERER_CLASSES) + (
+        [MessagePackRenderer] if _msgpack_disponivel() else []
+    )
     
     def post(self, request):
         """Autenticação de dispositivo e retorno da playlist"""
@@ -430,98 +456,152 @@ class TVAPIView(APIView):
         
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-        
+
+        renderer = request.accepted_renderer
+        if not isinstance(renderer, (JSONRenderer, MessagePackRenderer)):
+            renderer = None
+        return tv_auth_resposta(
+            request,
+            serializer.validated_data['identificador_unico'],
+            serializer.validated_data.get('versao_app', ''),
+            renderer,
+        )
+
+
+class TVManifestDeltaView(APIView):
+    """
+    Delta do manifesto em relação à versão que o app já possui.
+
+    POST /api/tv/manifest/delta/
+    Body: { "identificador_unico": "<uuid>", "versao_manifesto": "<versão atual do app>" }
+
+    - 304: a versão do app já é a atual.
+    - 200 com "completo": false — apenas itens adicionados, alterados (ex: URL
+      nova), removidos e a nova ordem (lista de chaves, só se mudou).
+    - 200 com "completo": true — a versão do app não está mais no histórico;
+      retorna o manifesto inteiro, igual a /api/tv/auth/.
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def post(self, request):
+        from . import manifest, presenca
+
+        serializer = DispositivoTVAuthSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
         identificador = serializer.validated_data['identificador_unico']
-        versao_app = serializer.validated_data.get('versao_app', '')
-        
+        versao_base = str(request.data.get('versao_manifesto') or '').strip()
+
         try:
-            dispositivo = DispositivoTV.objects.get(
+            dispositivo = DispositivoTV.objects.select_related('municipio').get(
                 identificador_unico=identificador,
                 ativo=True
             )
-            
-            # Atualiza última sincronização
-            estava_offline = dispositivo.alerta_desconexao_enviado
-            dispositivo.ultima_sincronizacao = timezone.now()
-            if versao_app:
-                dispositivo.versao_app = versao_app
-            if estava_offline:
-                dispositivo.alerta_desconexao_enviado = False
-            dispositivo.save()
+        except DispositivoTV.DoesNotExist:
+            return Response(
+                {'error': 'Dispositivo não encontrado ou inativo'},
+                status=status.HTTP_404_NOT_FOUND
+            )
 
-            # Notifica reconexão em background (sem bloquear resposta)
-            if estava_offline:
-                try:
-                    from core.alerts import send_online_alert
-                    import threading
-                    threading.Thread(target=send_online_alert, args=(dispositivo,), daemon=True).start()
-                except Exception:
-                    pass
-            
-            # Retorna TODAS as playlists ativas no horário atual mescladas
-            agendamentos_ativos = dispositivo.get_agendamentos_ativos_por_horario()
-
-            if agendamentos_ativos:
-                pairs = []  # (video_list, percentual)
-                playlist_ids = []
-                playlist_names = []
-
-                for ag in agendamentos_ativos:
-                    playlist = ag.playlist
-                    if not playlist.ativa:
-                        continue
-                    playlist_ids.append(playlist.id)
-                    playlist_names.append(playlist.nome)
-                    pl_serializer = PlaylistTVSerializer(
-                        playlist,
-                        context={'request': request, 'dispositivo_id': dispositivo.id}
-                    )
-                    videos = pl_serializer.data.get('videos', [])
-                    pairs.append((videos, ag.percentual))
+        presenca.tocar(identificador, serializer.validated_data.get('versao_app', ''))
 
-                # Usar distribuição proporcional se houver percentuais variados
-                has_varied = len(pairs) > 1 and any(pct != 100 for _, pct in pairs)
-                if has_varied:
-                    all_videos = _distribuir_por_percentual(pairs)
-                else:
-                    all_videos = [v for vids, _ in pairs for v in vids]
-
-                return Response({
-                    'dispositivo_id': dispositivo.id,
-                    'dispositivo_nome': dispositivo.nome,
-                    'municipio': str(dispositivo.municipio),
-                    'playlist': {
-                        'id': playlist_ids[0] if len(playlist_ids) == 1 else 0,
-                        'nome': ' + '.join(playlist_names),
-                        'duracao_total_segundos': sum(v.get('duracao_segundos', 0) for v in all_videos),
-                        'videos': all_videos,
-                        'playlists_mescladas': playlist_ids,
-                    }
-                })
+        entry = manifest.obter_manifesto(dispositivo, request)
+        if versao_base == entry['versao']:
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            base = manifest.manifesto_por_versao(versao_base)
+            if base is None:
+                response = Response({**entry['body'], 'completo': True})
             else:
-                return Response({
-                    'dispositivo_id': dispositivo.id,
-                    'dispositivo_nome': dispositivo.nome,
-                    'municipio': str(dispositivo.municipio),
-                    'playlist': None,
-                    'message': 'Nenhuma playlist ativa configurada'
+                response = Response({
+                    'completo': False,
+                    'versao_base': versao_base,
+                    'versao_manifesto': entry['versao'],
+                    **manifest.calcular_delta(base, entry['body']),
                 })
-        
+        response['ETag'] = manifest.etag_header(entry['versao'])
+        return response
+
+
+class TVPlanoView(APIView):
+    """
+    Plano de exibição offline: N dias de playout pré-calculado.
+
+    POST /api/tv/plano/
+    Body: { "identificador_unico": "<uuid>", "dias": 1 }   (dias: 1 a 7)
+
+    Segue os agendamentos, os horários de funcionamento e os percentuais
+    (mesma distribuição do /api/tv/auth/). O app executa o plano sozinho
+    durante quedas de conexão e só precisa sincronizar em "valido_ate".
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def post(self, request):
+        from . import presenca
+        from .manifest import compilar_plano
+
+        serializer = DispositivoTVAuthSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            dias = int(request.data.get('dias', 1))
+        except (TypeError, ValueError):
+            return Response({'error': 'dias deve ser um inteiro'}, status=status.HTTP_400_BAD_REQUEST)
+        dias = max(1, min(dias, 7))
+
+        try:
+            dispositivo = DispositivoTV.objects.select_related('municipio').get(
+                identificador_unico=serializer.validated_data['identificador_unico'],
+                ativo=True
+            )
         except DispositivoTV.DoesNotExist:
             return Response(
                 {'error': 'Dispositivo não encontrado ou inativo'},
                 status=status.HTTP_404_NOT_FOUND
             )
-        except Exception as e:
-            import traceback as _tb
-            import logging as _logging
-            _logging.getLogger(__name__).error(
-                "TVAPIView 500: %s\n%s", e, _tb.format_exc()
-            )
-            return Response(
-                {'error': f'Erro interno: {type(e).__name__}: {e}'},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
+
+        presenca.tocar(dispositivo.identificador_unico, serializer.validated_data.get('versao_app', ''))
+        return Response(compilar_plano(dispositivo, request, dias))
+
+
+def tv_log_exibicao_resposta(dados):
+    """
+    Recebe log de exibição — compartilhado pela TVLogExibicaoView e core/fastpath.py.
+
+    O evento é validado e enfileirado (core/logs.py); a gravação acontece
+    em lote, fora da requisição — por isso 202 e não 201.
+    """
+    from .logs import LoteInvalido, enfileirar
+
+    dispositivo_id = dados.get('dispositivo_id')
+    video_id = dados.get('video_id')
+
+    if not dispositivo_id or not video_id:
+        return resposta_json(
+            {'error': 'dispositivo_id e video_id são obrigatórios'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    try:
+        enfileirar(dispositivo_id, {
+            'tipo': 'video',
+            'video_id': video_id,
+            'tempo_exibicao_segundos': dados.get('tempo_exibicao_segundos', 0),
+            'playlist_id': dados.get('playlist_id'),  # opcional — enviado pelo app
+            'evento_id': dados.get('evento_id'),  # opcional — evita duplicar em reenvios
+            'data_hora_fim': dados.get('data_hora_fim'),  # opcional — relógio da TV
+        })
+    except LoteInvalido as e:
+        return resposta_json({'error': str(e)}, status=e.status)
+    except ValueError as e:
+        return resposta_json({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    return resposta_json(
+        {'success': True, 'message': 'Log registrado com sucesso'},
+        status=status.HTTP_202_ACCEPTED
+    )
 
 
 class TVLogExibicaoView(APIView):
@@ -532,72 +612,39 @@ class TVLogExibicaoView(APIView):
     permission_classes = [permissions.AllowAny]
 
     def post(self, request):
-        """Registra log de exibição e cria entrada parcial para o próximo item da fila"""
-        dispositivo_id = request.data.get('dispositivo_id')
-        video_id = request.data.get('video_id')
-        tempo_exibicao_segundos = request.data.get('tempo_exibicao_segundos', 0)
-        playlist_id = request.data.get('playlist_id')  # opcional — enviado pelo app
+        """Enfileira o log de exibição para gravação em lote"""
+        return tv_log_exibicao_resposta(request.data)
 
-        if not dispositivo_id or not video_id:
-            return Response(
-                {'error': 'dispositivo_id e video_id são obrigatórios'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
 
-        try:
-            dispositivo = DispositivoTV.objects.get(id=dispositivo_id)
-            video = Video.objects.get(id=video_id)
-
-            # Resolve a playlist do log:
-            # 1. playlist_id enviado pelo app (mais preciso)
-            # 2. playlist ativa no horário atual via agendamento
-            # 3. playlist_atual como último fallback
-            playlist = None
-            if playlist_id:
-                try:
-                    playlist = Playlist.objects.get(id=playlist_id)
-                except Exception:
-                    pass
-            if playlist is None:
-                playlist = dispositivo.get_playlist_atual_por_horario()
-            if playlist is None:
-                playlist = dispositivo.playlist_atual
-
-            data_hora_fim = timezone.now()
-            data_hora_inicio = data_hora_fim - timezone.timedelta(seconds=int(tempo_exibicao_segundos))
-
-            # Verifica se foi completamente exibido (≥90% do tempo ou duração desconhecida)
-            if video.duracao_segundos and video.duracao_segundos > 0:
-                porcentagem = (int(tempo_exibicao_segundos) / video.duracao_segundos) * 100
-                completamente_exibido = porcentagem >= 90
-            else:
-                # Duração não cadastrada → assume completo
-                completamente_exibido = True
-
-            # Cria registro do log com início/fim corretos
-            LogExibicao.objects.create(
-                dispositivo=dispositivo,
-                video=video,
-                playlist=playlist,
-                data_hora_inicio=data_hora_inicio,
-                data_hora_fim=data_hora_fim,
-                completamente_exibido=completamente_exibido
-            )
+def _criar_log_parcial_proximo(*args, **kwargs):
+    """Removido — causava registros phantom de 'Em reprodução' para vídeos fora da playlist."""
+    pass
 
-            return Response(
-                {'success': True, 'message': 'Log registrado com sucesso'},
-                status=status.HTTP_201_CREATED
-            )
 
-        except DispositivoTV.DoesNotExist:
-            return Response({'error': 'Dispositivo não encontrado'}, status=status.HTTP_404_NOT_FOUND)
-        except Video.DoesNotExist:
-            return Response({'error': 'Vídeo não encontrado'}, status=status.HTTP_404_NOT_FOUND)
+def tv_log_webview_resposta(dados):
+    """Recebe execução de conteúdo corporativo (enfileirada, como tv_log_exibicao_resposta)."""
+    from .logs import LoteInvalido, enfileirar
 
+    dispositivo_id = dados.get('dispositivo_id')
+    if not dispositivo_id:
+        return resposta_json({'error': 'dispositivo_id é obrigatório'}, status=status.HTTP_400_BAD_REQUEST)
 
-def _criar_log_parcial_proximo(*args, **kwargs):
-    """Removido — causava registros phantom de 'Em reprodução' para vídeos fora da playlist."""
-    pass
+    try:
+        enfileirar(dispositivo_id, {
+            'tipo': 'webview',
+            'conteudo_corporativo_id': dados.get('conteudo_corporativo_id'),
+            'tipo_conteudo': dados.get('tipo_conteudo'),
+            'titulo': dados.get('titulo'),
+            'duracao_segundos': dados.get('duracao_segundos', 0),
+            'evento_id': dados.get('evento_id'),
+            'data_hora_fim': dados.get('data_hora_fim'),
+        })
+    except LoteInvalido as e:
+        return resposta_json({'error': str(e)}, status=e.status)
+    except ValueError as e:
+        return resposta_json({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    return resposta_json({'success': True}, status=status.HTTP_202_ACCEPTED)
 
 
 class TVLogWebViewView(APIView):
@@ -609,125 +656,97 @@ class TVLogWebViewView(APIView):
     permission_classes = [permissions.AllowAny]
 
     def post(self, request):
-        dispositivo_id = request.data.get('dispositivo_id')
-        tipo_conteudo = request.data.get('tipo_conteudo', 'DESIGN')
-        titulo = request.data.get('titulo', 'Conteúdo Corporativo')
-        duracao_segundos = int(request.data.get('duracao_segundos', 0))
-        corporativo_id = request.data.get('conteudo_corporativo_id')
+        return tv_log_webview_resposta(request.data)
 
-        if not dispositivo_id:
-            return Response({'error': 'dispositivo_id é obrigatório'}, status=status.HTTP_400_BAD_REQUEST)
 
-        try:
-            dispositivo = DispositivoTV.objects.get(id=dispositivo_id)
-        except DispositivoTV.DoesNotExist:
-            return Response({'error': 'Dispositivo não encontrado'}, status=status.HTTP_404_NOT_FOUND)
+def tv_log_lote_resposta(dados):
+    """Registra um lote de eventos (core/logs.py) — compartilhado pela TVLogLoteView e core/fastpath.py."""
+    from .logs import LoteInvalido, registrar_lote
 
-        cc = None
-        if corporativo_id:
-            try:
-                cc = ConteudoCorporativo.objects.get(id=corporativo_id)
-                titulo = cc.titulo
-                tipo_conteudo = cc.tipo
-            except ConteudoCorporativo.DoesNotExist:
-                pass
+    try:
+        resultado = registrar_lote(dados.get('dispositivo_id'), dados.get('eventos'))
+    except LoteInvalido as e:
+        return resposta_json({'error': str(e)}, status=e.status)
+    return resposta_json({'success': True, **resultado}, status=status.HTTP_201_CREATED)
 
-        data_hora_fim = timezone.now()
-        data_hora_inicio = data_hora_fim - timezone.timedelta(seconds=duracao_segundos)
 
-        # Duração prevista do conteúdo corporativo
-        duracao_prevista = cc.duracao_segundos if (cc and cc.duracao_segundos) else duracao_segundos
-        if duracao_prevista > 0:
-            completamente_exibido = (duracao_segundos / duracao_prevista) >= 0.9
-        else:
-            completamente_exibido = True
-
-        # Cria o log de exibição
-        LogExibicaoWebView.objects.create(
-            dispositivo=dispositivo,
-            playlist=dispositivo.playlist_atual,
-            conteudo_corporativo=cc,
-            tipo_conteudo=tipo_conteudo,
-            titulo=titulo,
-            duracao_segundos=duracao_segundos,
-            data_hora_inicio=data_hora_inicio,
-            data_hora_fim=data_hora_fim,
-            completamente_exibido=completamente_exibido,
-        )
+class TVLogLoteView(APIView):
+    """
+    API para o app de TV enviar logs acumulados de uma vez (vídeo e webview).
+    Formato: {dispositivo_id, eventos: [{tipo, video_id | conteudo_corporativo_id, ...}]}
+    Detalhes do evento em core/logs.py.
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def post(self, request):
+        return tv_log_lote_resposta(request.data)
+
+
+@csrf_exempt
+def tv_log_backlog_view(request):
+    """
+    Upload do backlog de logs de uma TV que ficou offline (core/logs.py).
+
+    POST /api/tv/log-backlog/?dispositivo_id=<id>
+    Content-Type: application/x-ndjson  — um evento JSON por linha
+    Content-Encoding: gzip              — opcional
 
-        return Response({'success': True}, status=status.HTTP_201_CREATED)
+    O corpo é lido em streaming, sem carregar o arquivo inteiro na memória.
+    """
+    from .logs import LoteInvalido, registrar_backlog
+
+    if request.method != 'POST':
+        return resposta_json({'error': 'Método não permitido'}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    comprimido = (
+        request.META.get('HTTP_CONTENT_ENCODING', '').lower() == 'gzip'
+        or request.content_type in ('application/gzip', 'application/x-gzip')
+    )
+    try:
+        resultado = registrar_backlog(request.GET.get('dispositivo_id'), request, comprimido)
+    except LoteInvalido as e:
+        return resposta_json({'error': str(e)}, status=e.status)
+    if 'erro' in resultado:
+        return resposta_json({'success': False, **resultado}, status=status.HTTP_400_BAD_REQUEST)
+    return resposta_json({'success': True, **resultado}, status=status.HTTP_201_CREATED)
 
 
 class TVCheckScheduleView(APIView):
     """
-    API para o app de TV verificar se deve exibir conteúdo no momento atual
+    API para o app de TV verificar se deve exibir conteúdo no momento atual.
+
+    O corpo é compilado uma vez e reaproveitado do cache até a próxima troca
+    de agendamento ou de horário de funcionamento — informada em
+    next_change_at (e no header X-Next-Change-At) para o app dormir até lá.
     """
     permission_classes = [permissions.AllowAny]
     
     def get(self, request, identificador_unico):
         """Verifica se o dispositivo deve estar exibindo conteúdo agora"""
+        from . import manifest, presenca
+
+        identificador = str(identificador_unico)
         try:
-            dispositivo = DispositivoTV.objects.get(
-                identificador_unico=identificador_unico,
-                ativo=True
-            )
-            
-            # Verifica se está no horário de exibição
-            should_display = dispositivo.esta_no_horario_exibicao()
-            
-            # Atualiza última sincronização
-            dispositivo.ultima_sincronizacao = timezone.now()
-            dispositivo.save(update_fields=['ultima_sincronizacao'])
-            
+            entry = manifest.agenda_em_cache(identificador)
+            if entry is None:
+                dispositivo = DispositivoTV.objects.get(
+                    identificador_unico=identificador,
+                    ativo=True
+                )
+                entry = manifest.obter_agenda(dispositivo)
+            presenca.tocar(identificador)
+
             response_data = {
-                'should_display': should_display,
+                **entry['body'],
                 'current_time': timezone.localtime(timezone.now()).isoformat(),
-                'dispositivo_nome': dispositivo.nome,
-                'has_playlist': dispositivo.playlist_atual is not None,
-                'horarios_funcionamento': [
-                    {
-                        'nome': h.nome,
-                        'hora_inicio': h.hora_inicio.strftime('%H:%M'),
-                        'hora_fim': h.hora_fim.strftime('%H:%M'),
-                        'dias_semana': h.dias_semana or [],
-                        'ativo': h.ativo,
-                    }
-                    for h in dispositivo.horarios_funcionamento.filter(ativo=True)
-                ],
             }
             
-            # Playlists ativas pelo horário (pode ser diferente da padrão)
-            playlists_ativas = dispositivo.get_playlists_ativas_por_horario()
-            if should_display and playlists_ativas:
-                if len(playlists_ativas) == 1:
-                    response_data['playlist_id'] = playlists_ativas[0].id
-                    response_data['playlist_nome'] = playlists_ativas[0].nome
-                else:
-                    # Múltiplas playlists mescladas
-                    response_data['playlist_id'] = 0  # 0 = múltiplas mescladas
-                    response_data['playlist_nome'] = ' + '.join([p.nome for p in playlists_ativas])
-                    response_data['playlists_mescladas'] = [p.id for p in playlists_ativas]
-            
-            # Retorna info dos agendamentos ativos com playlist vinculada
-            agendamentos = dispositivo.agendamentos.filter(ativo=True).select_related('playlist')
-            if agendamentos.exists():
-                response_data['agendamentos'] = [
-                    {
-                        'nome': ag.nome,
-                        'dias_semana': ag.dias_semana,
-                        'hora_inicio': ag.hora_inicio.strftime('%H:%M') if ag.hora_inicio else None,
-                        'hora_fim': ag.hora_fim.strftime('%H:%M') if ag.hora_fim else None,
-                        'playlist_id': ag.playlist_id,
-                        'playlist_nome': ag.playlist.nome if ag.playlist else None,
-                        'prioridade': ag.prioridade,
-                    }
-                    for ag in agendamentos
-                ]
-            else:
-                response_data['agendamentos'] = []
-                response_data['message'] = 'Sem agendamentos: exibição 24/7'
-            
-            return Response(response_data)
+            # current_time muda a cada chamada — comprime na hora, sem cache
+            response = resposta_comprimida(
+                request, JSONRenderer().render(response_data), 'application/json',
+            )
+            _proxima_mudanca_header(response, entry['valido_ate'])
+            return response
         
         except DispositivoTV.DoesNotExist:
             return Response(
@@ -768,6 +787,25 @@ class TVVersionCheckView(APIView):
         })
 
 
+def tv_heartbeat_resposta(identificador):
+    """
+    Heartbeat de presença — compartilhado pela TVHeartbeatView e core/fastpath.py.
+
+    Só lê o banco: a presença vai para a memória e é gravada em lote
+    (core/presenca.py), que também cuida do e-mail de reconexão.
+    """
+    from . import presenca
+
+    if not identificador:
+        return resposta_json({'error': 'identificador_unico é obrigatório'}, status=status.HTTP_400_BAD_REQUEST)
+
+    if not DispositivoTV.objects.filter(identificador_unico=identificador, ativo=True).exists():
+        return resposta_json({'error': 'Dispositivo não encontrado ou inativo'}, status=status.HTTP_404_NOT_FOUND)
+
+    presenca.tocar(identificador)
+    return resposta_json({'status': 'ok', 'ts': timezone.now().isoformat()})
+
+
 class TVHeartbeatView(APIView):
     """
     Heartbeat leve: o app Android chama este endpoint periodicamente para indicar
@@ -776,47 +814,69 @@ class TVHeartbeatView(APIView):
     POST /api/tv/heartbeat/
     Body: { "identificador_unico": "<uuid>" }
 
-    Atualiza ultima_sincronizacao.
-    Se o dispositivo estava marcado como offline (alerta já enviado), envia e-mail
-    de reconexão e reseta o flag.
+    Registra presença (ultima_sincronizacao, gravada em lote por core/presenca.py).
+    Se o dispositivo estava marcado como offline (alerta já enviado), o flush da
+    presença envia o e-mail de reconexão e reseta o flag.
     """
     permission_classes = [permissions.AllowAny]
 
     def post(self, request):
-        identificador = request.data.get('identificador_unico', '').strip()
-        if not identificador:
-            return Response({'error': 'identificador_unico é obrigatório'}, status=status.HTTP_400_BAD_REQUEST)
+        return tv_heartbeat_resposta(request.data.get('identificador_unico', '').strip())
 
-        try:
-            dispositivo = DispositivoTV.objects.select_related(
-                'municipio', 'municipio__franqueado', 'franqueado'
-            ).get(identificador_unico=identificador, ativo=True)
-        except DispositivoTV.DoesNotExist:
-            return Response({'error': 'Dispositivo não encontrado ou inativo'}, status=status.HTTP_404_NOT_FOUND)
 
-        estava_offline = dispositivo.alerta_desconexao_enviado
+async def tv_push_view(request, identificador_unico):
+    """
+    Canal de push do manifesto (core/push.py).
 
-        # Atualiza dados de presença
-        now = timezone.now()
-        update_fields = ['ultima_sincronizacao']
-        dispositivo.ultima_sincronizacao = now
+    GET /api/tv/push/<uuid>/?versao=<versao_manifesto>
 
-        if estava_offline:
-            dispositivo.alerta_desconexao_enviado = False
-            update_fields.append('alerta_desconexao_enviado')
+    - Accept: text/event-stream → SSE; `event: manifesto` a cada nova versão.
+    - Caso contrário → long-poll: responde assim que a versão deixar de ser
+      `versao` ({"mudou": true, ...}) ou após TV_PUSH_TIMEOUT_SECONDS
+      ({"mudou": false}).
 
-        dispositivo.save(update_fields=update_fields)
+    Ao receber mudança, o app busca o manifesto em POST /api/tv/auth/.
+    View assíncrona: sob ASGI a espera não ocupa thread.
+    """
+    from asgiref.sync import sync_to_async
+    from django.conf import settings
+    from django.core.handlers.asgi import ASGIRequest
+    from django.http import StreamingHttpResponse
+    from . import presenca, push
 
-        # Envia e-mail "voltou online" sem bloquear a resposta
-        if estava_offline:
-            try:
-                from core.alerts import send_online_alert
-                import threading
-                threading.Thread(target=send_online_alert, args=(dispositivo,), daemon=True).start()
-            except Exception:
-                pass
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Método não permitido'}, status=405)
+
+    identificador = str(identificador_unico)
+    versao = request.GET.get('versao', '')
+    dispositivo = await sync_to_async(
+        DispositivoTV.objects.filter(identificador_unico=identificador, ativo=True).first
+    )()
+    if dispositivo is None:
+        return JsonResponse({'error': 'Dispositivo não encontrado ou inativo'}, status=404)
+
+    if not push.reservar_conexao():
+        # Sem vaga neste processo: o app continua no polling normal
+        response = JsonResponse({'error': 'Canal de push lotado'}, status=429)
+        response['Retry-After'] = str(getattr(settings, 'TV_PUSH_TIMEOUT_SECONDS', 25))
+        return response
+
+    presenca.tocar(identificador)
+
+    if 'text/event-stream' in request.META.get('HTTP_ACCEPT', ''):
+        args = (identificador, versao, request, getattr(settings, 'TV_PUSH_SSE_SECONDS', 300))
+        stream = push.eventos(*args) if isinstance(request, ASGIRequest) else push.eventos_sincronos(*args)
+        response = StreamingHttpResponse(stream, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
 
-        return Response({'status': 'ok', 'ts': now.isoformat()})
+    body = await push.long_poll(
+        identificador, versao, request, getattr(settings, 'TV_PUSH_TIMEOUT_SECONDS', 25),
+    )
+    if body['versao_manifesto'] is None:
+        return JsonResponse({'error': 'Dispositivo não encontrado ou inativo'}, status=404)
+    return JsonResponse(body)
 
 
 @method_decorator(xframe_options_exempt, name='dispatch')
@@ -831,6 +891,7 @@ class TVCorporativoHTMLView(APIView):
     permission_classes = [permissions.AllowAny]
 
     def get(self, request, tipo, playlist_id):
+        import hashlib
         from django.shortcuts import render as django_render
         from .services import buscar_dados_corporativos
 
@@ -879,7 +940,12 @@ class TVCorporativoHTMLView(APIView):
             'conteudo_id': conteudo.id if conteudo else '',
             'duracao_segundos': conteudo.duracao_segundos if (conteudo and conteudo.duracao_segundos) else 30,
         }
-        return django_render(request, 'corporativo/conteudo_tv.html', context)
+        html = django_render(request, 'corporativo/conteudo_tv.html', context).content
+        # Mesmo HTML (mesmos dados/dispositivo) → mesma variante comprimida
+        return resposta_comprimida(
+            request, html, 'text/html; charset=utf-8',
+            chave=f'corporativo:{hashlib.sha1(html).hexdigest()}',
+        )
 
 
 class DashboardStatsView(APIView):
@@ -949,13 +1015,12 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.contrib.auth.forms import AuthenticationForm
 from django.urls import reverse
-from django.db.models import Count, Sum, Q, Avg, Prefetch
-from django.db.models.functions import TruncDate
+from django.db.models import Count, Sum, Q, Prefetch, OuterRef, Subquery
+from django.db.models.functions import Coalesce, TruncDate
 from django.utils import timezone
 from django.http import JsonResponse, Http404
 from django.core.paginator import Paginator
 from datetime import timedelta, datetime, time
-import calendar
 import os
 from .forms import VideoForm, PlaylistForm, DispositivoTVForm, SegmentoForm, AppVersionForm, ConteudoCorporativoForm, ConfiguracaoAPIForm, HorarioFuncionamentoForm
 
@@ -1028,79 +1093,11 @@ def dashboard_view(request):
     }
 
     if user.is_owner():
-        # Estatísticas para proprietário - consultas otimizadas
-        context.update({
-            'total_franchisees': User.objects.filter(role='FRANCHISEE').count(),
-            'total_municipios': Municipio.objects.count(),
-            'total_clients': Cliente.objects.count(),
-            'total_devices': DispositivoTV.objects.count(),
-        })
-        
-        # Pré-carregar dados dos municípios com anotações (evita N+1)
-        municipios_annotated = Municipio.objects.select_related('franqueado').annotate(
-            publico_total=Sum('dispositivos__publico_estimado_mes'),
-            dispositivos_count=Count('dispositivos')
-        ).order_by('nome')
-        
-        # Indexar por franqueado_id
-        municipios_by_franqueado = {}
-        for mun in municipios_annotated:
-            municipios_by_franqueado.setdefault(mun.franqueado_id, []).append({
-                'municipio': mun,
-                'publico_total': mun.publico_total or 0,
-                'dispositivos_count': mun.dispositivos_count or 0,
-            })
-        
-        # Pré-carregar clientes por franqueado
-        all_clientes = Cliente.objects.select_related('user', 'segmento').order_by('empresa')
-        clientes_by_franqueado = {}
-        for cli in all_clientes:
-            clientes_by_franqueado.setdefault(cli.franqueado_id, []).append(cli)
-        
-        # Pré-carregar playlists por franqueado
-        all_playlists = Playlist.objects.select_related('municipio').order_by('nome')
-        playlists_by_franqueado = {}
-        for pl in all_playlists:
-            playlists_by_franqueado.setdefault(pl.franqueado_id, []).append(pl)
-        
-        # Pré-carregar contagens de dispositivos por franqueado
-        dispositivos_por_franqueado = dict(
-            DispositivoTV.objects.values_list('municipio__franqueado').annotate(
-                total=Count('id')
-            ).values_list('municipio__franqueado', 'total')
-        )
-        
-        # Pré-carregar público total por franqueado
-        publico_por_franqueado = dict(
-            DispositivoTV.objects.values('municipio__franqueado').annotate(
-                total=Sum('publico_estimado_mes')
-            ).values_list('municipio__franqueado', 'total')
-        )
-        
-        # Montar visão hierárquica sem queries adicionais
-        franqueados = User.objects.filter(role='FRANCHISEE').order_by('username')
-        franqueados_data = []
-        
-        for franqueado in franqueados:
-            fid = franqueado.id
-            muns = municipios_by_franqueado.get(fid, [])
-            clis = clientes_by_franqueado.get(fid, [])
-            pls = playlists_by_franqueado.get(fid, [])
-            
-            franqueados_data.append({
-                'franqueado': franqueado,
-                'municipios': muns,
-                'clientes': clis,
-                'playlists': pls,
-                'stats': {
-                    'total_municipios': len(muns),
-                    'total_clientes': len(clis),
-                    'total_playlists': len(pls),
-                    'total_dispositivos': dispositivos_por_franqueado.get(fid, 0),
-                    'publico_total': publico_por_franqueado.get(fid, 0) or 0,
-                }
-            })
-        
+        # Totais e cabeçalhos dos franqueados: resumo em cache invalidado por sinais;
+        # as listas de cada franqueado são carregadas ao expandir (core/painel.py)
+        from . import painel
+        totais, franqueados_data = painel.resumo()
+        context.update(totais)
         context['franqueados_data'] = franqueados_data
         
     elif user.is_franchisee():
@@ -1216,6 +1213,30 @@ def dashboard_view(request):
     return render(request, 'dashboard/dashboard.html', context)
 
 
+@login_required
+def dashboard_franqueado_lista_api(request, pk, lista):
+    """Página de municípios, clientes ou playlists de um franqueado (dashboard do proprietário)."""
+    from . import painel
+
+    if not request.user.is_owner():
+        return JsonResponse({'success': False, 'error': 'Sem permissão'}, status=403)
+    if lista not in painel.LISTAS:
+        return JsonResponse({'success': False, 'error': 'Lista inválida'}, status=404)
+    get_object_or_404(User, pk=pk, role='FRANCHISEE')
+    return JsonResponse({'success': True, **painel.listar(lista, pk, request.GET.get('page'))})
+
+
+@login_required
+def dashboard_municipio_dispositivos_api(request, pk):
+    """Página de dispositivos de um município (dashboard do proprietário)."""
+    from . import painel
+
+    if not request.user.is_owner():
+        return JsonResponse({'success': False, 'error': 'Sem permissão'}, status=403)
+    get_object_or_404(Municipio, pk=pk)
+    return JsonResponse({'success': True, **painel.dispositivos_municipio(pk, request.GET.get('page'))})
+
+
 @login_required
 def cliente_metricas_view(request):
     """Dashboard de métricas de visibilidade para clientes"""
@@ -1232,166 +1253,15 @@ def cliente_metricas_view(request):
         messages.error(request, 'Perfil de cliente não encontrado.')
         return redirect('dashboard')
     
-    # Obter vídeos aprovados do cliente
-    videos_cliente = Video.objects.filter(cliente=cliente, status='APPROVED', ativo=True)
-    
-    # Encontrar playlists que contêm vídeos do cliente
-    playlist_ids = PlaylistItem.objects.filter(
-        video__in=videos_cliente, 
-        ativo=True
-    ).values_list('playlist_id', flat=True).distinct()
-    
-    playlists = Playlist.objects.filter(id__in=playlist_ids, ativa=True)
-    
-    # Dispositivos que usam essas playlists - prefetch agendamentos para evitar N+1
-    dispositivos = DispositivoTV.objects.filter(
-        playlist_atual__in=playlists,
-        ativo=True
-    ).select_related('municipio').prefetch_related(
-        Prefetch('agendamentos', queryset=AgendamentoExibicao.objects.filter(ativo=True))
-    ).distinct()
-    
-    # Métricas básicas
-    telas_ativas = dispositivos.count()
-    
-    # Público impactado (soma do público estimado de todos os dispositivos)
-    publico_impactado = dispositivos.aggregate(
-        total=Sum('publico_estimado_mes')
-    )['total'] or 0
-    
-    # Calcular tempo total de exibição baseado nos agendamentos
-    tempo_total_segundos = 0
-    dispositivos_detalhes = []
-    
-    # Dias úteis no mês atual
-    now = timezone.now()
-    _, dias_no_mes = calendar.monthrange(now.year, now.month)
-    
-    for dispositivo in dispositivos:
-        agendamentos = dispositivo.agendamentos.all()  # já prefetched
-        
-        horas_dia = 0
-        if agendamentos.exists():
-            # Calcular horas por semana baseado nos agendamentos
-            for agendamento in agendamentos:
-                hora_inicio = agendamento.hora_inicio
-                hora_fim = agendamento.hora_fim
-                
-                # Calcular duração em horas
-                inicio_segundos = hora_inicio.hour * 3600 + hora_inicio.minute * 60 + hora_inicio.second
-                fim_segundos = hora_fim.hour * 3600 + hora_fim.minute * 60 + hora_fim.second
-                duracao_segundos = fim_segundos - inicio_segundos
-                
-                if duracao_segundos > 0:
-                    horas_diarias = duracao_segundos / 3600
-                    dias_ativos = len(agendamento.dias_semana) if agendamento.dias_semana else 0
-                    # Média de dias por mês (considerando semanas)
-                    dias_mes = (dias_ativos / 7) * dias_no_mes
-                    horas_dia += horas_diarias * dias_mes
-        else:
-            # Sem agendamento = 12h por dia, todos os dias
-            horas_dia = 12 * dias_no_mes
-        
-        tempo_total_segundos += horas_dia * 3600
-        
-        dispositivos_detalhes.append({
-            'dispositivo': dispositivo,
-            'horas_mes': round(horas_dia, 1),
-            'localizacao': dispositivo.localizacao or dispositivo.municipio.nome
-        })
-    
-    tempo_total_horas = tempo_total_segundos / 3600
-    
-    # Duração média dos vídeos do cliente (em segundos)
-    duracao_media_video = videos_cliente.aggregate(
-        media=Avg('duracao_segundos')
-    )['media'] or 15  # Default 15 segundos
-    
-    # Total de vídeos em todas as playlists relevantes
-    total_videos_playlists = PlaylistItem.objects.filter(
-        playlist__in=playlists,
-        ativo=True
-    ).count()
-    
-    # Proporção de vídeos do cliente nas playlists
-    videos_cliente_em_playlists = PlaylistItem.objects.filter(
-        playlist__in=playlists,
-        video__in=videos_cliente,
-        ativo=True
-    ).count()
-    
-    # Evitar divisão por zero
-    proporcao_cliente = videos_cliente_em_playlists / max(total_videos_playlists, 1)
-    
-    # Inserções totais: tempo_total (em segundos) / duração média do vídeo * proporção de vídeos do cliente
-    insercoes_totais = int((tempo_total_segundos / max(duracao_media_video, 1)) * proporcao_cliente)
-    
-    # Anunciantes ativos (clientes únicos com vídeos nas mesmas playlists)
-    anunciantes_ids = PlaylistItem.objects.filter(
-        playlist__in=playlists,
-        ativo=True
-    ).values_list('video__cliente_id', flat=True).distinct()
-    anunciantes_ativos = len(set(anunciantes_ids))
-    
-    # Tempo por anúncio (duração média dos vídeos do cliente)
-    tempo_por_anuncio = duracao_media_video
-    
-    # Inserções por anunciante
-    insercoes_por_anunciante = int(insercoes_totais / max(anunciantes_ativos, 1)) if anunciantes_ativos > 0 else insercoes_totais
-    
-    # Tempo corrido da marca (inserções * duração média)
-    tempo_corrido_segundos = insercoes_totais * duracao_media_video
-    tempo_corrido_horas = tempo_corrido_segundos / 3600
-    
-    # Dados do mês anterior para comparação (usando logs reais se disponíveis)
-    mes_anterior = now.replace(day=1) - timedelta(days=1)
-    logs_mes_anterior = LogExibicao.objects.filter(
-        video__cliente=cliente,
-        data_hora_inicio__year=mes_anterior.year,
-        data_hora_inicio__month=mes_anterior.month
-    ).count()
-    
-    logs_mes_atual = LogExibicao.objects.filter(
-        video__cliente=cliente,
-        data_hora_inicio__year=now.year,
-        data_hora_inicio__month=now.month
-    ).count()
-    
-    # Calcular variação percentual
-    if logs_mes_anterior > 0:
-        variacao_percentual = ((logs_mes_atual - logs_mes_anterior) / logs_mes_anterior) * 100
-    else:
-        variacao_percentual = 100 if logs_mes_atual > 0 else 0
-    
-    # Função auxiliar para formatar números grandes
-    def formatar_numero(n):
-        if n >= 1000000:
-            return f"{n / 1000000:.1f}M"
-        elif n >= 1000:
-            return f"{n / 1000:.1f}K"
-        return str(int(n))
-    
+    # Snapshot materializado, recalculado em segundo plano (core/metricas.py)
+    from . import metricas
+    snapshot = metricas.obter(cliente)
+
     context = {
-        'now': now,
+        **snapshot.dados,
+        'now': timezone.now(),
         'cliente': cliente,
-        'telas_ativas': telas_ativas,
-        'publico_impactado': publico_impactado,
-        'publico_impactado_formatado': formatar_numero(publico_impactado),
-        'tempo_total_horas': round(tempo_total_horas, 1),
-        'insercoes_totais': insercoes_totais,
-        'insercoes_totais_formatado': formatar_numero(insercoes_totais),
-        'anunciantes_ativos': anunciantes_ativos,
-        'tempo_por_anuncio': round(tempo_por_anuncio, 0),
-        'insercoes_por_anunciante': insercoes_por_anunciante,
-        'insercoes_por_anunciante_formatado': formatar_numero(insercoes_por_anunciante),
-        'tempo_corrido_horas': round(tempo_corrido_horas, 1),
-        'variacao_percentual': round(variacao_percentual, 0),
-        'dispositivos_detalhes': dispositivos_detalhes,
-        'videos_cliente': videos_cliente,
-        'playlists': playlists,
-        'duracao_media_video': round(duracao_media_video, 0),
-        'proporcao_cliente': round(proporcao_cliente * 100, 1),
-        'logs_mes_atual': logs_mes_atual,
+        'calculado_em': snapshot.calculado_em,
     }
     
     return render(request, 'dashboard/cliente_metricas.html', context)
@@ -1880,6 +1750,10 @@ def video_convert_mp4_view(request, pk):
                 orientacao=orientacao,
             )
 
+        # update() não dispara post_save — invalida os manifestos das TVs manualmente
+        from .manifest import invalidar_video
+        invalidar_video(video_id=video.pk)
+
         return JsonResponse({
             'success': True,
             'message': f'Vídeo convertido para MP4 com sucesso! ({orientacao})',
@@ -2206,10 +2080,14 @@ def playlist_delete_view(request, pk):
 def dispositivo_list_view(request):
     """Lista de dispositivos TV"""
     user = request.user
+    # Exibições por dispositivo: soma dos agregados diários (core/agregacao.py)
+    exibicoes = ExibicaoPorDia.objects.filter(
+        dispositivo=OuterRef('pk')
+    ).values('dispositivo').annotate(total=Sum('exibicoes')).values('total')
     dispositivos = DispositivoTV.objects.select_related(
         'municipio', 'municipio__franqueado', 'playlist_atual'
     ).annotate(
-        total_exibicoes=Count('logs_exibicao')
+        total_exibicoes=Coalesce(Subquery(exibicoes), 0)
     )
 
     # Filtros
@@ -2241,14 +2119,15 @@ def dispositivo_list_view(request):
         messages.error(request, 'Você não tem permissão para ver dispositivos.')
         return redirect('dashboard')
 
-    # Estatísticas - baseadas no queryset filtrado
-    # Total de exibições: contar logs dos dispositivos filtrados
-    total_exibicoes = LogExibicao.objects.filter(
-        dispositivo__in=dispositivos
-    ).count()
+    # Status real de conexão — timelines e presença carregadas em lote
+    from . import presenca
+    from .timeline import carregar_timelines
+    all_dispositivos_list = list(dispositivos)
 
-    # Status real de conexão (requer avaliação Python por dispositivo)
-    all_dispositivos_list = list(dispositivos.prefetch_related('agendamentos'))
+    # Estatísticas - baseadas no queryset filtrado
+    total_exibicoes = sum(d.total_exibicoes for d in all_dispositivos_list)
+    carregar_timelines(all_dispositivos_list)
+    presenca.carregar(all_dispositivos_list)
     count_transmitindo = 0
     count_fora_horario = 0
     count_desconectado = 0
@@ -2275,6 +2154,9 @@ def dispositivo_list_view(request):
     paginator = Paginator(dispositivos.order_by('-created_at'), 9)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
+    page_obj.object_list = list(page_obj.object_list)
+    carregar_timelines(page_obj.object_list)
+    presenca.carregar(page_obj.object_list)
 
     # Municipios e playlists para filtro (scoped)
     if user.is_owner():
@@ -2381,28 +2263,9 @@ def dispositivo_tv_preview_view(request, pk):
         messages.error(request, 'Sem permissão para visualizar este dispositivo.')
         return redirect('dispositivo_list')
 
-    # Reutiliza a mesma lógica da TVAPIView para montar a fila de vídeos
-    agendamentos_ativos = dispositivo.get_agendamentos_ativos_por_horario()
-    videos = []
-
-    if agendamentos_ativos:
-        pairs = []
-        for ag in agendamentos_ativos:
-            playlist = ag.playlist
-            if not playlist.ativa:
-                continue
-            pl_serializer = PlaylistTVSerializer(
-                playlist,
-                context={'request': request, 'dispositivo_id': dispositivo.id}
-            )
-            pl_videos = pl_serializer.data.get('videos', [])
-            pairs.append((pl_videos, ag.percentual))
-
-        has_varied = len(pairs) > 1 and any(pct != 100 for _, pct in pairs)
-        if has_varied:
-            videos = _distribuir_por_percentual(pairs)
-        else:
-            videos = [v for vids, _ in pairs for v in vids]
+    # Mesma fila do manifesto da TV (inclusive a janela proporcional vigente)
+    from .manifest import fila_vigente
+    videos = fila_vigente(dispositivo, request)
 
     import json as _json
     videos_json = _json.dumps(videos)
@@ -0,0 +1,132 @@
+"""
+Motor de distribuição proporcional por tempo de tela (Weighted Fair Queuing).
+
+Cada playlist é um fluxo com peso = percentual. O motor mantém um heap com o
+"tempo virtual de término" do próximo item de cada fluxo:
+
+    termino_i = servico_i + duracao(proximo_item_i) / peso_i
+
+e sempre exibe o item de menor término (stride scheduling por duração).
+Cada escolha custa O(log k) para k playlists, e a sequência é produzida sob
+demanda por um gerador — qualquer horizonte, sem limite fixo de ciclo.
+
+Garantia: em qualquer prefixo da sequência com duração total T, o tempo de
+tela de cada playlist difere de peso_i × T em menos de duas vezes a duração
+do maior item — o erro relativo cai como 1/T, independentemente de os
+tamanhos das playlists serem primos entre si.
+
+Quando nem uma volta completa de todas as playlists cabe no limite de itens
+(ex: 100 itens a 10% contra 1 item a 90%), a fila é uma janela da sequência
+cortada no limite; janela() devolve a posição de cada playlist para que a
+janela seguinte continue de onde esta parou e todo item acabe exibido.
+"""
+import heapq
+from itertools import islice
+
+DURACAO_PADRAO = 30.0
+
+
+def _duracao(item, padrao):
+    dur = item.get('duracao_segundos', padrao) if isinstance(item, dict) else padrao
+    return dur if dur and dur > 0 else padrao
+
+
+def _preparar(fluxos):
+    """Filtra fluxos vazios/sem peso e calcula a duração padrão (média global)."""
+    validos = [(list(itens), peso) for itens, peso in fluxos if itens and peso and peso > 0]
+    duracoes = [
+        item['duracao_segundos'] for itens, _ in validos for item in itens
+        if isinstance(item, dict) and (item.get('duracao_segundos') or 0) > 0
+    ]
+    padrao = (sum(duracoes) / len(duracoes)) if duracoes else DURACAO_PADRAO
+    return validos, padrao
+
+
+def sequencia(fluxos, inicio=None):
+    """
+    Gerador infinito de (indice_fluxo, item).
+
+    fluxos: lista de (itens, peso) — itens de cada playlist na ordem em que
+    devem girar; peso proporcional à fatia de tempo de tela. Fluxos vazios
+    ou com peso <= 0 são ignorados. Em empate, vence o fluxo listado primeiro
+    (ordem de prioridade dos agendamentos).
+
+    inicio: posição inicial de cada fluxo válido (padrão: todos em 0).
+    """
+    validos, padrao = _preparar(fluxos)
+    if not validos:
+        return
+    total = sum(peso for _, peso in validos)
+    pesos = [peso / total for _, peso in validos]
+    posicao = [(inicio[i] if inicio else 0) % len(itens) for i, (itens, _) in enumerate(validos)]
+
+    heap = []
+    for i, (itens, _) in enumerate(validos):
+        heapq.heappush(heap, (_duracao(itens[posicao[i]], padrao) / pesos[i], i))
+
+    while True:
+        termino, i = heapq.heappop(heap)
+        itens = validos[i][0]
+        item = itens[posicao[i]]
+        yield i, item
+        posicao[i] = (posicao[i] + 1) % len(itens)
+        heapq.heappush(heap, (termino + _duracao(itens[posicao[i]], padrao) / pesos[i], i))
+
+
+def distribuir(fluxos, max_itens=200):
+    """Fila finita para o app de TV (que repete a lista em loop) — ver janela()."""
+    return janela(fluxos, max_itens)[0]
+
+
+def janela(fluxos, max_itens=200, posicoes=None):
+    """
+    (fila, proximas) — fila finita para o app de TV.
+
+    Gera até max_itens. Se todas as playlists completam pelo menos uma volta,
+    corta no prefixo cuja divisão de tempo de tela é a mais próxima dos
+    percentuais e `proximas` é None: a fila pode girar em loop.
+
+    Senão a fila é cortada no limite e `proximas` traz a posição de cada
+    fluxo (alinhada com `fluxos`) onde a janela seguinte deve começar —
+    passe-a como `posicoes` na próxima chamada para continuar a sequência.
+    """
+    validos, padrao = _preparar(fluxos)
+    if not validos:
+        return [item for itens, _ in fluxos for item in itens], None
+    if len(validos) == 1:
+        return list(validos[0][0]), None
+
+    # Posições de entrada/saída seguem `fluxos`; o motor só vê os válidos
+    indices = [n for n, (itens, peso) in enumerate(fluxos) if itens and peso and peso > 0]
+    inicio = [(posicoes[n] if posicoes else 0) for n in indices]
+
+    total_peso = sum(peso for _, peso in validos)
+    alvo = [peso / total_peso for _, peso in validos]
+    k = len(validos)
+
+    resultado = []
+    tempo = [0.0] * k
+    servidos = [0] * k
+    corte_cobertura, erro_cobertura = None, None
+
+    for i, item in islice(sequencia(validos, inicio), max_itens):
+        resultado.append(item)
+        tempo[i] += _duracao(item, padrao)
+        servidos[i] += 1
+        if len(resultado) < k:
+            continue
+        cobre = all(s >= len(itens) for s, (itens, _) in zip(servidos, validos))
+        if not cobre:
+            continue
+        total = sum(tempo)
+        erro = max(abs(t / total - a) for t, a in zip(tempo, alvo))
+        if erro_cobertura is None or erro < erro_cobertura:
+            corte_cobertura, erro_cobertura = len(resultado), erro
+
+    if corte_cobertura:
+        return resultado[:corte_cobertura], None
+
+    proximas = [0] * len(fluxos)
+    for i, n in enumerate(indices):
+        proximas[n] = (inicio[i] + servidos[i]) % len(validos[i][0])
+    return resultado, proximas
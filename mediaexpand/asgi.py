@@ -1,5 +1,14 @@
 """
-ASGI config for mediaexpand project.
+ASGI config for mediaexpand project — processo do canal de push das TVs
+(start_push.sh):
+
+    gunicorn mediaexpand.asgi:application -k mediaexpand.uvicorn_worker.Worker
+
+O site continua no gunicorn gthread (start.sh, mediaexpand/wsgi.py). Aqui
+cada conexão de long-poll/SSE parada (core/push.py) é uma corrotina, não uma
+thread, e TV_PUSH_MAX_CONEXOES pode acompanhar o tamanho da frota. O push vai
+direto para a view assíncrona (core/fastpath.py); qualquer outra rota que
+chegue a este processo é atendida pelo handler ASGI do Django.
 """
 
 import os
@@ -8,4 +17,8 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mediaexpand.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from core.fastpath import TVFastPathASGI  # noqa: E402 - depois do django.setup()
+
+application = TVFastPathASGI(django_application)
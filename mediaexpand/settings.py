@@ -161,16 +161,62 @@ FILE_UPLOAD_DIRECTORY_PERMISSIONS = 0o755
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Cache configuration — DatabaseCache: persiste entre workers Gunicorn (compartilhado via DB)
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
-        'LOCATION': 'django_cache',
-        'TIMEOUT': 300,
-        'OPTIONS': {
-            'MAX_ENTRIES': 1000,
-        }
+#
+# Dois aliases:
+# - 'default': manifestos, fragmentos, presença, painéis — tudo que pode ser
+#   recompilado. Sofre cull ao passar de CACHE_MAX_ENTRIES.
+# - 'estado': geração do manifesto/timeline, tokens de versão das playlists,
+#   travas do single-flight e avisos do push. Perder uma dessas chaves faria
+#   TVs servirem manifesto velho ou compilarem em dobro, então ficam numa
+#   tabela própria que nunca sofre cull (são poucas centenas de chaves).
+#
+# Custo no DatabaseCache (medido com `manage.py test core`, ManifestoETagTests):
+# um 304 do /api/tv/auth/ faz 2 SELECTs (entrada da TV em django_cache +
+# geração/tokens em django_cache_estado); cada set faz SELECT COUNT + INSERT
+# ou UPDATE. A presença grava em lote (set_many) a cada
+# TV_PRESENCE_FLUSH_SECONDS, não por requisição.
+#
+# Com REDIS_URL os dois aliases vão para o Redis (pacote `redis`) e o 304
+# deixa de tocar no banco. Configure o Redis com
+# `maxmemory-policy volatile-lru`: as chaves de 'estado' não têm TTL e
+# nunca são despejadas.
+REDIS_URL = config('REDIS_URL', default='')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'TIMEOUT': 300,
+        },
+        'estado': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'estado',
+            'TIMEOUT': None,
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'django_cache',
+            'TIMEOUT': 300,
+            'OPTIONS': {
+                # Comporta um manifesto pré-compilado por TV (core/manifest.py)
+                'MAX_ENTRIES': config('CACHE_MAX_ENTRIES', default=20000, cast=int),
+            }
+        },
+        'estado': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'django_cache_estado',
+            'TIMEOUT': None,
+            'OPTIONS': {
+                # Sem cull na prática: o cull apagaria gerações e tokens
+                'MAX_ENTRIES': 10 ** 9,
+            }
+        },
     }
-}
 
 # Use cached sessions for better performance
 SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
@@ -267,6 +313,77 @@ DEFAULT_FROM_EMAIL  = config('DEFAULT_FROM_EMAIL', default='noreply@mediaexpand.
 DEVICE_OFFLINE_THRESHOLD_MINUTES = config('DEVICE_OFFLINE_THRESHOLD_MINUTES', default=10, cast=int)
 # Intervalo (segundos) do scheduler interno para checar dispositivos
 DEVICE_CHECK_INTERVAL_SECONDS    = config('DEVICE_CHECK_INTERVAL_SECONDS', default=60, cast=int)
+# A checagem só olha prazos vencidos (core/presenca.py); a cada TV_OFFLINE_RECONCILE_SECONDS
+# os prazos são recarregados do banco (dispositivos vistos por outros processos)
+TV_OFFLINE_RECONCILE_SECONDS     = config('TV_OFFLINE_RECONCILE_SECONDS', default=3600, cast=int)
+# Janela (segundos) em que os alertas são juntados num e-mail-resumo por destinatário
+DEVICE_ALERT_DIGEST_SECONDS      = config('DEVICE_ALERT_DIGEST_SECONDS', default=30, cast=int)
+# Máximo de alertas aguardando envio por processo
+DEVICE_ALERT_QUEUE_MAX           = config('DEVICE_ALERT_QUEUE_MAX', default=500, cast=int)
+# Presença das TVs (core/presenca.py): ultima_sincronizacao só é regravada quando
+# avança mais que TV_PRESENCE_WRITE_SECONDS; as gravações saem em lote a cada
+# TV_PRESENCE_FLUSH_SECONDS (0 = grava na hora). A soma deve ficar bem abaixo do limite de offline.
+TV_PRESENCE_WRITE_SECONDS        = config('TV_PRESENCE_WRITE_SECONDS', default=60, cast=int)
+TV_PRESENCE_FLUSH_SECONDS        = config('TV_PRESENCE_FLUSH_SECONDS', default=15, cast=int)
+
+# ─── Manifesto das TVs ───────────────────────────────────────────────────────
+# Tempo máximo (segundos) que um manifesto compilado fica em cache. Na prática ele
+# é invalidado antes por sinais de modelo ou pela próxima fronteira de horário.
+TV_MANIFEST_CACHE_SECONDS = config('TV_MANIFEST_CACHE_SECONDS', default=3600, cast=int)
+# Quanto tempo (segundos) versões antigas ficam disponíveis como base de delta
+TV_MANIFEST_HISTORY_SECONDS = config('TV_MANIFEST_HISTORY_SECONDS', default=86400, cast=int)
+# Máximo de itens na fila mesclada por percentual (core/wfq.py; se não couber uma volta
+# completa, a fila vira uma janela que avança a cada passada)
+TV_MANIFEST_MAX_ITENS = config('TV_MANIFEST_MAX_ITENS', default=200, cast=int)
+# Tempo mínimo (segundos) de cada janela no manifesto ao vivo — a troca de janela
+# gera uma versão nova (200 em vez de 304) para as TVs da classe
+TV_MANIFEST_JANELA_MIN_SECONDS = config('TV_MANIFEST_JANELA_MIN_SECONDS', default=3600, cast=int)
+
+# ─── Push das TVs (long-poll / SSE) ──────────────────────────────────────────
+# Conexões de push simultâneas por processo. No processo de push (ASGI,
+# start_push.sh) vale 2000 — acompanhe o tamanho da frota. No site (gunicorn
+# gthread, runserver) cada conexão segura uma thread: o padrão 2 deixa o push
+# ali praticamente desligado e as TVs ficam no polling (429 + Retry-After).
+TV_PUSH_MAX_CONEXOES = config('TV_PUSH_MAX_CONEXOES', default=2, cast=int)
+# Endereço do processo de push (ex: https://push.mediaexpand.com.br), enviado às
+# TVs no manifesto como push_url. Vazio: o push fica no próprio site
+TV_PUSH_URL = config('TV_PUSH_URL', default='')
+# Tempo máximo (segundos) de um long-poll e de um stream SSE antes de reconectar
+TV_PUSH_TIMEOUT_SECONDS = config('TV_PUSH_TIMEOUT_SECONDS', default=25, cast=int)
+TV_PUSH_SSE_SECONDS = config('TV_PUSH_SSE_SECONDS', default=300, cast=int)
+# Intervalo (segundos) em que a vigia de cada processo lê os avisos de mudança
+# publicados por outros processos (core/push.py) — uma leitura por processo
+TV_PUSH_CHECK_SECONDS = config('TV_PUSH_CHECK_SECONDS', default=5, cast=int)
+
+# ─── Logs de exibição das TVs (write-behind) ─────────────────────────────────
+# Os logs avulsos vão para um buffer em memória gravado em lote (core/logs.py) a
+# cada TV_LOG_FLUSH_SECONDS ou ao juntar TV_LOG_FLUSH_ROWS eventos. 0 = grava na hora.
+TV_LOG_FLUSH_SECONDS = config('TV_LOG_FLUSH_SECONDS', default=5, cast=int)
+TV_LOG_FLUSH_ROWS = config('TV_LOG_FLUSH_ROWS', default=500, cast=int)
+# Limite do buffer por processo; cheio, a requisição grava direto (contrapressão)
+TV_LOG_BUFFER_MAX = config('TV_LOG_BUFFER_MAX', default=10000, cast=int)
+# Tentativas de gravar um evento do buffer que falha sozinho; depois vai para o log de erro e é descartado
+TV_LOG_FLUSH_ATTEMPTS = config('TV_LOG_FLUSH_ATTEMPTS', default=5, cast=int)
+# Por quanto tempo cada processo lembra se um dispositivo/vídeo existe (404 dos logs avulsos)
+TV_LOG_ID_CACHE_SECONDS = config('TV_LOG_ID_CACHE_SECONDS', default=300, cast=int)
+# Partições mensais (PostgreSQL) criadas à frente do mês atual — ver core/particoes.py
+TV_LOG_PARTITIONS_AHEAD = config('TV_LOG_PARTITIONS_AHEAD', default=2, cast=int)
+# Meses mantidos no banco; o comando arquivar_logs move os mais antigos para o storage
+TV_LOG_RETENTION_MONTHS = config('TV_LOG_RETENTION_MONTHS', default=12, cast=int)
+# Horas que a reserva de cada evento_id fica em EventoRecebido (deduplicação de reenvios)
+TV_LOG_DEDUP_HOURS = config('TV_LOG_DEDUP_HOURS', default=48, cast=int)
+# Agregados de exibição por hora/dia lidos pelos relatórios (core/agregacao.py)
+TV_ROLLUP_INTERVAL_SECONDS = config('TV_ROLLUP_INTERVAL_SECONDS', default=60, cast=int)
+TV_ROLLUP_BATCH = config('TV_ROLLUP_BATCH', default=20000, cast=int)
+
+# ─── Dashboards (métricas dos clientes e painel do proprietário) ─────────────
+# Snapshot por cliente (core/metricas.py): a cada CLIENT_METRICS_REFRESH_SECONDS
+# recalcula os marcados por alteração e os calculados há mais de CLIENT_METRICS_MAX_AGE_SECONDS
+CLIENT_METRICS_REFRESH_SECONDS = config('CLIENT_METRICS_REFRESH_SECONDS', default=60, cast=int)
+CLIENT_METRICS_MAX_AGE_SECONDS = config('CLIENT_METRICS_MAX_AGE_SECONDS', default=3600, cast=int)
+# Validade do resumo do dashboard do proprietário (core/painel.py); as seções
+# são invalidadas por sinais — o TTL só cobre alterações feitas via queryset.update()
+OWNER_DASHBOARD_CACHE_SECONDS = config('OWNER_DASHBOARD_CACHE_SECONDS', default=3600, cast=int)
 
 # Security settings for production
 if not DEBUG:
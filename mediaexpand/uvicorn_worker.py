@@ -0,0 +1,18 @@
+"""
+Worker do gunicorn para mediaexpand.asgi (start_push.sh).
+
+O UvicornWorker não repassa --limit-request-line / --limit-request-field_size
+ao uvicorn: o limite equivalente do h11 é ajustado aqui, para aceitar as
+mesmas linhas e cabeçalhos longos que o site (gthread) aceita. O Django não
+implementa o protocolo lifespan.
+"""
+from uvicorn.workers import UvicornWorker
+
+
+class Worker(UvicornWorker):
+    CONFIG_KWARGS = {
+        'loop': 'asyncio',
+        'http': 'h11',
+        'lifespan': 'off',
+        'h11_max_incomplete_event_size': 1024 * 1024,
+    }
@@ -1,5 +1,8 @@
 """
 WSGI config for mediaexpand project.
+
+As rotas quentes das TVs (auth, heartbeat, logs) são atendidas antes da
+pilha de middlewares pelo fast path em core/fastpath.py.
 """
 
 import os
@@ -9,3 +12,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mediaexpand.settings')
 
 application = get_wsgi_application()
+
+from core.fastpath import TVFastPath  # noqa: E402 - depois do django.setup()
+
+application = TVFastPath(application)
@@ -52,7 +52,7 @@ echo "🌐 Iniciando servidor Gunicorn na porta ${PORT:-8000}..."
 exec gunicorn mediaexpand.wsgi:application \
     --bind 0.0.0.0:${PORT:-8000} \
     --workers 1 \
-    --threads 4 \
+    --threads ${GUNICORN_THREADS:-4} \
     --worker-class gthread \
     --max-requests 1000 \
     --max-requests-jitter 50 \
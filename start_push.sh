@@ -0,0 +1,33 @@
+#!/bin/bash
+# Processo separado para o canal de push das TVs (core/push.py) no Railway:
+# um segundo serviço do mesmo repositório, com start command "bash start_push.sh".
+# O site (start.sh, gunicorn gthread) roda migrations e coleta os estáticos;
+# aqui só sobe o servidor ASGI — cada conexão de long-poll/SSE parada é uma
+# corrotina, não uma thread (limites de linha/cabeçalho iguais aos do site:
+# mediaexpand/uvicorn_worker.py). Aponte TV_PUSH_URL (no serviço do site) para o
+# domínio deste serviço.
+
+set -e
+
+echo "🚀 Iniciando canal de push do MediaExpand..."
+
+if [ -z "$DATABASE_URL" ]; then
+    echo "❌ Erro: DATABASE_URL não configurado!"
+    exit 1
+fi
+
+# Conexões simultâneas neste processo: acompanhe o tamanho da frota
+export TV_PUSH_MAX_CONEXOES=${TV_PUSH_MAX_CONEXOES:-2000}
+
+echo "🌐 Iniciando servidor Gunicorn (ASGI) na porta ${PORT:-8000}..."
+exec gunicorn mediaexpand.asgi:application \
+    --bind 0.0.0.0:${PORT:-8000} \
+    --workers 1 \
+    --worker-class mediaexpand.uvicorn_worker.Worker \
+    --max-requests 1000 \
+    --max-requests-jitter 50 \
+    --timeout 900 \
+    --keep-alive 75 \
+    --access-logfile - \
+    --error-logfile - \
+    --log-level info